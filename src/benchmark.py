@@ -0,0 +1,779 @@
+'''Benchmarks for the static timing analyzer'''
+import argparse
+import asyncio
+import gzip
+import math
+import os
+from pathlib import Path
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import main_parser
+from generate_bench import generate_bench
+from main_sta import STA
+from nldm_table import NLDMTable
+from path_search import PathSearch
+from timing_graph import INPUT, OUTPUT, TimingGraph
+
+# Directory containing the .bench files
+BENCH_DIR = '../bench'
+
+# Path to the NLDM library file
+NLDM_LIB_PATH = '../sample_NLDM.lib'
+
+# Directory of the benchmark results, apart from the reports of the output folder
+BENCHMARK_DIR = '../benchmark'
+
+# Seconds to wait for the timing server to listen before giving up
+SERVER_START_TIMEOUT = 30
+
+def bench_files(designs=None):
+    '''Function to list the .bench files to benchmark, optionally only the given designs'''
+    paths = sorted(Path(BENCH_DIR).glob("*.bench"))
+    if designs:
+        paths = [path for path in paths if path.stem in designs]
+    return paths
+
+def retained_memory(function, *args):
+    '''Function to call a function and measure the memory retained by its result'''
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = function(*args)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, after - before
+
+def best_time(function, *args, repeat=3):
+    '''Function to get the best wall time of a function over a few runs'''
+    times = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        function(*args)
+        times.append(time.perf_counter() - start_time)
+    return min(times)
+
+def walk_netlist(circuit):
+    '''Function to traverse the netlist dictionary in topological order, touching every fan-in'''
+    in_degree = {key: len(value.fanins) for key, value in circuit.items()}
+    queue = [key for key in in_degree if in_degree[key] == 0]
+    visited = 0
+    while queue:
+        node = queue.pop()
+        visited += len(circuit[node].type)
+        for fanin in circuit[node].fanins:
+            visited += len(circuit[fanin].type)
+        for fanout in circuit[node].fanouts:
+            in_degree[fanout] -= 1
+            if in_degree[fanout] == 0:
+                queue.append(fanout)
+    return visited
+
+def walk_graph(graph):
+    '''Function to traverse the timing graph in topological order, touching every fan-in'''
+    fanin_offsets = graph.fanin_offsets
+    fanout_offsets = graph.fanout_offsets
+    fanin_index = graph.fanin_index
+    fanout_index = graph.fanout_index
+    node_type = graph.node_type
+    in_degree = [fanin_offsets[node+1] - fanin_offsets[node] for node in range(len(graph))]
+    queue = [node for node in range(len(graph)) if in_degree[node] == 0]
+    visited = 0
+    while queue:
+        node = queue.pop()
+        visited += node_type[node]
+        for edge in range(fanin_offsets[node], fanin_offsets[node+1]):
+            visited += node_type[fanin_index[edge]]
+        for edge in range(fanout_offsets[node], fanout_offsets[node+1]):
+            fanout = fanout_index[edge]
+            in_degree[fanout] -= 1
+            if in_degree[fanout] == 0:
+                queue.append(fanout)
+    return visited
+
+def benchmark_graph(std_cell, paths):
+    '''Function to compare memory and traversal time of the netlist dictionary and the timing graph'''
+    print(f"{'design':<8} {'nodes':>7} {'dict KB':>9} {'graph KB':>9} "
+          f"{'dict ms':>8} {'graph ms':>9} {'STA ms':>8}")
+    # The STA reports go to a temporary directory, not over the ones in the output folder
+    with tempfile.TemporaryDirectory() as directory:
+        for path in paths:
+            circuit, circuit_bytes = retained_memory(main_parser.read_ckt, path)
+            graph, graph_bytes = retained_memory(TimingGraph.from_netlist, circuit)
+            dict_time = best_time(walk_netlist, circuit)
+            graph_time = best_time(walk_graph, graph)
+            sta_time = best_time(lambda: STA(std_cell, graph, directory).execute(), repeat=1)
+            print(f"{path.stem:<8} {len(graph):>7} {circuit_bytes/1024:>9.1f} {graph_bytes/1024:>9.1f} "
+                  f"{dict_time*1000:>8.2f} {graph_time*1000:>9.2f} {sta_time*1000:>8.1f}")
+
+def benchmark_vector(std_cell, paths):
+    '''Function to compare the scalar and the levelized, vectorized forward traversal'''
+    # Import the vectorized engine only for this benchmark, it depends on NumPy
+    from vector_sta import VectorSTA
+    print(f"{'design':<8} {'nodes':>7} {'levelize ms':>12} {'scalar ms':>10} {'vector ms':>10} {'speedup':>8}")
+    for path in paths:
+        graph = TimingGraph.from_netlist(main_parser.read_ckt(path))
+        scalar_sta = STA(std_cell, graph)
+        scalar_time = best_time(scalar_sta.forward_traversal)
+        vector_sta = VectorSTA(std_cell, graph)
+        # The first run levelizes the netlist, later runs reuse the levels
+        levelize_time = best_time(vector_sta.forward_traversal, repeat=1)
+        vector_time = best_time(vector_sta.forward_traversal, repeat=10)
+        print(f"{path.stem:<8} {len(graph):>7} {(levelize_time-vector_time)*1000:>12.2f} "
+              f"{scalar_time*1000:>10.2f} {vector_time*1000:>10.2f} {scalar_time/vector_time:>7.1f}x")
+
+def linear_scan_lookup(std_cell, node_type, input_slew, output_capacitance, delay=False, slew=False):
+    '''Function to perform a lookup the way STA did before the lookup tables were compiled,
+    with a linear scan of the indexes and a separate lookup for delay and slew'''
+    for i in range(len(std_cell[node_type].input_slew)-1):
+        if input_slew >= std_cell[node_type].input_slew[i] and input_slew < std_cell[node_type].input_slew[i+1]:
+            row1 = i
+            row2 = i+1
+        if output_capacitance >= std_cell[node_type].output_load[i] and output_capacitance < std_cell[node_type].output_load[i+1]:
+            column1 = i
+            column2 = i+1
+    t1 = std_cell[node_type].input_slew[row1]
+    t2 = std_cell[node_type].input_slew[row2]
+    c1 = std_cell[node_type].output_load[column1]
+    c2 = std_cell[node_type].output_load[column2]
+    if delay:
+        v11 = std_cell[node_type].delay[row1][column1]
+        v12 = std_cell[node_type].delay[row1][column2]
+        v21 = std_cell[node_type].delay[row2][column1]
+        v22 = std_cell[node_type].delay[row2][column2]
+    elif slew:
+        v11 = std_cell[node_type].slew[row1][column1]
+        v12 = std_cell[node_type].slew[row1][column2]
+        v21 = std_cell[node_type].slew[row2][column1]
+        v22 = std_cell[node_type].slew[row2][column2]
+    term1 = v11*(c2-output_capacitance)*(t2-input_slew)
+    term2 = v12*(output_capacitance-c1)*(t2-input_slew)
+    term3 = v21*(c2-output_capacitance)*(input_slew-t1)
+    term4 = v22*(output_capacitance-c1)*(input_slew-t1)
+    return (term1 + term2 + term3 + term4)/((c2-c1) * (t2-t1))
+
+def benchmark_lookup(std_cell, count=100000):
+    '''Function to measure delay and slew lookups per second of every standard cell'''
+    print(f"{'cell':<10} {'linear scan/s':>14} {'table/s':>12} {'batch/s':>12} {'max diff':>10}")
+    rng = random.Random(0)
+    for name, cell in std_cell.items():
+        # Skip the aliases of the inverter and buffer
+        if cell.gate_type != name:
+            continue
+        # Random pairs inside the indexes, where the linear scan is defined
+        pairs = [(rng.uniform(cell.input_slew[0], cell.input_slew[-1]),
+                  rng.uniform(cell.output_load[0], cell.output_load[-1])) for _ in range(count)]
+        slews = [pair[0] for pair in pairs]
+        loads = [pair[1] for pair in pairs]
+        def run_linear_scan():
+            return [(linear_scan_lookup(std_cell, name, slew, load, delay=True),
+                     linear_scan_lookup(std_cell, name, slew, load, slew=True)) for slew, load in pairs]
+        def run_table():
+            return [cell.table.lookup(slew, load) for slew, load in pairs]
+        linear_scan_time = best_time(run_linear_scan, repeat=1)
+        table_time = best_time(run_table)
+        batch_time = best_time(cell.table.lookup_batch, slews, loads)
+        difference = max(abs(expected[0] - value[0]) + abs(expected[1] - value[1])
+                         for expected, value in zip(run_linear_scan(), run_table()))
+        print(f"{name:<10} {count/linear_scan_time:>14.0f} {count/table_time:>12.0f} "
+              f"{count/batch_time:>12.0f} {difference:>10.2e}")
+
+def random_edit(sta, rng):
+    '''Function to apply a random cell swap or pin reconnection to the netlist of an STA object'''
+    graph = sta.graph
+    gates = [node for node in range(len(graph)) if sta.cells[graph.node_type[node]] is not None]
+    node = rng.choice(gates)
+    if rng.random() < 0.5:
+        # Swap the cell for one with the same number of inputs
+        swaps = {"NAND": "NOR", "NOR": "NAND", "AND": "OR", "OR": "AND",
+                 "XOR": "XOR", "INV": "BUF", "NOT": "BUF", "BUF": "INV", "BUFF": "INV"}
+        sta.set_cell(graph.names[node], swaps[graph.type_name(node)])
+        return
+    # Move an input pin to an earlier net, which can't close a loop
+    fanin = rng.choice(graph.fanins(node))
+    position = sta.sorted_order.index(node)
+    while True:
+        new_fanin = sta.sorted_order[rng.randrange(position)]
+        if graph.node_type[new_fanin] != OUTPUT and new_fanin != fanin:
+            break
+    try:
+        sta.reconnect(graph.names[node], graph.names[fanin], graph.names[new_fanin])
+    except ValueError:
+        # The pin was the last fan-out of its net, swap the cell instead
+        sta.set_cell(graph.names[node], graph.type_name(node))
+
+def benchmark_eco(std_cell, paths, edits=20):
+    '''Function to compare incremental re-timing after single edits with a full re-run'''
+    print(f"{'design':<8} {'nodes':>7} {'edits':>6} {'re-timed':>9} {'update ms':>10} "
+          f"{'full ms':>8} {'speedup':>8} {'max diff':>10}")
+    rng = random.Random(0)
+    for path in paths:
+        graph = TimingGraph.from_netlist(main_parser.read_ckt(path))
+        sta = STA(std_cell, graph)
+        sta.forward_traversal()
+        sta.backward_traversal()
+        retimed = 0
+        update_time = 0.0
+        full_time = 0.0
+        difference = 0.0
+        for _ in range(edits):
+            random_edit(sta, rng)
+            start_time = time.perf_counter()
+            retimed += sta.update_timing()
+            update_time += time.perf_counter() - start_time
+            incremental = (sta.total_circuit_delay, sta.max_output_arrival[:], sta.slack[:])
+            # Time everything again, and check the incremental result
+            start_time = time.perf_counter()
+            sta.forward_traversal()
+            sta.backward_traversal()
+            full_time += time.perf_counter() - start_time
+            difference = max([difference, abs(incremental[0] - sta.total_circuit_delay)]
+                             + [abs(expected - value) for expected, value in zip(incremental[1], sta.max_output_arrival)]
+                             + [abs(expected - value) for expected, value in zip(incremental[2], sta.slack)
+                                if expected != value])
+        print(f"{path.stem:<8} {len(graph):>7} {edits:>6} {retimed/edits:>9.0f} {update_time/edits*1000:>10.2f} "
+              f"{full_time/edits*1000:>8.1f} {full_time/update_time:>7.1f}x {difference:>10.2e}")
+
+def regex_tokenize_bench(path):
+    '''Function to tokenize a .bench file the way read_ckt did before the streaming tokenizer,
+    with several regular expression searches on every line'''
+    for line in path.open():
+        if re.search(r"^#|^\s", line):
+            continue
+        node = re.search(r"(?:\s|)([a-zA-Z0-9]+)(?:\()", line).group(1)
+        if node not in ("INPUT", "OUTPUT"):
+            inputs_list = re.findall(r"(?<=\()(.*?)(?=\))", line)
+            inputs = re.split(r',\s|,', inputs_list[0])
+            yield node, re.search(r"(\w+)(:?\s=)", line).group(1), inputs
+        else:
+            yield node, re.search(r"[\(,](\w+)[,\)]", line).group(1), None
+
+def stream_tokenize_bench(path):
+    '''Function to tokenize a .bench file with the streaming tokenizer of read_ckt'''
+    with main_parser.open_bench(path) as bench_file:
+        return list(main_parser.tokenize_bench(bench_file))
+
+def benchmark_parse(paths):
+    '''Function to measure the parse throughput in lines per second of the regex and the streaming tokenizer'''
+    print(f"{'design':<8} {'lines':>8} {'regex/s':>10} {'stream/s':>10} {'gzip/s':>10} "
+          f"{'read_ckt/s':>11} {'speedup':>8}")
+    totals = [0, 0.0, 0.0, 0.0, 0.0]
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for path in paths:
+            with path.open() as bench_file:
+                lines = sum(1 for _ in bench_file)
+            if list(regex_tokenize_bench(path)) != stream_tokenize_bench(path):
+                raise ValueError(f"The tokenizers disagree on {path.name}")
+            # Compressed copy of the design
+            gzip_path = Path(temp_dir) / f"{path.name}.gz"
+            gzip_path.write_bytes(gzip.compress(path.read_bytes()))
+            times = [best_time(lambda: list(regex_tokenize_bench(path))),
+                     best_time(stream_tokenize_bench, path),
+                     best_time(stream_tokenize_bench, gzip_path),
+                     best_time(main_parser.read_ckt, path)]
+            for column, value in enumerate([lines] + times):
+                totals[column] += value
+            print(f"{path.stem:<8} {lines:>8} {lines/times[0]:>10.0f} {lines/times[1]:>10.0f} "
+                  f"{lines/times[2]:>10.0f} {lines/times[3]:>11.0f} {times[0]/times[1]:>7.1f}x")
+    lines = totals[0]
+    print(f"{'total':<8} {lines:>8} {lines/totals[1]:>10.0f} {lines/totals[2]:>10.0f} "
+          f"{lines/totals[3]:>10.0f} {lines/totals[4]:>11.0f} {totals[1]/totals[2]:>7.1f}x")
+
+def count_paths(sta):
+    '''Function to count the paths from the primary inputs to the endpoints of a timed netlist'''
+    graph = sta.graph
+    paths = [0] * len(graph)
+    total = 0
+    for node in sta.sorted_order:
+        fanins = graph.fanins(node)
+        paths[node] = sum(paths[fanin] for fanin in fanins) if fanins else 1
+        if graph.fanout_offsets[node] == graph.fanout_offsets[node+1]:
+            total += paths[node]
+    return total
+
+def benchmark_paths(std_cell, paths, counts=(1, 100, 10000)):
+    '''Function to measure the time to enumerate the K worst paths'''
+    print(f"{'design':<8} {'all paths':>12} {'K':>6} {'ms':>9} {'worst ps':>10} {'K-th ps':>10}")
+    for path in paths:
+        graph = TimingGraph.from_netlist(main_parser.read_ckt(path))
+        sta = STA(std_cell, graph)
+        sta.forward_traversal()
+        sta.backward_traversal()
+        total = count_paths(sta)
+        for count in counts:
+            # Start every search from scratch, without the worst arcs found by the last one
+            start_time = time.perf_counter()
+            worst_paths = PathSearch(sta).worst_paths(count)
+            search_time = time.perf_counter() - start_time
+            print(f"{path.stem:<8} {total:>12.3g} {count:>6} {search_time*1000:>9.1f} "
+                  f"{worst_paths[0].delay*1000:>10.3f} {worst_paths[-1].delay*1000:>10.3f}")
+
+def scale_library(std_cell, delay_factor, slew_factor, capacitance_factor=1.0):
+    '''Function to derive a corner from a library, by scaling its delays, slews and input capacitances'''
+    corner = {}
+    for name, cell in std_cell.items():
+        # Aliases keep pointing to the same scaled cell
+        if cell.gate_type in corner:
+            corner[name] = corner[cell.gate_type]
+            continue
+        scaled = main_parser.Lib()
+        scaled.cell_name = cell.cell_name
+        scaled.gate_type = cell.gate_type
+        scaled.input_capacitance = cell.input_capacitance * capacitance_factor
+        scaled.input_slew = cell.input_slew[:]
+        scaled.output_load = cell.output_load[:]
+        scaled.delay = [[value * delay_factor for value in row] for row in cell.delay]
+        scaled.slew = [[value * slew_factor for value in row] for row in cell.slew]
+        scaled.table = NLDMTable.from_cell(scaled)
+        corner[name] = scaled
+    return corner
+
+def benchmark_pba(std_cell, paths, counts=(100, 1000, 10000)):
+    '''Function to measure path-based re-timing of the K worst paths in paths per second, batched against one path at a time
+
+    Path search time is given separately, re-timing starts from the found paths.
+    Batched and one-at-a-time re-timing give the same values.'''
+    # Import the path-based analysis only for this benchmark, it depends on NumPy
+    from path_based import PathBasedAnalysis
+    print(f"{'design':<8} {'paths':>6} {'search ms':>10} {'batched ms':>11} {'paths/s':>9} {'scalar paths/s':>15} "
+          f"{'speedup':>8} {'same':>5} {'worst GBA ps':>13} {'worst PBA ps':>13} {'changed':>8}")
+    for path in paths:
+        sta = STA(std_cell, TimingGraph.from_netlist(main_parser.read_ckt(path)))
+        sta.forward_traversal()
+        sta.backward_traversal()
+        analysis = PathBasedAnalysis(sta)
+        for count in counts:
+            start_time = time.perf_counter()
+            worst_paths = PathSearch(sta).worst_paths(count)
+            search_time = time.perf_counter() - start_time
+            # Compile the tables before timing the re-timing
+            analysis.retime(worst_paths[:1])
+            batched_time = best_time(analysis.retime, worst_paths)
+            retimed = analysis.retime(worst_paths)
+            scalar_time = best_time(lambda: [analysis.retime_path(worst) for worst in worst_paths], repeat=1)
+            same = all(list(batched.arrival) == analysis.retime_path(worst).arrival
+                       for batched, worst in zip(retimed, worst_paths))
+            changed = sum(1 for batched, worst in zip(retimed, worst_paths) if batched.slack != worst.slack)
+            print(f"{path.stem:<8} {len(worst_paths):>6} {search_time*1000:>10.1f} {batched_time*1000:>11.1f} "
+                  f"{len(worst_paths)/batched_time:>9.0f} {len(worst_paths)/scalar_time:>15.0f} "
+                  f"{scalar_time/batched_time:>7.1f}x {str(same):>5} {min(worst.slack for worst in worst_paths)*1000:>13.5f} "
+                  f"{min(batched.slack for batched in retimed)*1000:>13.5f} {changed:>8}")
+
+def benchmark_corners(std_cell, paths, max_corners=4):
+    '''Function to compare analysis of N corners in one traversal with N single-corner analyses'''
+    # Import the multi-corner engine only for this benchmark, it depends on NumPy
+    from multi_corner import MultiCornerSTA
+    # Slow, typical, fast and a fourth corner derived from the library
+    corners = [scale_library(std_cell, 1.25, 1.2, 1.05), std_cell,
+               scale_library(std_cell, 0.8, 0.85, 0.95), scale_library(std_cell, 1.1, 1.1, 1.0)]
+    print(f"{'design':<8} {'corners':>8} {'multi ms':>9} {'N x single ms':>14} {'N x STA ms':>11} {'vs single':>10}")
+    for path in paths:
+        graph = TimingGraph.from_netlist(main_parser.read_ckt(path))
+        def run(sta):
+            # Levelize and analyze the netlist, as a run of main_sta.py does for every library
+            sta.forward_traversal()
+            sta.backward_traversal()
+        single_time = best_time(lambda: run(MultiCornerSTA(corners[:1], graph)))
+        scalar_time = best_time(lambda: run(STA(std_cell, graph)), repeat=1)
+        for count in range(1, max_corners + 1):
+            multi_time = best_time(lambda: run(MultiCornerSTA(corners[:count], graph)))
+            print(f"{path.stem:<8} {count:>8} {multi_time*1000:>9.1f} {count*single_time*1000:>14.1f} "
+                  f"{count*scalar_time*1000:>11.1f} {multi_time/(count*single_time):>9.2f}x")
+
+def benchmark_early_late(std_cell, paths):
+    '''Function to compare setup and hold timed in one early/late traversal with a late-only analysis
+
+    The late-only analysis gives the setup slacks of STA, the early/late one adds
+    the hold slacks, the target is well under twice the time of the late-only one.'''
+    # Import the early/late engine only for this benchmark
+    from early_late import EarlyLateSTA
+    print(f"{'design':<8} {'nodes':>7} {'late ms':>8} {'early/late ms':>14} {'ratio':>6} {'setup same':>11} "
+          f"{'worst hold ps':>14}")
+    for path in paths:
+        graph = TimingGraph.from_netlist(main_parser.read_ckt(path))
+        def run(sta):
+            # Levelize and analyze the netlist, as a run of main_sta.py does
+            sta.forward_traversal()
+            sta.backward_traversal()
+            return sta
+        late_time = best_time(lambda: run(STA(std_cell, graph)))
+        early_late_time = best_time(lambda: run(EarlyLateSTA(std_cell, graph)))
+        late = run(STA(std_cell, graph))
+        early_late = run(EarlyLateSTA(std_cell, graph))
+        same = late.slack == early_late.slack and late.max_output_arrival == early_late.max_output_arrival
+        print(f"{path.stem:<8} {len(graph):>7} {late_time*1000:>8.1f} {early_late_time*1000:>14.1f} "
+              f"{early_late_time/late_time:>5.2f}x {str(same):>11} {min(early_late.hold_slack)*1000:>14.5f}")
+
+def benchmark_query(std_cell, paths):
+    '''Function to compare slack queries of one endpoint, timing only its cones, with a full run
+
+    The endpoint is the one with the latest arrival, whose fan-in cone is the
+    deepest. Queries are given the required arrival time of the full run as a
+    constraint, so that they don't need the circuit delay, the query without a
+    constraint is timed too.'''
+    from slack_query import SlackQuery
+    print(f"{'design':<8} {'nodes':>7} {'full ms':>8} {'index ms':>9} {'query ms':>9} {'cone':>6} {'again ms':>9} "
+          f"{'next ms':>8} {'no constraint ms':>17} {'same':>5}")
+    for path in paths:
+        graph = TimingGraph.from_netlist(main_parser.read_ckt(path))
+        def full_run():
+            sta = STA(std_cell, graph)
+            sta.forward_traversal()
+            sta.backward_traversal()
+            return sta
+        full_time = best_time(full_run, repeat=1)
+        full_sta = full_run()
+        ports = sorted(full_sta.output_ports, key=lambda node: full_sta.max_output_arrival[node], reverse=True)
+        endpoint, next_endpoint = [graph.names[node] for node in ports[:2]]
+        query = SlackQuery(STA(std_cell, graph), full_sta.total_circuit_delay_slack)
+        # Levelize, annotate the loads and index the sorted order once
+        index_time = best_time(query.reset, repeat=1)
+        start_time = time.perf_counter()
+        slack = query.slacks([endpoint])[endpoint]
+        query_time = time.perf_counter() - start_time
+        cone = query.arrivals_timed
+        again_time = best_time(query.slacks, [endpoint])
+        # A second endpoint reuses the overlapping part of the cones
+        next_time = best_time(query.slacks, [next_endpoint], repeat=1)
+        unconstrained = SlackQuery(STA(std_cell, graph))
+        unconstrained.reset()
+        unconstrained_time = best_time(unconstrained.slacks, [endpoint], repeat=1)
+        same = slack == full_sta.slack[graph.ids[endpoint]]
+        print(f"{path.stem:<8} {len(graph):>7} {full_time*1000:>8.1f} {index_time*1000:>9.1f} {query_time*1000:>9.2f} "
+              f"{cone:>6} {again_time*1000:>9.3f} {next_time*1000:>8.2f} {unconstrained_time*1000:>17.1f} "
+              f"{'yes' if same else 'no':>5}")
+
+def benchmark_liberty(lib_path, paths, copies=1000):
+    '''Function to compare reading a large library with read_nldm, and indexing it with the cells of a design parsed
+
+    The library repeats every cell of the given .lib file under new names, the
+    way libraries hold the drive strengths and variants of every gate.'''
+    from liberty import LibertyLibrary
+    text = Path(lib_path).read_text(encoding="utf-8")
+    library = LibertyLibrary(lib_path)
+    print(f"{'design':<8} {'cells':>6} {'MB':>6} {'read_nldm ms':>13} {'index ms':>9} {'parse ms':>9} "
+          f"{'parsed':>7} {'touched %':>10} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        large_path = Path(temp_dir) / "large.lib"
+        with large_path.open("w", encoding="utf-8") as lib_file:
+            # Library header and the original cells, then the renamed copies and the closing brace
+            cells_end = text.rindex("}")
+            lib_file.write(text[:cells_end])
+            for copy in range(copies):
+                for name, (start, end) in library.index.items():
+                    cell = text[start:min(end, cells_end)]
+                    lib_file.write(cell.replace(f"cell ({name})", f"cell ({name}_V{copy})", 1))
+            lib_file.write(text[cells_end:])
+        size = large_path.stat().st_size
+        full_time = best_time(main_parser.read_nldm, large_path, repeat=1)
+        for path in paths:
+            graph = TimingGraph.from_netlist(main_parser.read_ckt(path))
+            def lazy_read():
+                lazy = LibertyLibrary(large_path)
+                # Cells of the gate types of the design, and the inverter loading the outputs
+                for gate_type in set(graph.type_names) | {"INV"}:
+                    if gate_type in lazy:
+                        lazy[gate_type]
+                return lazy
+            lazy_time = best_time(lazy_read, repeat=1)
+            lazy = lazy_read()
+            print(f"{path.stem:<8} {len(lazy.index):>6} {size/1e6:>6.1f} {full_time*1000:>13.1f} "
+                  f"{lazy.index_time*1000:>9.1f} {lazy.parse_time*1000:>9.2f} {len(lazy.cells):>7} "
+                  f"{100*lazy.bytes_touched/size:>9.2f}% "
+                  f"{full_time/lazy_time:>7.1f}x")
+
+def benchmark_sweep(std_cell, paths, slews=8, clocks=8):
+    '''Function to compare a constraint sweep timed in one batched run with every point timed on its own
+
+    The sweep has the given number of input slews of all the primary inputs,
+    two arrival times of the first input, and the given number of clock targets.'''
+    from constraint_sweep import Constraints, SweepSTA
+    print(f"{'design':<8} {'nodes':>7} {'points':>7} {'batched ms':>11} {'points/s':>9} {'one by one ms':>14} "
+          f"{'points/s':>9} {'speedup':>8} {'same':>5}")
+    for path in paths:
+        graph = TimingGraph.from_netlist(main_parser.read_ckt(path))
+        first_input = graph.names[next(node for node in range(len(graph)) if graph.node_type[node] == INPUT)]
+        constraints = Constraints([0.2 + 0.1 * number for number in range(clocks)],
+                                  [("input_slew", "*", [0.002 * (number + 1) for number in range(slews)]),
+                                   ("input_delay", first_input, [0.0, 0.05])])
+        sweep = SweepSTA(std_cell, graph, constraints)
+        batched_time = best_time(sweep.run, repeat=1)
+        # Every point on its own, a forward and a backward pass per point
+        def one_by_one():
+            points = []
+            for variant in constraints.variants():
+                for clock in constraints.clocks:
+                    single = SweepSTA(std_cell, graph, Constraints(
+                        [clock], [(keyword, net, [value]) for (keyword, net, _), value in
+                                  zip(constraints.conditions, variant)]))
+                    single.run()
+                    points.extend(single.points)
+            return points
+        start_time = time.perf_counter()
+        points = one_by_one()
+        single_time = time.perf_counter() - start_time
+        same = [point[1:] for point in points] == [point[1:] for point in sweep.points]
+        count = len(sweep.points)
+        print(f"{path.stem:<8} {len(graph):>7} {count:>7} {batched_time*1000:>11.1f} {count/batched_time:>9.0f} "
+              f"{single_time*1000:>14.1f} {count/single_time:>9.0f} {single_time/batched_time:>7.1f}x "
+              f"{'yes' if same else 'no':>5}")
+
+def benchmark_parallel(std_cell, paths, max_processes, synthetic_gates=200000):
+    '''Function to measure the strong scaling of the level-parallel engine, one design on 1 to N processes
+
+    Passes are timed after the worker processes are started, the start-up time,
+    which includes copying the arrays to shared memory, is printed on its own.'''
+    # Import the parallel engine only for this benchmark
+    from parallel_sta import ParallelSTA
+    counts = sorted({min(2 ** power, max_processes) for power in range(max_processes.bit_length() + 1)})
+    print(f"{'design':<16} {'nodes':>8} {'processes':>10} {'start ms':>9} {'pass ms':>9} {'speedup':>8} "
+          f"{'efficiency':>11} {'same':>5}")
+    with tempfile.TemporaryDirectory() as directory:
+        # A synthetic netlist with wide levels, next to the designs of the bench folder
+        synthetic_path = Path(directory, f"synthetic_{synthetic_gates}.bench")
+        generate_bench(synthetic_path, synthetic_gates)
+        for path in list(paths) + [synthetic_path]:
+            graph = TimingGraph.from_netlist(main_parser.read_ckt(path, directory))
+            graph.levelize()
+            def run(sta):
+                sta.forward_traversal()
+                sta.backward_traversal()
+            serial_sta = STA(std_cell, graph, directory)
+            serial_time = best_time(run, serial_sta)
+            for count in counts:
+                # Every size is split across the processes, the automatic fallback is off
+                with ParallelSTA(std_cell, graph, directory, processes=count, min_nodes=0) as sta:
+                    start_time = time.perf_counter()
+                    if count > 1:
+                        sta.start_pool()
+                    start_time = time.perf_counter() - start_time
+                    parallel_time = best_time(run, sta)
+                    same = all(getattr(sta.state, name) == getattr(serial_sta.state, name)
+                               for name in ("max_output_arrival", "output_slew", "cell_delay", "slack"))
+                speedup = serial_time / parallel_time
+                print(f"{path.stem:<16} {len(graph):>8} {count:>10} {start_time*1000:>9.1f} {parallel_time*1000:>9.1f} "
+                      f"{speedup:>7.2f}x {speedup/count:>10.0%} {'yes' if same else 'no':>5}")
+
+async def query_clients(socket_path, design, nets, clients, queries, window=16):
+    '''Function to send queries from concurrent clients, each with a window of pipelined requests
+
+    Returns the latency of every query and the wall time.'''
+    from sta_server import STAClient
+    connections = [await STAClient.connect(socket_path) for _ in range(clients)]
+    latencies = []
+    async def timed_query(client, net):
+        start_time = time.perf_counter()
+        await client.request("query", design=design, net=net)
+        latencies.append(time.perf_counter() - start_time)
+    async def client_queries(client, number):
+        rng = random.Random(number)
+        pending = set()
+        for _ in range(queries // clients):
+            # Keep a window of requests in flight on the connection
+            if len(pending) >= window:
+                _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            pending.add(asyncio.create_task(timed_query(client, rng.choice(nets))))
+        await asyncio.gather(*pending)
+    start_time = time.perf_counter()
+    await asyncio.gather(*[client_queries(client, number) for number, client in enumerate(connections)])
+    wall_time = time.perf_counter() - start_time
+    for client in connections:
+        await client.close()
+    return latencies, wall_time
+
+def benchmark_server(paths, client_counts=(1, 4, 16), queries=4000):
+    '''Function to measure queries per second and latency of the timing server against a main_sta.py run per query'''
+    from sta_server import STAClient
+    print(f"{'design':<8} {'clients':>8} {'queries/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'main_sta.py ms':>15}")
+    with tempfile.TemporaryDirectory() as directory:
+        socket_path = os.path.join(directory, "sta.sock")
+        cache_dir = os.path.join(directory, "cache")
+        # Reports and cache files go to the temporary directory, not to the output and cache folders
+        server = subprocess.Popen([sys.executable, "sta_server.py", "--socket", socket_path, "--output_dir", directory,
+                                   "--cache_dir", cache_dir], stdout=subprocess.DEVNULL)
+        deadline = time.monotonic() + SERVER_START_TIMEOUT
+        while not os.path.exists(socket_path):
+            # Give up if the server exits or doesn't listen in time
+            if server.poll() is not None or time.monotonic() > deadline:
+                server.kill()
+                server.wait()
+                raise RuntimeError(f"The timing server didn't start, exit code {server.returncode}")
+            time.sleep(0.01)
+        async def load(path):
+            client = await STAClient.connect(socket_path)
+            await client.request("load_design", design=path.stem, bench=str(path), library=NLDM_LIB_PATH)
+            await client.request("run", design=path.stem)
+            await client.close()
+        try:
+            for path in paths:
+                asyncio.run(load(path))
+                nets = TimingGraph.from_netlist(main_parser.read_ckt(path, directory)).names
+                # A run of the command line tool pays startup and parsing for every query
+                start_time = time.perf_counter()
+                subprocess.run([sys.executable, "main_sta.py", "--read_ckt", str(path), "--read_nldm", NLDM_LIB_PATH,
+                                "--output_dir", directory, "--cache_dir", cache_dir], check=True, capture_output=True)
+                command_time = time.perf_counter() - start_time
+                for clients in client_counts:
+                    latencies, wall_time = asyncio.run(query_clients(socket_path, path.stem, nets, clients, queries))
+                    percentiles = statistics.quantiles(latencies, n=100)
+                    print(f"{path.stem:<8} {clients:>8} {len(latencies)/wall_time:>10.0f} {percentiles[49]*1000:>8.2f} "
+                          f"{percentiles[98]*1000:>8.2f} {command_time*1000:>15.1f}")
+        finally:
+            async def shutdown():
+                client = await STAClient.connect(socket_path)
+                await client.request("shutdown")
+                await client.close()
+            asyncio.run(shutdown())
+            server.wait()
+
+def growth(sizes, times):
+    '''Function to get the exponent of the growth of the last time from the one before, 1 for linear growth'''
+    count = len(times)
+    if count < 2 or times[-2] <= 0 or times[-1] <= 0:
+        return float("nan")
+    return math.log(times[-1] / times[-2]) / math.log(sizes[count-1] / sizes[count-2])
+
+def plot_scaling(results, path):
+    '''Function to plot parse and analysis time and peak memory against gate count, if matplotlib is installed'''
+    try:
+        # Plotting is optional, the table and the CSV file have the same values
+        import matplotlib
+        matplotlib.use("Agg")
+        from matplotlib import pyplot
+    except ImportError:
+        print("matplotlib is not installed, no plot is written")
+        return
+    gates = [result[0] for result in results]
+    figure, (time_axes, memory_axes) = pyplot.subplots(1, 2, figsize=(11, 4.5))
+    for column, label in ((1, "read_ckt"), (2, "forward traversal"), (3, "backward traversal")):
+        time_axes.loglog(gates, [result[column] for result in results], marker="o", label=label)
+    # A line of slope 1 through the first parse time shows linear scaling
+    time_axes.loglog(gates, [results[0][1] * size / gates[0] for size in gates], linestyle=":", color="gray",
+                     label="linear")
+    time_axes.set_xlabel("gates")
+    time_axes.set_ylabel("time (s)")
+    time_axes.legend()
+    memory_axes.loglog(gates, [result[4] / 1024 / 1024 for result in results], marker="o")
+    memory_axes.set_xlabel("gates")
+    memory_axes.set_ylabel("peak memory (MiB)")
+    figure.tight_layout()
+    figure.savefig(path)
+    print(f"Plot written to {path}")
+
+def benchmark_scaling(std_cell, max_gates=1000000, fanout="uniform", output_dir=BENCHMARK_DIR):
+    '''Function to measure how parsing, analysis and peak memory scale with the gate count of synthetic netlists
+
+    Growth exponents against the previous size, about 1 for linear scaling, show
+    super-linear parts of the flow. Results are written to scaling.csv, and plotted
+    to scaling.png, in the given directory.'''
+    sizes = []
+    size = 1000
+    while size <= max_gates:
+        sizes.append(size)
+        size *= 10
+    results = []
+    print(f"{'gates':>9} {'nodes':>9} {'read_ckt s':>11} {'forward s':>10} {'backward s':>11} {'peak MiB':>9} "
+          f"{'us/gate':>8} {'parse exp':>10} {'STA exp':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            path = os.path.join(directory, f"synthetic_{size}.bench")
+            generate_bench(path, size, fanout=fanout)
+            start_time = time.perf_counter()
+            graph = TimingGraph.from_netlist(main_parser.read_ckt(path, directory))
+            parse_time = time.perf_counter() - start_time
+            nodes = len(graph)
+            sta = STA(std_cell, graph, directory)
+            start_time = time.perf_counter()
+            sta.forward_traversal()
+            forward_time = time.perf_counter() - start_time
+            start_time = time.perf_counter()
+            sta.backward_traversal()
+            backward_time = time.perf_counter() - start_time
+            del sta, graph
+            # Peak memory of the whole flow is measured in a separate run, tracing slows it down
+            tracemalloc.start()
+            sta = STA(std_cell, TimingGraph.from_netlist(main_parser.read_ckt(path, directory)), directory)
+            sta.forward_traversal()
+            sta.backward_traversal()
+            peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            del sta
+            results.append((size, parse_time, forward_time, backward_time, peak_memory, nodes))
+            parse_growth = growth(sizes, [result[1] for result in results])
+            sta_growth = growth(sizes, [result[2] + result[3] for result in results])
+            total_time = parse_time + forward_time + backward_time
+            print(f"{size:>9} {nodes:>9} {parse_time:>11.3f} {forward_time:>10.3f} {backward_time:>11.3f} "
+                  f"{peak_memory/1024/1024:>9.1f} {total_time/size*1e6:>8.2f} {parse_growth:>10.2f} {sta_growth:>8.2f}")
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, "scaling.csv"), "w", encoding="utf-8") as csv_file:
+        csv_file.write("gates,nodes,read_ckt_s,forward_s,backward_s,peak_memory_bytes\n")
+        for size, parse_time, forward_time, backward_time, peak_memory, nodes in results:
+            csv_file.write(f"{size},{nodes},{parse_time},{forward_time},{backward_time},{peak_memory}\n")
+    plot_scaling(results, os.path.join(output_dir, "scaling.png"))
+    return results
+
+def parse_arguments():
+    '''Function to parse command line arguments'''
+    parser = argparse.ArgumentParser()
+    # Benchmark to run
+    parser.add_argument("benchmark", choices=["graph", "vector", "lookup", "eco", "parse", "paths", "corners", "server", "scaling", "parallel", "query", "liberty", "sweep", "early_late", "pba"], help = "Benchmark to run.")
+    # Argument to restrict the designs
+    parser.add_argument("--designs", nargs = "*", help = "Designs in the bench folder to run.")
+    # Argument to read .lib files
+    parser.add_argument("--read_nldm", action = "store", default = NLDM_LIB_PATH, help = "Reads .lib files.")
+    # Arguments for the synthetic netlists of the scaling benchmark
+    parser.add_argument("--max_gates", action = "store", type = int, default = 1000000,
+                        help = "Largest synthetic netlist of the scaling benchmark.")
+    parser.add_argument("--fanout", action = "store", choices = ["uniform", "powerlaw"], default = "uniform",
+                        help = "Fan-out distribution of the synthetic netlists.")
+    parser.add_argument("--output_dir", action = "store", default = BENCHMARK_DIR,
+                        help = "Directory scaling.csv and scaling.png are written to.")
+    # Argument for the largest number of processes of the parallel benchmark
+    parser.add_argument("--processes", action = "store", type = int, default = os.cpu_count(),
+                        help = "Most processes the parallel benchmark splits a design across.")
+    args = parser.parse_args()
+    return args
+
+def main():
+    '''Main function of benchmark.py'''
+    # Parse command line arguments
+    inputs = parse_arguments()
+    std_cell = main_parser.read_nldm(Path(inputs.read_nldm))
+    paths = bench_files(inputs.designs)
+    if inputs.benchmark == "graph":
+        benchmark_graph(std_cell, paths)
+    elif inputs.benchmark == "vector":
+        benchmark_vector(std_cell, paths)
+    elif inputs.benchmark == "lookup":
+        benchmark_lookup(std_cell)
+    elif inputs.benchmark == "eco":
+        benchmark_eco(std_cell, bench_files(inputs.designs or ["b17_C", "c7552"]))
+    elif inputs.benchmark == "parse":
+        benchmark_parse(paths)
+    elif inputs.benchmark == "corners":
+        benchmark_corners(std_cell, bench_files(inputs.designs or ["c7552", "b17_C"]))
+    elif inputs.benchmark == "scaling":
+        benchmark_scaling(std_cell, inputs.max_gates, inputs.fanout, inputs.output_dir)
+    elif inputs.benchmark == "query":
+        benchmark_query(std_cell, bench_files(inputs.designs or ["b17_C"]))
+    elif inputs.benchmark == "liberty":
+        benchmark_liberty(inputs.read_nldm, bench_files(inputs.designs or ["c17", "c7552"]))
+    elif inputs.benchmark == "sweep":
+        benchmark_sweep(std_cell, bench_files(inputs.designs or ["c7552", "b17_C"]))
+    elif inputs.benchmark == "early_late":
+        benchmark_early_late(std_cell, bench_files(inputs.designs or ["c6288", "c7552", "b17_C"]))
+    elif inputs.benchmark == "parallel":
+        benchmark_parallel(std_cell, bench_files(inputs.designs or ["b17_C"]), inputs.processes)
+    elif inputs.benchmark == "server":
+        benchmark_server(bench_files(inputs.designs or ["c7552", "b17_C"]))
+    elif inputs.benchmark == "pba":
+        benchmark_pba(std_cell, bench_files(inputs.designs or ["c6288", "b17_C"]))
+    elif inputs.benchmark == "paths":
+        benchmark_paths(std_cell, bench_files(inputs.designs or ["c6288"]))
+
+if __name__ == '__main__':
+    main()
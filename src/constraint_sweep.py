@@ -0,0 +1,210 @@
+'''Constraint sweeps, many clock targets and input conditions timed in one batched run'''
+import argparse
+import itertools
+import math
+from pathlib import Path
+import time
+import numpy as np
+import main_parser
+import parse_cache
+from multi_corner import MultiCornerSTA
+import report
+from timing_graph import INPUT, OUTPUT
+
+# Memory the timing state of one chunk of input conditions may take
+CHUNK_MEMORY = 256 * 1024 * 1024
+
+# Input conditions of a constraints file, and the net standing for all the primary inputs
+INPUT_CONDITIONS = ("input_slew", "input_delay")
+ALL_INPUTS = "*"
+
+class ConstraintError(ValueError):
+    '''Error raised for a constraints file that can't be read, or a constraint of a net that isn't a primary input'''
+
+class Constraints:
+    '''Clock targets and input conditions of a sweep
+
+    Every constraint with several values is a dimension of the sweep, the sweep
+    points are all the combinations of the input conditions, each timed with
+    every clock target.'''
+    def __init__(self, clocks=None, conditions=None):
+        self.clocks = list(clocks or [])            # Required arrival times of the outputs, empty for 1.1 times the circuit delay
+        self.conditions = list(conditions or [])    # Keyword, net and values of every input condition
+
+    def variants(self):
+        '''Function to get the values of the input conditions in every combination'''
+        return list(itertools.product(*[values for _, _, values in self.conditions]))
+
+    def describe(self, variant):
+        '''Function to get the text of the input conditions of a combination'''
+        return ", ".join(f"{keyword} {net}={value:g}" for (keyword, net, _), value in zip(self.conditions, variant))
+
+def read_constraints(path):
+    '''Function to read a constraints file, one constraint and its values per line
+
+    Lines are 'clock period...' for the required arrival time of the outputs in
+    ns, or 'input_slew net value...' and 'input_delay net value...' for the slew
+    and the arrival time of a primary input, '*' for all of them, later lines
+    override earlier ones for the same input. Empty lines and lines starting
+    with '#' are skipped.'''
+    constraints = Constraints()
+    with open(path, "r", encoding="utf-8") as constraints_file:
+        for line_number, line in enumerate(constraints_file, 1):
+            line = line.strip()
+            # Skip lines having comments or empty lines
+            if not line or line[0] == "#":
+                continue
+            fields = line.split()
+            keyword = fields[0]
+            try:
+                if keyword == "clock" and len(fields) > 1:
+                    constraints.clocks.extend(float(value) for value in fields[1:])
+                elif keyword in INPUT_CONDITIONS and len(fields) > 2:
+                    values = [float(value) for value in fields[2:]]
+                    if keyword == "input_slew" and min(values) < 0:
+                        raise ConstraintError(f"{path}:{line_number}: input slew of {fields[1]} is negative")
+                    constraints.conditions.append((keyword, fields[1], values))
+                else:
+                    raise ValueError
+            except ConstraintError:
+                raise
+            except ValueError:
+                raise ConstraintError(f"{path}:{line_number}: expected 'clock period...', 'input_slew net slew...' "
+                                      f"or 'input_delay net arrival...', got: {line}") from None
+    return constraints
+
+class SweepSTA(MultiCornerSTA):
+    '''Static Timing Analysis of a netlist at every point of a constraint sweep
+
+    Timing state holds one row per combination of input conditions, so the
+    combinations are propagated together like the corners of MultiCornerSTA, a
+    chunk at a time. The required arrival time doesn't change the forward pass,
+    so every clock target only runs the backward pass again on the same arrival
+    times. A combination without conditions and without clock targets gives the
+    values of STA.'''
+    def __init__(self, std_cell, netlist, constraints, output_dir=main_parser.OUTPUT_DIR):
+        super().__init__([std_cell], netlist, output_dir=output_dir)
+        self.constraints = constraints      # Clock targets and input conditions
+        graph = self.graph
+        primary_inputs = [node for node in range(len(graph)) if graph.node_type[node] == INPUT]
+        # Primary inputs of every input condition
+        self.condition_inputs = []
+        for keyword, net, _ in constraints.conditions:
+            if net == ALL_INPUTS:
+                self.condition_inputs.append(np.array(primary_inputs, dtype=np.int64))
+            elif graph.ids.get(net) is not None and graph.node_type[graph.ids[net]] == INPUT:
+                self.condition_inputs.append(np.array([graph.ids[net]], dtype=np.int64))
+            else:
+                raise ConstraintError(f"{keyword}: {net} is not a primary input of the netlist")
+        self.variants = constraints.variants()  # Values of the input conditions of every combination
+        self.chunk_variants = []            # Combinations of the rows of the timing state
+        self.endpoints = np.flatnonzero(np.frombuffer(graph.node_type, dtype=np.uint8) == OUTPUT)
+        self.points = []                    # Combination, required time, circuit delay, worst slack and its endpoint, total negative slack and failing endpoints of every point
+        self.points_per_second = 0.0        # Throughput of the last run
+
+    def start_inputs(self, inputs):
+        '''Function to set the slew and arrival time of the primary inputs in every row from its input conditions'''
+        super().start_inputs(inputs)
+        for number, ((keyword, _, _), nodes) in enumerate(zip(self.constraints.conditions, self.condition_inputs)):
+            values = np.array([variant[number] for variant in self.chunk_variants])[:, None]
+            if keyword == "input_slew":
+                self.output_slew[:, nodes] = values
+            else:
+                self.max_output_arrival[:, nodes] = values
+
+    def chunk_size(self):
+        '''Function to get the number of combinations whose timing state fits in CHUNK_MEMORY'''
+        # Slew, arrival, required time and slack of every node, cell delay of every
+        # arc, and about as much again for the temporary arrays of the levels
+        row_bytes = 16 * (4 * len(self.graph) + len(self.graph.fanin_index))
+        return max(1, min(len(self.variants), CHUNK_MEMORY // row_bytes))
+
+    def set_rows(self, rows):
+        '''Function to allocate the timing state for the given number of combinations'''
+        self.output_slew = np.zeros((rows, len(self.graph)))
+        self.max_output_arrival = np.zeros((rows, len(self.graph)))
+        self.cell_delay = np.zeros((rows, len(self.graph.fanin_index)))
+        self.back_traversal_arrival = np.zeros((rows, len(self.graph)))
+        self.slack = np.zeros((rows, len(self.graph)))
+
+    def run(self, chunk=None):
+        '''Function to time every point of the sweep, a chunk of combinations of input conditions at a time'''
+        start_time = time.perf_counter()
+        chunk = chunk or self.chunk_size()
+        self.points = []
+        for first in range(0, len(self.variants), chunk):
+            self.chunk_variants = self.variants[first:first + chunk]
+            self.set_rows(len(self.chunk_variants))
+            self.forward_traversal()
+            circuit_required_time = self.total_circuit_delay_slack
+            # Every clock target only changes the required arrival time of the outputs
+            clock_points = []
+            for clock in self.constraints.clocks or [None]:
+                if clock is None:
+                    self.total_circuit_delay_slack = circuit_required_time
+                else:
+                    self.total_circuit_delay_slack = np.full(len(self.chunk_variants), clock)
+                self.backward_traversal()
+                endpoint_slack = self.slack[:, self.endpoints]
+                worst = endpoint_slack.argmin(axis=1)
+                # Negative slacks are summed exactly, so that chunking doesn't change the totals
+                negative_slack = [math.fsum(row[row < 0]) for row in endpoint_slack]
+                clock_points.append((self.total_circuit_delay_slack.copy(), endpoint_slack[np.arange(len(worst)), worst],
+                                     self.endpoints[worst], negative_slack, (endpoint_slack < 0).sum(axis=1)))
+            # Points of a combination of input conditions are reported together
+            for row in range(len(self.chunk_variants)):
+                for required_time, worst_slack, endpoint, negative_slack, failing in clock_points:
+                    self.points.append((first + row, float(required_time[row]), float(self.total_circuit_delay[row]),
+                                        float(worst_slack[row]), int(endpoint[row]), float(negative_slack[row]),
+                                        int(failing[row])))
+        self.points_per_second = len(self.points) / (time.perf_counter() - start_time)
+
+    def report(self):
+        '''Function to write the results of all the points of the sweep'''
+        graph = self.graph
+        clocks = self.constraints.clocks
+        with report.open_report(self.output_dir, "ckt_sweep.txt") as result_file:
+            result_file.write(f"Sweep points: {len(self.points)}, input conditions: {len(self.variants)}, "
+                              f"clock targets: {len(clocks) if clocks else '1.1 times the circuit delay'}\n\n")
+            for number, (variant, required_time, delay, worst_slack, endpoint, negative_slack, failing) in \
+                    enumerate(self.points, 1):
+                conditions = self.constraints.describe(self.variants[variant]) or "default inputs"
+                result_file.write(f"Point {number}: {conditions}, required {(required_time*1000):.5f} ps: "
+                                  f"circuit delay {(delay*1000):.5f} ps, worst slack {(worst_slack*1000):.5f} ps "
+                                  f"at {graph.label(endpoint)}, total negative slack {(negative_slack*1000):.5f} ps, "
+                                  f"{failing} failing endpoints\n")
+
+def parse_arguments():
+    '''Function to parse command line arguments'''
+    parser = argparse.ArgumentParser()
+    # Arguments to read the netlist, the .lib file and the constraints
+    parser.add_argument("--read_ckt", action = "store", required = True, help = "Provides details of the circuit.")
+    parser.add_argument("--read_nldm", action = "store", required = True, help = "Reads .lib files.")
+    parser.add_argument("--constraints", action = "store", required = True,
+                        help = "Reads the clock targets and the input slews and arrival times to sweep.")
+    parser.add_argument("--chunk", action = "store", type = int, default = None,
+                        help = "Combinations of input conditions propagated at once, by default as many as fit in 256 MiB.")
+    parser.add_argument("--output_dir", action = "store", default = main_parser.OUTPUT_DIR,
+                        help = "Folder the sweep report is written to.")
+    args = parser.parse_args()
+    return args
+
+def main():
+    '''Main function of constraint_sweep.py'''
+    # Parse command line arguments
+    inputs = parse_arguments()
+    std_cell = parse_cache.read_library(Path(inputs.read_nldm))
+    graph = parse_cache.read_graph(Path(inputs.read_ckt))
+    try:
+        constraints = read_constraints(inputs.constraints)
+        sta = SweepSTA(std_cell, graph, constraints, inputs.output_dir)
+    except (OSError, ConstraintError) as error:
+        print(error)
+        return
+    sta.run(inputs.chunk)
+    sta.report()
+    print(f"{len(sta.points)} sweep points ({len(sta.variants)} input conditions x "
+          f"{len(constraints.clocks) or 1} clock targets), {sta.points_per_second:.0f} points/s")
+
+if __name__ == '__main__':
+    main()
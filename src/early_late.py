@@ -0,0 +1,213 @@
+'''Early/late Static Timing Analysis, setup and hold timed in one levelized traversal'''
+from array import array
+import os
+from instrumentation import timed
+import main_parser
+from main_sta import STA
+import report
+from timing_graph import INPUT, OUTPUT
+
+class EarlyLateSTA(STA):
+    '''Static Timing Analysis carrying the minimum and the maximum arrival time and slew of every node
+
+    Both are propagated in the same sorted order, every input pin is looked up
+    once for its late and its early input slew, bracketing the output load once,
+    and interpolating once where both slews are equal. The early arrival time is
+    the minimum over the input pins, the first input with the minimum arrival
+    time gives the early slew, like the late values with the maximum. Late values
+    are the ones of STA, they give the setup slacks. Hold slacks compare the early
+    arrival times with the hold time of the outputs, the required arrival time
+    of a node being the maximum over its fan-out arcs.'''
+    def __init__(self, std_cell, netlist, output_dir=main_parser.OUTPUT_DIR, state=None, hold_time=0.0):
+        super().__init__(std_cell, netlist, output_dir, state)
+        num_nodes = len(self.graph)
+        self.hold_time = hold_time  # Required arrival time of the outputs for hold, the earliest data may change
+        self.early_slew = array("d", bytes(8 * num_nodes))  # Early output slew of all the nodes
+        self.min_output_arrival = array("d", bytes(8 * num_nodes)) # Minimum output arrival time of all the nodes
+        self.early_cell_delay = array("d", bytes(8 * len(self.graph.fanin_index)))  # Early cell delays of all the fan-in arcs
+        self.hold_required = array("d", bytes(8 * num_nodes))    # Hold required arrival time of all the nodes
+        self.hold_slack = array("d", bytes(8 * num_nodes))  # Hold slack of the nodes
+        self.shortest_path_delay = 0.0  # Minimum arrival time of the outputs
+        self.hold_critical_path = []    # Path of the worst hold slack
+        # Primary inputs start with the default input slew
+        for node in range(num_nodes):
+            if self.graph.node_type[node] == INPUT:
+                self.early_slew[node] = main_parser.PRIMARY_INPUT_SLEW
+
+    def evaluate_node(self, node):
+        '''Function to calculate late and early cell delays, output slews and output arrival times of a node'''
+        graph = self.graph
+        state = self.state
+        node_type = graph.node_type[node]
+        cell = self.cells[node_type]
+        # Check if the node is a logical gate
+        if cell is not None:
+            input_slew = state.output_slew
+            arrival = state.max_output_arrival
+            cell_delay = state.cell_delay
+            early_input_slew = self.early_slew
+            early_arrival = self.min_output_arrival
+            early_cell_delay = self.early_cell_delay
+            # Get the output capacitance of the node, annotated before the pass
+            output_capacitance = self.loads[node]
+            first_edge = graph.fanin_offsets[node]
+            last_edge = graph.fanin_offsets[node+1]
+            num_fanins = last_edge - first_edge
+            max_output_arrival = 0.0
+            output_slew = 0.0
+            min_output_arrival = 0.0
+            early_output_slew = 0.0
+            table = cell.table
+            arc_cache = self.arc_cache
+            # Perform lookups for late and early delay and slew on every input pin
+            for edge in range(first_edge, last_edge):
+                fanin = graph.fanin_index[edge]
+                if arc_cache is not None:
+                    delay, slew = arc_cache.lookup(table, input_slew[fanin], output_capacitance, num_fanins)
+                    if early_input_slew[fanin] == input_slew[fanin]:
+                        early_delay, early_slew = delay, slew
+                    else:
+                        early_delay, early_slew = arc_cache.lookup(table, early_input_slew[fanin],
+                                                                   output_capacitance, num_fanins)
+                else:
+                    delay, slew, early_delay, early_slew = table.lookup_early_late(
+                        input_slew[fanin], early_input_slew[fanin], output_capacitance)
+                    # If the node has more than 2 inputs, multiply delay and slew with 'number of inputs / 2'
+                    if num_fanins > 2:
+                        delay *= num_fanins/2
+                        slew *= num_fanins/2
+                        early_delay *= num_fanins/2
+                        early_slew *= num_fanins/2
+                # Store cell delays
+                cell_delay[edge] = delay
+                early_cell_delay[edge] = early_delay
+                # Calculate arrival times through the input, the first input with the maximum
+                # output arrival time gives the late output slew, and the first input with
+                # the minimum one the early output slew
+                output_arrival = delay + arrival[fanin]
+                if edge == first_edge or output_arrival > max_output_arrival:
+                    max_output_arrival = output_arrival
+                    output_slew = slew
+                output_arrival = early_delay + early_arrival[fanin]
+                if edge == first_edge or output_arrival < min_output_arrival:
+                    min_output_arrival = output_arrival
+                    early_output_slew = early_slew
+            arrival[node] = max_output_arrival
+            input_slew[node] = output_slew
+            early_arrival[node] = min_output_arrival
+            early_input_slew[node] = early_output_slew
+        # Check if the node is output
+        elif node_type == OUTPUT:
+            # Get the output arrival times of first fan-in node
+            fanin = graph.fanin_index[graph.fanin_offsets[node]]
+            state.max_output_arrival[node] = state.max_output_arrival[fanin]
+            self.min_output_arrival[node] = self.min_output_arrival[fanin]
+
+    def forward_traversal(self):
+        '''Function to perform forward traversal of netlist, for the late and the early values'''
+        super().forward_traversal()
+        # Get the minimum output arrival time of the output nodes
+        arrival = self.min_output_arrival
+        self.shortest_path_delay = min([arrival[node] for node in self.output_ports], default=0.0)
+
+    @timed("backward_traversal")
+    def backward_traversal(self):
+        '''Function to perform backward traversal on netlist, for the setup and the hold slacks'''
+        graph = self.graph
+        node_type = graph.node_type
+        fanin_offsets = graph.fanin_offsets
+        fanin_index = graph.fanin_index
+        required = self.back_traversal_arrival
+        slack = self.slack
+        arrival = self.max_output_arrival
+        cell_delay = self.cell_delay
+        required_time = self.total_circuit_delay_slack
+        hold_required = self.hold_required
+        hold_slack = self.hold_slack
+        early_arrival = self.min_output_arrival
+        early_cell_delay = self.early_cell_delay
+        hold_time = self.hold_time
+        # Required arrival times start unassigned
+        for node in range(len(graph)):
+            required[node] = float("inf")
+            hold_required[node] = float("-inf")
+        if self.level_offsets is None:
+            self.levelize()
+        # Visit the nodes in reverse sorted order, so that all the fan-outs of a node are done before it
+        for node in reversed(self.sorted_order):
+            # Check if the node is a logical gate
+            if self.cells[node_type[node]] is not None:
+                # Calculate setup and hold slack for the node
+                slack[node] = required[node] - arrival[node]
+                hold_slack[node] = early_arrival[node] - hold_required[node]
+                # Assign setup and hold required arrival times to the fan-in nodes of the given node
+                for edge in range(fanin_offsets[node], fanin_offsets[node+1]):
+                    fanin = fanin_index[edge]
+                    if required[fanin] > required[node] - cell_delay[edge]:
+                        required[fanin] = required[node] - cell_delay[edge]
+                    if hold_required[fanin] < hold_required[node] - early_cell_delay[edge]:
+                        hold_required[fanin] = hold_required[node] - early_cell_delay[edge]
+            # Check if the node is input
+            elif node_type[node] == INPUT:
+                # Calculate setup and hold slack for the node
+                slack[node] = required[node] - arrival[node]
+                hold_slack[node] = early_arrival[node] - hold_required[node]
+            # Check if the node is output
+            elif node_type[node] == OUTPUT:
+                # Assign setup and hold required arrival times for output node
+                required[node] = required_time
+                hold_required[node] = hold_time
+                # Calculate setup and hold slack for the node
+                slack[node] = required[node] - arrival[node]
+                hold_slack[node] = early_arrival[node] - hold_time
+                # Assign required arrival times to the fan-in node of the given node, unless a gate needs other ones
+                fanin = fanin_index[fanin_offsets[node]]
+                if required[fanin] > required[node]:
+                    required[fanin] = required[node]
+                if hold_required[fanin] < hold_time:
+                    hold_required[fanin] = hold_time
+        # All the nodes are timed
+        self.changed_nodes.clear()
+        if self.stats is not None:
+            self.stats.count("nodes_visited", len(self.sorted_order))
+
+    def update_timing(self, tolerance=0.0):
+        '''Function to re-time the netlist after edits, early and late values are timed again with full passes'''
+        self.changed_nodes.clear()
+        self.forward_traversal()
+        self.backward_traversal()
+        return 2 * len(self.graph)
+
+    @timed("critical_path")
+    def find_critical_path(self):
+        '''Function to find the setup and the hold critical paths of the netlist'''
+        self.final_critical_path = self.trace_worst_path(self.slack)
+        self.hold_critical_path = self.trace_worst_path(self.hold_slack)
+        return self.final_critical_path
+
+    @timed("write_reports")
+    def write_reports(self, formats=None):
+        '''Function to write the setup and the hold slacks and critical paths in the given formats
+
+        The binary report has the early values as the extra columns
+        early_arrival, early_slew, hold_required, hold_slack, hold_path, the
+        hold critical path, and shortest_delay, the shortest path delay, so that
+        report.py writes the same text report from it.'''
+        formats = self.report_formats if formats is None else formats
+        if "text" in formats:
+            labels = report.graph_labels(self.graph)
+            with report.open_report(self.output_dir, report.TEXT_REPORT) as report_file:
+                report.write_early_late_slacks(report_file, labels, self.slack, self.hold_slack, self.sorted_order,
+                                               self.total_circuit_delay, self.shortest_path_delay)
+                report.write_critical_path(report_file, labels, self.final_critical_path)
+                report_file.write("\n")
+                report.write_critical_path(report_file, labels, self.hold_critical_path, "Hold critical path")
+        if "binary" in formats:
+            if not os.path.isdir(self.output_dir):
+                os.makedirs(self.output_dir)
+            report.write_binary(os.path.join(self.output_dir, report.BINARY_REPORT), self.graph, self.state,
+                                self.sorted_order, self.final_critical_path,
+                                [("early_arrival", "d", self.min_output_arrival), ("early_slew", "d", self.early_slew),
+                                 ("hold_required", "d", self.hold_required), ("hold_slack", "d", self.hold_slack),
+                                 ("hold_path", "i", array("i", self.hold_critical_path)),
+                                 ("shortest_delay", "d", array("d", [self.shortest_path_delay]))])
@@ -1,11 +1,13 @@
-'''Executes main_sta.py for all the .bench files'''
-import subprocess
+'''Executes static timing analysis for all the .bench files, in parallel worker processes'''
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import os
-import shutil
+from pathlib import Path
 import time
-
-# Path to the main_sta.py script
-MAIN_STA_PATH = './main_sta.py'
+import parse_cache
+from main_sta import STA
+from nldm_table import ARC_CACHE_SIZE, ArcCache
+from report import REPORT_FORMATS
 
 # Directory containing the .bench files
 BENCH_DIR = '../bench'
@@ -16,58 +18,147 @@ NLDM_LIB_PATH = '../sample_NLDM.lib'
 # Main output directory where results will be stored
 OUTPUT_DIR = '../output'
 
-# Path to the directory whose contents you want to copy
-SOURCE_DIR = './output'
+# Standard cells shared by all the designs run in a worker process
+shared_std_cell = None
 
-# Create the main output directory if it doesn't exist
-if not os.path.exists(OUTPUT_DIR):
-    os.makedirs(OUTPUT_DIR)
+# Memo of the cell arc lookups shared by all the designs run in a worker process, None without one
+shared_arc_cache = None
 
-# List to keep track of files that showed errors during subprocess execution
-files_with_errors = []
+def init_worker(std_cell, arc_cache_size=None, arc_cache_tolerance=0.0):
+    '''Function to hand the standard cells, read once by the batch, and a new arc cache to a worker process'''
+    global shared_std_cell, shared_arc_cache
+    shared_std_cell = std_cell
+    if arc_cache_size is not None:
+        shared_arc_cache = ArcCache(arc_cache_size, arc_cache_tolerance)
 
-# Iterate over all files in the BENCH_DIR directory
-for filename in os.listdir(BENCH_DIR):
-    if filename.endswith('.bench'):
-        # Extract the base name (without extension) to create a result directory path
-        base_name = os.path.splitext(filename)[0]
-        result_dir = os.path.join(OUTPUT_DIR, base_name)
+def run_design(bench_path, result_dir, vectorized=False, cache=True, rebuild=False, details=False,
+               report_formats=("text",), cache_dir=parse_cache.CACHE_DIR):
+    '''Function to perform static timing analysis of one design, writing to its own result directory
 
-        # Full path to the current .bench file
-        bench_path = os.path.join(BENCH_DIR, filename)
+    Returns the number of nodes, the parse, forward, backward and report times,
+    and the hits and misses of the arc cache of the worker for the design.'''
+    start_time = time.perf_counter()
+    # Read the netlist, its details are written to the result directory if requested
+    graph = parse_cache.read_graph(bench_path, cache, rebuild, cache_dir, output_dir=result_dir, details=details)
+    parse_time = time.perf_counter()
+    if vectorized:
+        # Import the vectorized engine only when requested, it depends on NumPy
+        from vector_sta import VectorSTA
+        sta = VectorSTA(shared_std_cell, graph, result_dir)
+    else:
+        sta = STA(shared_std_cell, graph, result_dir)
+        sta.arc_cache = shared_arc_cache
+    hits, misses = (shared_arc_cache.hits, shared_arc_cache.misses) if shared_arc_cache is not None else (0, 0)
+    sta.forward_traversal()
+    forward_time = time.perf_counter()
+    sta.backward_traversal()
+    backward_time = time.perf_counter()
+    # Write the slacks and the critical path
+    sta.find_critical_path()
+    sta.write_reports(report_formats)
+    report_time = time.perf_counter()
+    if shared_arc_cache is not None:
+        hits = shared_arc_cache.hits - hits
+        misses = shared_arc_cache.misses - misses
+    return (len(graph), parse_time - start_time, forward_time - parse_time,
+            backward_time - forward_time, report_time - backward_time, hits, misses)
 
-        # Construct the command to execute
-        command = [
-            'python', MAIN_STA_PATH,
-            '--read_nldm', NLDM_LIB_PATH, '--read_ckt', bench_path,
-        ]
+def run_batch(std_cell, bench_paths, output_dir=OUTPUT_DIR, jobs=None, vectorized=False, cache=True, rebuild=False,
+              arc_cache_size=None, arc_cache_tolerance=0.0, details=False, report_formats=("text",),
+              cache_dir=parse_cache.CACHE_DIR):
+    '''Function to run all the designs on a pool of worker processes
 
-        # Execute the command within a try-except block
-        try:
-            start_time = time.time()
-            subprocess.run(command, check=True)
-            end_time = time.time()
-            print(f"{base_name} - Time: {end_time-start_time}")
+    The largest designs are started first, so that they don't finish last on a
+    single worker. Every worker keeps one arc cache for all its designs, when a
+    size is given. Returns the timings of every design and the designs that failed.'''
+    # Schedule the designs from the largest to the smallest file
+    bench_paths = sorted(bench_paths, key=lambda path: path.stat().st_size, reverse=True)
+    results = {}
+    files_with_errors = []
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker,
+                             initargs=(std_cell, arc_cache_size, arc_cache_tolerance)) as executor:
+        futures = {}
+        for bench_path in bench_paths:
+            result_dir = os.path.join(output_dir, bench_path.stem)
+            future = executor.submit(run_design, bench_path, result_dir, vectorized, cache, rebuild, details,
+                                     report_formats, cache_dir)
+            futures[future] = bench_path
+        for future in as_completed(futures):
+            bench_path = futures[future]
+            try:
+                results[bench_path.stem] = future.result()
+            except Exception as error:  # pylint: disable=broad-except
+                # Keep running the other designs, and report the failure at the end
+                files_with_errors.append((bench_path.name, error))
+    return results, files_with_errors
 
-            # Create a directory for the results if it doesn't exist
-            if not os.path.exists(result_dir):
-                os.makedirs(result_dir)
+def print_summary(results, wall_time, jobs):
+    '''Function to print the per-design timings of a batch'''
+    print(f"{'design':<8} {'nodes':>7} {'parse ms':>9} {'forward ms':>11} {'backward ms':>12} "
+          f"{'report ms':>10} {'total ms':>9}")
+    hits = misses = 0
+    for design in sorted(results):
+        nodes, *times, design_hits, design_misses = results[design]
+        hits += design_hits
+        misses += design_misses
+        print(f"{design:<8} {nodes:>7} {times[0]*1000:>9.1f} {times[1]*1000:>11.1f} "
+              f"{times[2]*1000:>12.1f} {times[3]*1000:>10.1f} {sum(times)*1000:>9.1f}")
+    print(f"\n{len(results)} designs in {wall_time:.2f} s on {jobs} worker processes")
+    if hits + misses:
+        print(f"Arc cache: {hits} hits, {misses} misses ({hits/(hits+misses):.1%} hit rate)")
 
-            # Copy the contents from SOURCE_DIR to result_dir
-            for item in os.listdir(SOURCE_DIR):
-                s = os.path.join(SOURCE_DIR, item)
-                d = os.path.join(result_dir, item)
-                if os.path.isdir(s):
-                    shutil.copytree(s, d, dirs_exist_ok=True)  # For directories
-                else:
-                    shutil.copy2(s, d)  # For files
+def parse_arguments():
+    '''Function to parse command line arguments'''
+    parser = argparse.ArgumentParser()
+    # Argument to read .lib files
+    parser.add_argument("--read_nldm", action = "store", default = NLDM_LIB_PATH, help = "Reads .lib files.")
+    # Arguments for the designs and the results
+    parser.add_argument("--bench_dir", action = "store", default = BENCH_DIR, help = "Folder of the .bench files.")
+    parser.add_argument("--output_dir", action = "store", default = OUTPUT_DIR,
+                        help = "Folder of the results, every design writes to its own sub-folder.")
+    # Arguments for the reports of every design
+    parser.add_argument("--report", action = "store", nargs = "+", choices = REPORT_FORMATS, default = ["text"],
+                        help = "Reports to write, the text report, the binary report of all the timing values, or both.")
+    parser.add_argument("--details", action = "store_true", help = "Writes the gate counts, fan-outs and fan-ins to ckt_details.txt.")
+    # Argument for the number of worker processes
+    parser.add_argument("--jobs", action = "store", type = int, default = os.cpu_count(), help = "Number of worker processes.")
+    # Argument to compute each level of the netlist at once with NumPy
+    parser.add_argument("--vectorized", action = "store_true", help = "Uses the levelized, vectorized engine.")
+    # Arguments to memoize the cell arc lookups, one cache per worker process shared by its designs
+    parser.add_argument("--arc-cache", action = "store", type = int, nargs = "?", const = ARC_CACHE_SIZE,
+                        help = "Memoizes the cell arc lookups, keeping at most the given number of entries per worker.")
+    parser.add_argument("--arc-cache-tolerance", action = "store", type = float, default = 0.0,
+                        help = "Rounds input slews to multiples of the tolerance for the arc cache, 0 keeps exact values.")
+    # Arguments to skip or refresh the cache of parsed netlists and libraries
+    parser.add_argument("--no-cache", action = "store_true", help = "Parses the input files without the cache.")
+    parser.add_argument("--rebuild-cache", action = "store_true", help = "Parses the input files again and replaces their cache.")
+    parser.add_argument("--cache_dir", action = "store", default = parse_cache.CACHE_DIR,
+                        help = "Directory of the cache files, by default the cache folder next to src.")
+    args = parser.parse_args()
+    # The vectorized engine interpolates whole levels, it doesn't read the arc cache
+    if args.arc_cache is not None and args.vectorized:
+        parser.error("--arc-cache applies to the scalar engine only, it can't be given with --vectorized")
+    return args
 
-        except subprocess.CalledProcessError:
-            # If an error occurs, add the filename to the list of files with errors
-            files_with_errors.append(filename)
+def main():
+    '''Main function of execute.py'''
+    # Parse command line arguments
+    inputs = parse_arguments()
+    start_time = time.perf_counter()
+    # Read the standard cells once, the worker processes share them
+    std_cell = parse_cache.read_library(Path(inputs.read_nldm), not inputs.no_cache, inputs.rebuild_cache,
+                                        inputs.cache_dir)
+    bench_paths = sorted(Path(inputs.bench_dir).glob("*.bench"))
+    results, files_with_errors = run_batch(std_cell, bench_paths, inputs.output_dir, inputs.jobs,
+                                           inputs.vectorized, not inputs.no_cache, inputs.rebuild_cache,
+                                           inputs.arc_cache, inputs.arc_cache_tolerance, inputs.details,
+                                           tuple(inputs.report), inputs.cache_dir)
+    print_summary(results, time.perf_counter() - start_time, inputs.jobs)
+    # After all files have been processed, check if there are any files with errors
+    if files_with_errors:
+        print("The following files showed errors during execution:")
+        for file, error in files_with_errors:
+            print(f"{file}: {error}")
 
-# After all files have been processed, check if there are any files with errors
-if files_with_errors:
-    print("The following files showed errors during execution:")
-    for file in files_with_errors:
-        print(file)
+if __name__ == '__main__':
+    main()
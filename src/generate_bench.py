@@ -0,0 +1,150 @@
+'''Generates synthetic .bench netlists of any size, with the gate types of the NLDM library'''
+import argparse
+import gzip
+import lzma
+import random
+
+# Gate types and how often they are used, close to the mix of the circuits in the bench folder
+GATE_MIX = {
+    "NAND": 0.60,
+    "AND": 0.12,
+    "NOT": 0.14,
+    "OR": 0.03,
+    "NOR": 0.03,
+    "XOR": 0.02,
+    "BUFF": 0.06,
+}
+
+# Gate types with a single input
+SINGLE_INPUT_GATES = ("NOT", "BUFF")
+
+# Attempts to find a driver below the fan-out limit before taking any driver
+DRIVER_ATTEMPTS = 8
+
+# Fan-out distributions, uniform picks drivers evenly, powerlaw in proportion to their fan-outs
+FANOUT_DISTRIBUTIONS = ("uniform", "powerlaw")
+
+def open_output(path):
+    '''Function to open the generated .bench file for writing, compressed if its suffix is .gz or .xz'''
+    path = str(path)
+    if path.endswith(".gz"):
+        return gzip.open(path, "wt", encoding="utf-8")
+    if path.endswith(".xz"):
+        return lzma.open(path, "wt", encoding="utf-8")
+    return open(path, "w", encoding="utf-8")
+
+def generate_bench(path, gates, inputs=None, depth=None, max_fanin=2, max_fanout=16, fanout="uniform",
+                   reconvergence=0.2, window=4, seed=0):
+    '''Function to write a synthetic netlist and return its number of gates, inputs and outputs
+
+    Gates are placed in 'depth' levels of equal size. The first input of every gate
+    comes from the level right before it, so the netlist has the given logic depth,
+    the other inputs from the 'window' levels before it. With the probability
+    'reconvergence', an input is taken from the drivers of the first input instead,
+    so that two paths from that driver meet again at the gate. Drivers are picked
+    evenly from the window, or from all the earlier levels in proportion to their
+    fan-outs for a power-law fan-out distribution, and nets with 'max_fanout'
+    fan-outs are avoided. Nets without fan-outs are the primary outputs. The
+    same arguments and seed give the same netlist.'''
+    if fanout not in FANOUT_DISTRIBUTIONS:
+        raise ValueError(f"Unknown fan-out distribution {fanout}, choose one of {', '.join(FANOUT_DISTRIBUTIONS)}")
+    rng = random.Random(seed)
+    inputs = inputs or max(2, int(gates ** 0.5))
+    depth = max(1, min(depth or max(1, int(gates ** 0.25) * 4), gates))
+    gate_types = list(GATE_MIX)
+    gate_weights = list(GATE_MIX.values())
+    names = [f"I{number}" for number in range(inputs)]
+    fanouts = [0] * inputs
+    fanins = [None] * inputs
+    # Nodes of every level, the primary inputs are level 0
+    levels = [range(0, inputs)]
+    # Every node once, and once more for every fan-out, for drivers picked in proportion to their fan-outs
+    attachments = list(range(inputs))
+    with open_output(path) as bench_file:
+        bench_file.write(f"# Synthetic netlist, {gates} gates, {inputs} inputs, depth {depth}, seed {seed}\n")
+        for name in names:
+            bench_file.write(f"INPUT({name})\n")
+        bench_file.write("\n")
+        def pick_driver(level):
+            # Drivers come from the window of levels before the gate
+            first_driver = levels[max(0, level - window)].start
+            last_driver = levels[level-1].stop
+            for _ in range(DRIVER_ATTEMPTS):
+                if fanout == "powerlaw":
+                    driver = attachments[rng.randrange(len(attachments))]
+                else:
+                    driver = rng.randrange(first_driver, last_driver)
+                if fanouts[driver] < max_fanout:
+                    break
+            return driver
+        for level in range(1, depth + 1):
+            first_node = len(names)
+            level_gates = gates * level // depth - gates * (level - 1) // depth
+            for _ in range(level_gates):
+                gate_type = rng.choices(gate_types, gate_weights)[0]
+                num_fanins = 1 if gate_type in SINGLE_INPUT_GATES else rng.randint(2, max(2, max_fanin))
+                previous = levels[level-1]
+                gate_fanins = [rng.randrange(previous.start, previous.stop)]
+                first_fanins = fanins[gate_fanins[0]]
+                for _ in range(DRIVER_ATTEMPTS * num_fanins):
+                    if len(gate_fanins) == num_fanins:
+                        break
+                    if first_fanins and rng.random() < reconvergence:
+                        driver = rng.choice(first_fanins)
+                    else:
+                        driver = pick_driver(level)
+                    # A gate doesn't take the same net twice, small netlists may leave it with fewer inputs
+                    if driver not in gate_fanins:
+                        gate_fanins.append(driver)
+                for driver in gate_fanins:
+                    fanouts[driver] += 1
+                name = f"G{len(names) - inputs}"
+                names.append(name)
+                fanouts.append(0)
+                fanins.append(gate_fanins)
+                bench_file.write(f"{name} = {gate_type}({', '.join(names[driver] for driver in gate_fanins)})\n")
+            levels.append(range(first_node, len(names)))
+            # Gates of a level drive later levels only
+            if fanout == "powerlaw":
+                attachments.extend(range(first_node, len(names)))
+                attachments.extend(driver for node in range(first_node, len(names)) for driver in fanins[node])
+        # Nets without fan-outs are the primary outputs, declared after the gates so that they are streamed
+        outputs = [name for node, name in enumerate(names) if fanouts[node] == 0 and node >= inputs]
+        bench_file.write("\n")
+        for name in outputs:
+            bench_file.write(f"OUTPUT({name})\n")
+    return gates, inputs, len(outputs)
+
+def parse_arguments():
+    '''Function to parse command line arguments'''
+    parser = argparse.ArgumentParser()
+    # Argument for the generated file
+    parser.add_argument("output", help = "Path of the generated .bench file, compressed if it ends with .gz or .xz.")
+    # Arguments for the size and the shape of the netlist
+    parser.add_argument("--gates", action = "store", type = int, default = 10000, help = "Number of logical gates.")
+    parser.add_argument("--inputs", action = "store", type = int, default = None,
+                        help = "Number of primary inputs, by default the square root of the gates.")
+    parser.add_argument("--depth", action = "store", type = int, default = None,
+                        help = "Logic depth, by default 4 times the fourth root of the gates.")
+    parser.add_argument("--max_fanin", action = "store", type = int, default = 2, help = "Most inputs of a gate.")
+    parser.add_argument("--max_fanout", action = "store", type = int, default = 16, help = "Fan-outs a net gets before others are preferred.")
+    parser.add_argument("--fanout", action = "store", choices = FANOUT_DISTRIBUTIONS, default = "uniform",
+                        help = "Fan-out distribution.")
+    parser.add_argument("--reconvergence", action = "store", type = float, default = 0.2,
+                        help = "Probability that an input is taken from the drivers of the first input.")
+    parser.add_argument("--window", action = "store", type = int, default = 4, help = "Levels the inputs of a gate come from.")
+    parser.add_argument("--seed", action = "store", type = int, default = 0, help = "Seed of the random number generator.")
+    args = parser.parse_args()
+    return args
+
+def main():
+    '''Main function of generate_bench.py'''
+    # Parse command line arguments
+    inputs = parse_arguments()
+    gates, primary_inputs, primary_outputs = generate_bench(
+        inputs.output, inputs.gates, inputs.inputs, inputs.depth, inputs.max_fanin, inputs.max_fanout,
+        inputs.fanout, inputs.reconvergence, inputs.window, inputs.seed)
+    print(f"{inputs.output}: {gates} gates, {primary_inputs} inputs, {primary_outputs} outputs")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+'''Instrumentation of the analysis, wall time of the phases, operation counts and memory high-water marks'''
+from contextlib import contextmanager, nullcontext
+import functools
+import json
+import os
+import sys
+import time
+import tracemalloc
+try:
+    import resource
+except ImportError:
+    # Process memory is only available on Unix
+    resource = None
+
+# Bytes per unit of ru_maxrss, macOS reports bytes and Linux kilobytes
+MAX_RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+class Stats:
+    '''Wall time, operation counts and memory high-water marks of the phases of an analysis
+
+    Objects that are instrumented hold a Stats object in their 'stats' attribute,
+    None disables the instrumentation. Operations are counted once per pass, never
+    per node, so that a disabled Stats costs one attribute check per pass.
+    Peak Python allocations are recorded only when tracemalloc is already tracing,
+    as it slows the analysis down, the maximum resident set size always is.'''
+    def __init__(self):
+        self.phases = {}    # Wall time of every phase, summed over its runs
+        self.calls = {}     # Number of runs of every phase
+        self.counters = {}  # Counts of the key operations
+        self.peak_memory = {}   # Peak traced memory of every phase
+        self.max_rss = {}   # Maximum resident set size of the process after every phase
+        self.overhead = 0.0 # Time spent counting operations, left out of the phases
+
+    @contextmanager
+    def phase(self, name):
+        '''Function to record the wall time and memory high-water marks of a phase'''
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+        start_time = time.perf_counter()
+        start_overhead = self.overhead
+        try:
+            yield self
+        finally:
+            elapsed = time.perf_counter() - start_time - (self.overhead - start_overhead)
+            self.phases[name] = self.phases.get(name, 0.0) + elapsed
+            self.calls[name] = self.calls.get(name, 0) + 1
+            if tracing:
+                self.peak_memory[name] = max(self.peak_memory.get(name, 0), tracemalloc.get_traced_memory()[1])
+            if resource is not None:
+                self.max_rss[name] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * MAX_RSS_UNIT
+
+    @contextmanager
+    def counting(self):
+        '''Function to get a context for counting operations, whose time is left out of the phases'''
+        start_time = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.overhead += time.perf_counter() - start_time
+
+    def count(self, name, value=1):
+        '''Function to add to the count of an operation'''
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def as_dict(self):
+        '''Function to get the recorded values as a dictionary of plain values'''
+        return {
+            "phase_seconds": self.phases,
+            "phase_calls": self.calls,
+            "counters": self.counters,
+            "peak_traced_memory_bytes": self.peak_memory,
+            "max_rss_bytes": self.max_rss,
+            "counting_overhead_seconds": self.overhead,
+        }
+
+    def write(self, output_dir, file_name="ckt_stats.json"):
+        '''Function to write the recorded values as a JSON file to the output directory'''
+        # Create output directory if it doesnt exist
+        if not os.path.isdir(output_dir):
+            os.makedirs(output_dir)
+        with open(os.path.join(output_dir, file_name), "w", encoding="utf-8") as stats_file:
+            json.dump(self.as_dict(), stats_file, indent=1)
+
+def phase(stats, name):
+    '''Function to get a context recording a phase in the stats, or doing nothing without stats'''
+    if stats is None:
+        return nullcontext()
+    return stats.phase(name)
+
+def timed(name):
+    '''Decorator to record the runs of a method as a phase in the stats of its object'''
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self.stats is None:
+                return method(self, *args, **kwargs)
+            with self.stats.phase(name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
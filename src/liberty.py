@@ -0,0 +1,286 @@
+'''Indexed Liberty reader, cells are parsed only when an analysis uses them'''
+from collections.abc import Mapping
+import mmap
+import re
+import time
+import main_parser
+from nldm_table import NLDMTable
+
+# Start of a cell group, 'cell (NAME) {' at the start of a line
+CELL_HEADER = re.compile(rb'^[ \t]*cell[ \t]*\([ \t]*"?([^"()\s]+)"?[ \t]*\)', re.MULTILINE)
+
+# Tokens of the Liberty syntax, whitespace, line continuations and comments are skipped
+TOKEN = re.compile(r'(\s+|\\\s*\n|/\*.*?\*/|//[^\n]*)|"((?:[^"\\]|\\.)*)"|([^\s(){}:;,"\\]+)|([(){}:;,])', re.DOTALL)
+
+# Gate types of .bench files named differently from their cells
+GATE_ALIASES = {"NOT": "INV", "BUFF": "BUF"}
+
+# Table template variables the engine uses, the input slew and the output load axes
+SLEW_VARIABLE = "input_net_transition"
+LOAD_VARIABLE = "total_output_net_capacitance"
+
+class LibertyError(ValueError):
+    '''Error raised for a cell of a Liberty file that can't be read, like a table without values or indexes'''
+
+class Group:
+    '''Liberty group, 'type (arguments) { attributes and groups }\''''
+    __slots__ = ("type", "args", "attributes", "groups")
+
+    def __init__(self, group_type, args):
+        self.type = group_type      # Group type, like cell, pin or timing
+        self.args = args            # Arguments of the group, like the cell name
+        self.attributes = {}        # Simple attributes, and complex attributes as lists of arguments
+        self.groups = []            # Groups inside the group, in file order
+
+    def find(self, group_type):
+        '''Function to get the groups of a type inside the group'''
+        return [group for group in self.groups if group.type == group_type]
+
+def tokenize(text):
+    '''Function to split Liberty text into strings, words and punctuation'''
+    tokens = []
+    for match in TOKEN.finditer(text):
+        if match.group(1) is not None:
+            continue
+        if match.group(2) is not None:
+            tokens.append(("string", match.group(2)))
+        elif match.group(3) is not None:
+            tokens.append(("word", match.group(3)))
+        else:
+            tokens.append(("punct", match.group(4)))
+    return tokens
+
+def parse_statements(tokens, position, group):
+    '''Function to parse attributes and groups into a group until its closing brace or the end of the tokens
+
+    Returns the position after the closing brace.'''
+    while position < len(tokens):
+        kind, value = tokens[position]
+        if kind == "punct" and value == "}":
+            return position + 1
+        if kind == "punct":
+            # Stray separators, like a ';' after a group
+            position += 1
+            continue
+        name = value
+        position += 1
+        if position < len(tokens) and tokens[position] == ("punct", ":"):
+            # Simple attribute, 'name : value ;'
+            values = []
+            position += 1
+            while position < len(tokens) and tokens[position][0] != "punct":
+                values.append(tokens[position][1])
+                position += 1
+            group.attributes[name] = " ".join(values)
+        elif position < len(tokens) and tokens[position] == ("punct", "("):
+            args = []
+            position += 1
+            while position < len(tokens) and tokens[position] != ("punct", ")"):
+                if tokens[position][0] != "punct":
+                    args.append(tokens[position][1])
+                position += 1
+            position += 1
+            if position < len(tokens) and tokens[position] == ("punct", "{"):
+                # Group, 'name (args) { ... }'
+                child = Group(name, args)
+                position = parse_statements(tokens, position + 1, child)
+                group.groups.append(child)
+            else:
+                # Complex attribute, 'name (args) ;'
+                group.attributes[name] = args
+        if position < len(tokens) and tokens[position] == ("punct", ";"):
+            position += 1
+    return position
+
+def parse_group(text):
+    '''Function to parse the first group of Liberty text, text after its closing brace is ignored'''
+    tokens = tokenize(text)
+    root = Group("", [])
+    parse_statements(tokens, 0, root)
+    if not root.groups:
+        raise ValueError("Liberty text has no group")
+    return root.groups[0]
+
+def numbers(values):
+    '''Function to get the numbers of a Liberty value list, like "0.1, 0.2, 0.3"'''
+    return [float(value) for value in re.split(r",\s*", values.strip()) if value]
+
+def read_cell_map(path):
+    '''Function to read a gate type to cell mapping file, one gate type and its cell name per line'''
+    cell_map = {}
+    with open(path, "r", encoding="utf-8") as map_file:
+        for line_number, line in enumerate(map_file, 1):
+            line = line.strip()
+            # Skip lines having comments or empty lines
+            if not line or line[0] == "#":
+                continue
+            fields = line.split()
+            if len(fields) != 2:
+                raise ValueError(f"{path}:{line_number}: expected 'gate_type cell_name', got: {line}")
+            cell_map[fields[0]] = fields[1]
+    return cell_map
+
+class LibertyLibrary(Mapping):
+    '''Standard cells of a Liberty file by gate type, each parsed the first time it is used
+
+    Opening the library indexes the byte range of every 'cell' group with one
+    scan, and parses the library header for its table templates. A cell is
+    tokenized and parsed when its gate type is looked up, so an analysis only
+    pays for the gate types of its netlist. Gate types map to the first cell
+    named after them, NAND to NAND2_X1 for example, and NOT and BUFF to the INV
+    and BUF cells, unless a cell map gives the cell of a gate type. Cells give
+    the same values as read_nldm. Tables of templates listing the output load
+    before the input slew are transposed, and other axes raise LibertyError. Delays and slews come from the cell_delay and
+    output_slew tables of the cell, or from the worst of the rise and fall
+    tables of the timing arcs of its output pin. Cells that can't be read raise
+    LibertyError when they are looked up.'''
+    def __init__(self, path, cell_map=None, stats=None):
+        start_time = time.perf_counter()
+        self.path = str(path)       # Path of the .lib file
+        self.stats = stats          # Instrumentation of the reads, None to disable it
+        self.cells = {}             # Parsed standard cells by cell name
+        self.bytes_touched = 0      # Bytes of the file parsed
+        with open(self.path, "rb") as lib_file, \
+             mmap.mmap(lib_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            self.size = len(mapped) # Size of the file
+            # Byte range of every cell group, up to the next cell or the end of the file
+            starts = [(match.group(1).decode(), match.start()) for match in CELL_HEADER.finditer(mapped)]
+            self.index = {}         # Start and end of every cell group by cell name
+            for number, (name, start) in enumerate(starts):
+                end = starts[number+1][1] if number + 1 < len(starts) else len(mapped)
+                self.index.setdefault(name, (start, end))
+            header_end = starts[0][1] if starts else len(mapped)
+            header = mapped[:header_end].decode("utf-8")
+        self.bytes_touched += header_end
+        # Table templates of the library header give the indexes tables leave out
+        self.templates = {}         # Variables and indexes of every table template
+        library = parse_group(header + "}") if header.strip() else Group("library", [])
+        for template in library.find("lu_table_template"):
+            if template.args:
+                self.templates[template.args[0]] = template.attributes
+        # Gate types of the cells, the first cell of every alphabetic prefix
+        self.cell_map = {}          # Cell name of every gate type
+        prefix_cells = {}           # Cells of every alphabetic prefix, in file order
+        for name in self.index:
+            prefix = re.match(r"[A-Z]+", name)
+            if prefix is not None:
+                self.cell_map.setdefault(prefix.group(0), name)
+                prefix_cells.setdefault(prefix.group(0), []).append(name)
+        for gate_type, alias in GATE_ALIASES.items():
+            if alias in self.cell_map:
+                self.cell_map.setdefault(gate_type, self.cell_map[alias])
+        for gate_type, name in (cell_map or {}).items():
+            if name not in self.index:
+                raise ValueError(f"Cell {name} of {gate_type} is not in {self.path}")
+            self.cell_map[gate_type] = name
+        # Gate types several cells are named after, and the cell map doesn't give, get the first one
+        self.shadowed = {gate_type: names for gate_type, names in prefix_cells.items()
+                         if len(names) > 1 and gate_type not in (cell_map or {})}   # Cells of ambiguous gate types
+        self.index_time = time.perf_counter() - start_time  # Time spent indexing the cells and parsing the header
+        self.parse_time = 0.0       # Time spent parsing cells
+        if stats is not None:
+            stats.count("lib_cells_indexed", len(self.index))
+            stats.count("lib_bytes_touched", header_end)
+
+    def __getitem__(self, gate_type):
+        name = self.cell_map[gate_type]
+        cell = self.cells.get(name)
+        if cell is None:
+            cell = self.cells[name] = self.read_cell(name)
+        return cell
+
+    def __iter__(self):
+        return iter(self.cell_map)
+
+    def __len__(self):
+        return len(self.cell_map)
+
+    def __getstate__(self):
+        # Worker processes get the index and the parsed cells, and parse the others from the file
+        state = dict(self.__dict__)
+        state["stats"] = None
+        return state
+
+    def read_cell(self, name):
+        '''Function to parse one cell group of the file into a standard cell'''
+        start_time = time.perf_counter()
+        start, end = self.index[name]
+        with open(self.path, "rb") as lib_file:
+            lib_file.seek(start)
+            text = lib_file.read(end - start).decode("utf-8")
+        try:
+            cell = self.parse_cell(name, parse_group(text))
+        except LibertyError:
+            raise
+        except (KeyError, IndexError, TypeError, ValueError) as error:
+            # Missing attributes and values that aren't numbers
+            raise LibertyError(f"Cell {name} of {self.path} can't be read: {error!r}") from None
+        self.bytes_touched += end - start
+        self.parse_time += time.perf_counter() - start_time
+        if self.stats is not None:
+            self.stats.count("cells_parsed")
+            self.stats.count("lib_bytes_touched", end - start)
+        return cell
+
+    def parse_cell(self, name, group):
+        '''Function to get the standard cell of a parsed cell group'''
+        cell = main_parser.Lib()
+        cell.cell_name = name
+        cell.gate_type = re.match(r"[A-Z]*", name).group(0)
+        # Input capacitance of the cell, or the largest one of its input pins
+        capacitance = group.attributes.get("capacitance")
+        if capacitance is None:
+            capacitance = max([float(pin.attributes["capacitance"]) for pin in group.find("pin")
+                               if pin.attributes.get("direction") == "input" and "capacitance" in pin.attributes],
+                              default=0.0)
+        cell.input_capacitance = round(float(capacitance), 3)
+        delay_tables = group.find("cell_delay")
+        slew_tables = group.find("output_slew")
+        if not delay_tables:
+            # Timing arcs of the output pin, the worst of rise and fall
+            arcs = [timing for pin in group.find("pin") if pin.attributes.get("direction") == "output"
+                    for timing in pin.find("timing")]
+            delay_tables = [table for arc in arcs for table in arc.find("cell_rise") + arc.find("cell_fall")]
+            slew_tables = [table for arc in arcs for table in arc.find("rise_transition") + arc.find("fall_transition")]
+        if not delay_tables or not slew_tables:
+            raise LibertyError(f"Cell {name} of {self.path} has no delay or slew table")
+        cell.input_slew, cell.output_load, cell.delay = self.read_tables(name, delay_tables)
+        input_slew, output_load, cell.slew = self.read_tables(name, slew_tables)
+        if input_slew != cell.input_slew or output_load != cell.output_load:
+            raise LibertyError(f"Cell {name} of {self.path} has delay and slew tables with different indexes")
+        cell.table = NLDMTable.from_cell(cell)
+        return cell
+
+    def read_tables(self, name, tables):
+        '''Function to get the indexes and the element-wise worst values of lookup tables with the same indexes'''
+        input_slew = output_load = values = None
+        for table in tables:
+            template = self.templates.get(table.args[0], {}) if table.args else {}
+            indexes = [table.attributes.get(index) or template.get(index) for index in ("index_1", "index_2")]
+            if not all(indexes) or "values" not in table.attributes:
+                raise LibertyError(f"Cell {name} of {self.path} has a {table.type} table without "
+                                   f"{'values' if all(indexes) else 'indexes or a template giving them'}")
+            index_1, index_2 = [numbers(index[0]) for index in indexes]
+            rows = [numbers(row) for row in table.attributes["values"]]
+            variables = (template.get("variable_1", SLEW_VARIABLE), template.get("variable_2", LOAD_VARIABLE))
+            if variables == (LOAD_VARIABLE, SLEW_VARIABLE):
+                # Load first, rows go along the output load, transposed to rows along the input slew
+                index_1, index_2 = index_2, index_1
+                rows = [list(column) for column in zip(*rows)]
+            elif variables != (SLEW_VARIABLE, LOAD_VARIABLE):
+                raise LibertyError(f"Cell {name} of {self.path} has a {table.type} table with axes "
+                                   f"{', '.join(variables)}, expected {SLEW_VARIABLE} and {LOAD_VARIABLE}")
+            if values is None:
+                input_slew, output_load, values = index_1, index_2, rows
+            elif index_1 != input_slew or index_2 != output_load:
+                raise LibertyError(f"Timing arcs of cell {name} of {self.path} have tables with different indexes")
+            else:
+                values = [[max(value, other) for value, other in zip(row, other_row)]
+                          for row, other_row in zip(values, rows)]
+        return input_slew, output_load, values
+
+    def summary(self):
+        '''Function to get a line with the cells parsed, the bytes touched and the time spent'''
+        return (f"Liberty: {len(self.index)} cells indexed in {self.index_time*1000:.2f} ms, "
+                f"{len(self.cells)} parsed in {self.parse_time*1000:.2f} ms, "
+                f"{self.bytes_touched} of {self.size} bytes touched")
@@ -0,0 +1,51 @@
+'''Load annotation files, the capacitance of primary outputs and the wire capacitance of nets'''
+from timing_graph import OUTPUT
+
+class LoadError(ValueError):
+    '''Error raised for a load file that can't be read, or a load of a net that isn't in the netlist'''
+
+def read_loads(path):
+    '''Function to read a load file, one net and its capacitance per line
+
+    Lines are 'net capacitance', in the capacitance unit of the library, empty
+    lines and lines starting with '#' are skipped. Returns the capacitance of
+    every net.'''
+    loads = {}
+    with open(path, "r", encoding="utf-8") as load_file:
+        for line_number, line in enumerate(load_file, 1):
+            line = line.strip()
+            # Skip lines having comments or empty lines
+            if not line or line[0] == "#":
+                continue
+            fields = line.split()
+            try:
+                if len(fields) != 2:
+                    raise ValueError
+                capacitance = float(fields[1])
+            except ValueError:
+                raise LoadError(f"{path}:{line_number}: expected 'net capacitance', got: {line}") from None
+            if capacitance < 0:
+                raise LoadError(f"{path}:{line_number}: capacitance of {fields[0]} is negative")
+            loads[fields[0]] = capacitance
+    return loads
+
+def resolve_loads(graph, output_loads=None, wire_caps=None):
+    '''Function to map the loads of primary output nets and the wire capacitances of nets to node IDs
+
+    Returns the load of every output port node and the wire capacitance of
+    every net node, raises LoadError for nets that aren't in the netlist.'''
+    port_loads = {}
+    for net, capacitance in (output_loads or {}).items():
+        node = graph.ids.get(net)
+        ports = [] if node is None else [fanout for fanout in graph.fanouts(node) if graph.node_type[fanout] == OUTPUT]
+        if not ports:
+            raise LoadError(f"{net} is not a primary output of the netlist")
+        for port in ports:
+            port_loads[port] = capacitance
+    net_caps = {}
+    for net, capacitance in (wire_caps or {}).items():
+        node = graph.ids.get(net)
+        if node is None or graph.node_type[node] == OUTPUT:
+            raise LoadError(f"{net} is not a net of the netlist")
+        net_caps[node] = capacitance
+    return port_loads, net_caps
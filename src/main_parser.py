@@ -1,8 +1,28 @@
 '''Python file to parse .bench files'''
 import argparse
+import gzip
+import lzma
 from pathlib import Path
 import re
 import os
+import sys
+from nldm_table import NLDMTable
+
+# Version of the parsers, cached netlists and libraries of another version are parsed again
+PARSER_VERSION = 1
+
+# Directory the reports are written to
+OUTPUT_DIR = '../output'
+
+# Output slew of the primary inputs
+PRIMARY_INPUT_SLEW = 0.002
+
+# Characters read from a .bench file at once
+BENCH_CHUNK_SIZE = 1 << 20
+
+# Magic bytes of gzip and xz compressed files
+GZIP_MAGIC = b"\x1f\x8b"
+XZ_MAGIC = b"\xfd7zXZ\x00"
 
 class Gates:
     '''# Class to store netlist's details'''
@@ -27,85 +47,64 @@ class Lib:
         self.output_load = []   # Index 2 - Output load
         self.delay = [] # 2D array of delays
         self.slew = [] # 2D array of slews
+        self.table = None   # Compiled delay and slew lookup table
 
-def read_ckt(path):
-    '''Function to read netlist'''
-    # Dictionary to store the count of different types of gates
-    node_count = {}
-    # Dictionary to store gate onjects of the circuit
-    circuit = {}
-    # Iterae through all the lines of the netlist
-    for line in path.open():
-        # Skip lines having comments or empty lines
-        if re.search(r"^#|^\s", line):
-            continue
-        # Finding the logical gate type
-        node = re.search(r"(?:\s|)([a-zA-Z0-9]+)(?:\()", line).group(1)
-        # Incrementing the node count
-        node_count[node] = node_count.get(node, 0) + 1
-        # Check if the node is a logical gate
-        if node in ("INPUT", "OUTPUT"):
-            # Read inputs of the gate
-            inputs_list = re.findall(r"(?<=\()(.*?)(?=\))", line)
-            inputs = re.split(',\s|,', inputs_list[0])
-            # Read output of the gate
-            output= re.search(r"(\w+)(:?\s=)", line).group(1)
-            # Create an object for Gates class if it doesnt exist already and store all the details
-            if output not in circuit:
-                gate = Gates()
-                circuit[output] = gate
-            circuit[output].type = node
-            circuit[output].name = node + "-" + output
-            circuit[output].fanins = inputs[:]
-            # Iterate through all the fan-ins of the circuit and assign fan-outs to those inputs
-            for i in inputs:
-                # If the node is not present in dictionary, create it
-                if i not in circuit:
-                    circuit[i] = Gates()
-                circuit[i].fanouts.append(output)
-        # Check if the node is input
-        elif node == "INPUT":
-            # Read net associated with input port
-            net = re.search(r"[\(,](\w+)[,\)]", line).group(1)
-            # Create a class Gates object and store all the port details
-            port = Gates()
-            port.type = node
-            port.name = node + "-" + net
-            port.output_slew = 0.002
-            port.max_output_arrival = 0
-            circuit[net] = port
-        # Check if the node is output
-        elif node == "OUTPUT":
-            # Read net associated with output port
-            net = re.search(r"[\(,](\w+)[,\)]", line).group(1)
-            # Check if the output already exists in the dictionary
-            if f"{net}-o" not in circuit:
-                # Create a class Gates object and store all the port details
-                port = Gates()
-                port.type = node
-                port.name = node + "-" + net
-                port.fanins.append(net)
-                circuit[f"{net}-o"] = port
-                # If the node is not present in dictionary, create it
-                if net not in circuit:
-                    circuit[net] = Gates()
-                # Assign fan-out to the input node
-                circuit[net].fanouts.append(f"{net}-o")
-    # For the case of logical gates with dangling outputs, attach an output node
-    for key, value in list(circuit.items()):
-        if len(value.fanouts)==0 and value.type != "OUTPUT":
-            port = Gates()
-            port.type = "OUTPUT"
-            port.name = port.type + "-" + key
-            port.fanins.append(key)
-            circuit[f"{key}-o"] = port
-            value.fanouts.append(f"{key}-o")
+def open_bench(path):
+    '''Function to open a .bench file as text, gzip and xz compressed files are decompressed on the fly'''
+    # Recognize compressed files by their magic bytes, not by their suffix
+    with open(path, "rb") as bench_file:
+        magic = bench_file.read(6)
+    if magic.startswith(GZIP_MAGIC):
+        return gzip.open(path, "rt", encoding="utf-8")
+    if magic.startswith(XZ_MAGIC):
+        return lzma.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+def bench_lines(bench_file):
+    '''Function to read the lines of a .bench file in large chunks'''
+    remainder = ""
+    while True:
+        chunk = bench_file.read(BENCH_CHUNK_SIZE)
+        if not chunk:
+            break
+        lines = (remainder + chunk).split("\n")
+        # The last line of a chunk can continue in the next chunk
+        remainder = lines.pop()
+        yield lines
+    yield [remainder]
+
+def tokenize_bench(bench_file):
+    '''Function to tokenize the statements of a .bench file
+
+    Yields the node type, the net and the interned fan-in nets of every gate, and
+    the node type, the net and None for every INPUT and OUTPUT port.'''
+    intern = sys.intern
+    for lines in bench_lines(bench_file):
+        for line in lines:
+            line = line.strip()
+            # Skip lines having comments or empty lines
+            if not line or line[0] == "#":
+                continue
+            open_index = line.find("(")
+            close_index = line.rfind(")")
+            if open_index < 0 or close_index < open_index:
+                raise ValueError(f"Can't parse the .bench statement: {line}")
+            equal_index = line.find("=", 0, open_index)
+            # Ports have no output net, 'INPUT(net)'
+            if equal_index < 0:
+                yield line[:open_index].strip(), intern(line[open_index+1:close_index].strip()), None
+            # Gates assign to their output net, 'net = TYPE(fanin, fanin)'
+            else:
+                yield (line[equal_index+1:open_index].strip(), intern(line[:equal_index].strip()),
+                       [intern(net.strip()) for net in line[open_index+1:close_index].split(",")])
+
+def write_details(circuit, node_count, output_dir=OUTPUT_DIR):
+    '''Function to write the count of every gate type, and the fan-outs and fan-ins of every gate, to ckt_details.txt'''
     # Create output directory if it doesnt exist
-    output_path = "../output"
-    if not os.path.isdir(output_path):
-        os.makedirs(output_path)
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
     # Create a file to print circuit details
-    result_file = open("../output/ckt_details.txt", "w", encoding="utf-8")
+    result_file = open(os.path.join(output_dir, "ckt_details.txt"), "w", encoding="utf-8")
     # Print count of inputs, outputs and logical gates
     for key, value in node_count.items():
         if str(key) != "INPUT" and str(key) != "OUTPUT":
@@ -129,14 +128,88 @@ def read_ckt(path):
                 fanin_l.append(f"{circuit[fanin].name}")
             result_file.write(f"{value.name}: {', '.join(fanin_l)}\n")
     result_file.close() # Close the file after printing all the values in the file
+
+def read_ckt(path, output_dir=OUTPUT_DIR, stats=None, details=False):
+    '''Function to read netlist, counting its statements in stats if given
+
+    The details of the netlist, the count of every gate type and the fan-outs and
+    fan-ins of every gate, are written to ckt_details.txt in the output directory
+    only if details is set.'''
+    # Dictionary to store the count of different types of gates
+    node_count = {}
+    # Dictionary to store gate onjects of the circuit
+    circuit = {}
+    # Iterae through all the statements of the netlist
+    with open_bench(path) as bench_file:
+        for node, net, inputs in tokenize_bench(bench_file):
+            # Incrementing the node count
+            node_count[node] = node_count.get(node, 0) + 1
+            # Check if the node is a logical gate
+            if inputs is not None:
+                # Create an object for Gates class if it doesnt exist already and store all the details
+                gate = circuit.get(net)
+                if gate is None:
+                    gate = Gates()
+                    circuit[net] = gate
+                gate.type = node
+                gate.name = node + "-" + net
+                gate.fanins = inputs
+                # Iterate through all the fan-ins of the circuit and assign fan-outs to those inputs
+                for i in inputs:
+                    # If the node is not present in dictionary, create it
+                    if i not in circuit:
+                        circuit[i] = Gates()
+                    circuit[i].fanouts.append(net)
+            # Check if the node is input
+            elif node == "INPUT":
+                # Create a class Gates object and store all the port details
+                port = Gates()
+                port.type = node
+                port.name = node + "-" + net
+                port.output_slew = PRIMARY_INPUT_SLEW
+                port.max_output_arrival = 0
+                circuit[net] = port
+            # Check if the node is output
+            elif node == "OUTPUT":
+                # Check if the output already exists in the dictionary
+                if f"{net}-o" not in circuit:
+                    # Create a class Gates object and store all the port details
+                    port = Gates()
+                    port.type = node
+                    port.name = node + "-" + net
+                    port.fanins.append(net)
+                    circuit[f"{net}-o"] = port
+                    # If the node is not present in dictionary, create it
+                    if net not in circuit:
+                        circuit[net] = Gates()
+                    # Assign fan-out to the input node
+                    circuit[net].fanouts.append(f"{net}-o")
+    # For the case of logical gates with dangling outputs, attach an output node
+    for key, value in list(circuit.items()):
+        if len(value.fanouts)==0 and value.type != "OUTPUT":
+            port = Gates()
+            port.type = "OUTPUT"
+            port.name = port.type + "-" + key
+            port.fanins.append(key)
+            circuit[f"{key}-o"] = port
+            value.fanouts.append(f"{key}-o")
+    if details:
+        write_details(circuit, node_count, output_dir)
+    # Count the statements and nodes once, so that parsing costs nothing more without stats
+    if stats is not None:
+        stats.count("bench_statements", sum(node_count.values()))
+        stats.count("nodes_parsed", len(circuit))
     return circuit
 
-def read_nldm(path, delay_b=False, slews_b=False):
-    '''Function to read .lib file'''
+def read_nldm(path, delay_b=False, slews_b=False, stats=None, output_dir=OUTPUT_DIR):
+    '''Function to read .lib file, counting its lines and cells in stats if given
+
+    The delay and slew tables are written to the output directory when delay_b or slews_b is set.'''
     # Dictionary to store all the standard cells
     gates = {}
     gate_count = 0
-    for line in path.open():
+    line_count = 0
+    for line_count, line in enumerate(path.open(), 1):
         # Search for gate name in the line
         cell_name = re.search(r"(?:cell \()(.*)(?:\))", line)
         if cell_name is not None:
@@ -192,16 +265,15 @@ def read_nldm(path, delay_b=False, slews_b=False):
                     gates[current_gate].delay.append(values)
                 if output_slew_flag:
                     gates[current_gate].slew.append(values)
-    # Create output directory if it doesnt exist
-    output_path = "../output"
-    if not os.path.isdir(output_path):
-        os.makedirs(output_path)
+    # Create output directory if it doesnt exist, only when a table file is written
+    if (delay_b or slews_b) and not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
     # Create delay file if delays are enabled in arguments
     if delay_b:
-        result_file_delay = open("../output/delay_LUT.txt", "w", encoding="utf-8")
+        result_file_delay = open(os.path.join(output_dir, "delay_LUT.txt"), "w", encoding="utf-8")
     # Create slews file if delays are enabled in arguments
     if slews_b:
-        result_file_slew = open("../output/slew_LUT.txt", "w", encoding="utf-8")
+        result_file_slew = open(os.path.join(output_dir, "slew_LUT.txt"), "w", encoding="utf-8")
     for value in gates.values():
         # Print delay values if delay argument is present
         if delay_b:
@@ -231,6 +303,12 @@ def read_nldm(path, delay_b=False, slews_b=False):
     # Close the slews file
     if slews_b:
         result_file_slew.close()
+    # Compile the lookup tables of all the standard cells
+    for value in gates.values():
+        value.table = NLDMTable.from_cell(value)
+    if stats is not None:
+        stats.count("lib_lines", line_count)
+        stats.count("cells_parsed", gate_count)
     # Handle cases with cells having different names
     gates["NOT"] = gates["INV"]
     gates["BUFF"] = gates["BUF"]
@@ -247,6 +325,9 @@ def parse_arguments():
     parser.add_argument("--slews", action = "store_true", help = "Provides cell slews.")
     # Argument to read .lib files
     parser.add_argument("--read_nldm", action = "store", help = "Reads .lib files.")
+    # Argument for the folder of the delay, slew and details files
+    parser.add_argument("--output_dir", action = "store", default = OUTPUT_DIR,
+                        help = "Folder the delay, slew and details files are written to.")
     args = parser.parse_args()
     return args
 
@@ -264,7 +345,7 @@ def main():
         if path_lib.exists():
             # Call read_nldm function if the .lib file exists
             # pass delays and slews arguments to the function
-            read_nldm(path_lib, inputs.delays, inputs.slews)
+            read_nldm(path_lib, inputs.delays, inputs.slews, output_dir=inputs.output_dir)
         else:
             print(".lib file doesn't exist.")
     # Checks if the read_ckt argument is defined
@@ -274,8 +355,8 @@ def main():
         path_bench = Path(path)
         # Checks if the netlist file exists
         if path_bench.exists():
-            # Call read_ckt function if the netlist exists
-            read_ckt(path_bench)
+            # Call read_ckt function if the netlist exists, writing its details
+            read_ckt(path_bench, inputs.output_dir, details=True)
         else:
             print(".bench file doesn't exist.")
 
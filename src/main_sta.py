@@ -1,286 +1,594 @@
 '''Perform Static Timing Analysis'''
 import argparse
+import cProfile
+import heapq
 from pathlib import Path
-import random
 import os
+from array import array
+from instrumentation import Stats, phase, timed
+from liberty import LibertyError, LibertyLibrary, read_cell_map
+from load_annotation import LoadError, read_loads, resolve_loads
 import main_parser
+from nldm_table import ARC_CACHE_SIZE, ArcCache
+import parse_cache
+from path_search import PathSearch
+import report
+from slack_query import SlackQuery
+from timing_graph import INPUT, OUTPUT, CombinationalLoopError, TimingGraph
+from timing_state import TimingState, required_arrival_time, state_attribute
 
 class STA():
-    '''Static Timing Analysis class'''
-    def __init__(self, std_cell, netlist):
+    '''Static Timing Analysis class
+
+    The timing graph is only read, timing values are held by the timing state, so
+    analyses of one graph can run side by side, each with its own state.'''
+    # Timing values, held by the timing state
+    output_slew = state_attribute("output_slew")
+    max_output_arrival = state_attribute("max_output_arrival")
+    cell_delay = state_attribute("cell_delay")
+    back_traversal_arrival = state_attribute("back_traversal_arrival")
+    slack = state_attribute("slack")
+    total_circuit_delay = state_attribute("total_circuit_delay")
+    total_circuit_delay_slack = state_attribute("total_circuit_delay_slack")
+
+    def __init__(self, std_cell, netlist, output_dir=main_parser.OUTPUT_DIR, state=None):
         self.std_cell = std_cell    # Standard cell
-        self.netlist = netlist      # Netlist
-        self.in_degree = {}         # Number of fan-ins of all the nodes
-        self.out_degree = {}        # Number of fan-outs of all the nodes
-        self.cell_delay = {}        # Cell delays of the nodes
-        self.total_circuit_delay = 0.0     # Total circuit delay
-        self.total_circuit_delay_slack = 0.0   # Required arrival time for the circuit
-        self.back_traversal_arrival = {}    # Required arrival time for all the nodes
-        self.slack = {}             # Slack of the nodes
-        self.sorted_order = []      # Sorted order of the nodes
+        self.output_dir = output_dir    # Directory the reports are written to
+        self.report_formats = ("text",) # Reports written by execute, text, binary or both
+        # Compile a netlist dictionary from read_ckt into the array-backed timing graph
+        if not isinstance(netlist, TimingGraph):
+            netlist = TimingGraph.from_netlist(netlist)
+        self.graph = netlist        # Timing graph
+        num_nodes = len(self.graph)
+        # Standard cell of every gate type code, None for ports and unknown types
+        self.cells = [self.std_cell.get(name) for name in self.graph.type_names]
+        self.out_degree = array("i")    # Number of fan-outs of all the nodes
+        # Timing values of this analysis, a new state unless one of the same graph is given
+        if state is None:
+            state = TimingState(self.graph)
+        elif len(state.slack) != num_nodes or len(state.cell_delay) != len(self.graph.fanin_index):
+            raise ValueError("timing state doesn't match the timing graph")
+        self.state = state
+        self.sorted_order = array("i")  # Sorted order of the nodes
+        self.level_offsets = None   # Start of every level in the sorted order, None until the netlist is levelized
         self.final_critical_path = []   # Final critical path
-        # Calculate number of inputs and outputs for a node
-        for key in self.netlist:
-            self.in_degree[key] = len(self.netlist[key].fanins)
-            self.out_degree[key] = len(self.netlist[key].fanouts)
-
-    def interpolation(self, v11, v12, v21, v22, t1, t2, c1, c2, t, c):
-        '''# Function to calculate 2D-interpolation'''
-        term1 = v11*(c2-c)*(t2-t)
-        term2 = v12*(c-c1)*(t2-t)
-        term3 = v21*(c2-c)*(t-t1)
-        term4 = v22*(c-c1)*(t-t1)
-        numerator = term1 + term2 + term3 + term4
-        denominator = (c2-c1) * (t2-t1)
-        value = numerator/denominator
-        return value
-
-    def lookup_index(self, node, input_slew, output_capacitance):
-        '''Function to lookup indexes from '''
-        node_type = self.netlist[node].type
-        # If the input slew is beyond lookup indexes,
-        # set the row1 and row2 to the last 2 rows of the lookup table
-        if input_slew > self.std_cell[node_type].input_slew[-1]:
-            list_length = len(self.std_cell[node_type].input_slew)
-            row1 = list_length - 2
-            row2 = list_length - 1
-        # If the output capacitance is beyond lookup indexes,
-        # set the column1 and column2 to the last 2 columns of the lookup table
-        if output_capacitance > self.std_cell[node_type].output_load[-1]:
-            list_length = len(self.std_cell[node_type].output_load)
-            column1 = list_length - 2
-            column2 = list_length - 1
-        # Find the range in between which input slews and output capacitance fits in lookup table
-        for i in range(len(self.std_cell[node_type].input_slew)-1):
-            if input_slew >= self.std_cell[node_type].input_slew[i] and input_slew < self.std_cell[node_type].input_slew[i+1]:
-                row1 = i
-                row2 = i+1
-            if output_capacitance >= self.std_cell[node_type].output_load[i] and output_capacitance < self.std_cell[node_type].output_load[i+1]:
-                column1 = i
-                column2 = i+1
-        return row1, row2, column1, column2
-
-    def lookup(self, node, input_slew, output_capacitance, delay=False, slew=False):
-        '''Function to perform lookup operation'''
-         # Get the required indexes for lookup
-        row1, row2, column1, column2 = self.lookup_index(node, input_slew, output_capacitance)
-        node_type = self.netlist[node].type
-        # Indexes of input slew
-        t1 = self.std_cell[node_type].input_slew[row1]
-        t2 = self.std_cell[node_type].input_slew[row2]
-        # Indexes of capacitance
-        c1 = self.std_cell[node_type].output_load[column1]
-        c2 = self.std_cell[node_type].output_load[column2]
-        # Lookup for delay
-        if delay:
-            v11 = self.std_cell[node_type].delay[row1][column1]
-            v12 = self.std_cell[node_type].delay[row1][column2]
-            v21 = self.std_cell[node_type].delay[row2][column1]
-            v22 = self.std_cell[node_type].delay[row2][column2]
-        # Lookup for slew
-        elif slew:
-            v11 = self.std_cell[node_type].slew[row1][column1]
-            v12 = self.std_cell[node_type].slew[row1][column2]
-            v21 = self.std_cell[node_type].slew[row2][column1]
-            v22 = self.std_cell[node_type].slew[row2][column2]
-        # 2D-Interpolation result
-        value = self.interpolation(v11, v12, v21, v22, t1, t2, c1, c2, input_slew, output_capacitance)
-        return value
+        self.position = None        # Position of every node in the sorted order
+        self.changed_nodes = set()  # Nodes edited since the last timing update
+        self.output_ports = [node for node in range(num_nodes) if self.graph.node_type[node] == OUTPUT]  # Output ports
+        self.stats = None           # Instrumentation of the passes, None to disable it
+        self.arc_cache = None       # Memo of the cell arc lookups, None to look every arc up
+        self.loads = None           # Output capacitance of all the nodes, None until the loads are annotated
+        self.port_loads = {}        # Load of the output ports given by the user, by node ID
+        self.wire_caps = {}         # Wire capacitance of the nets given by the user, by node ID
+        # Calculate number of outputs for a node
+        fanout_offsets = self.graph.fanout_offsets
+        for node in range(num_nodes):
+            self.out_degree.append(fanout_offsets[node+1] - fanout_offsets[node])
+
+    def circuit_delay(self):
+        '''Function to get the circuit delay, the maximum output arrival time of the output ports'''
+        arrival = self.max_output_arrival
+        return max([0.0] + [arrival[node] for node in self.output_ports])
+
+    def set_circuit_delay(self, total_circuit_delay=None):
+        '''Function to store the circuit delay, of the output ports unless one is given, and its required arrival time'''
+        if total_circuit_delay is None:
+            total_circuit_delay = self.circuit_delay()
+        self.total_circuit_delay = total_circuit_delay
+        # calculate the required arrival time
+        self.total_circuit_delay_slack = required_arrival_time(total_circuit_delay)
+
+    def output_capacitance(self, node):
+        '''Function to calculate the output capacitance driven by a node'''
+        graph = self.graph
+        output_capacitance = 0.0
+        for edge in range(graph.fanout_offsets[node], graph.fanout_offsets[node+1]):
+            fanout = graph.fanout_index[edge]
+            fanout_type = graph.node_type[fanout]
+            # If the node is not of output type, add it's standard cell's output capacitance
+            if fanout_type != OUTPUT:
+                output_capacitance += self.cells[fanout_type].input_capacitance
+            # If the node is of output type, add its given load, or 4 times the Inverter cell's input capacitance
+            elif fanout in self.port_loads:
+                output_capacitance += self.port_loads[fanout]
+            else:
+                output_capacitance += (4 * self.std_cell["INV"].input_capacitance)
+        # Add the wire capacitance of the net
+        if node in self.wire_caps:
+            output_capacitance += self.wire_caps[node]
+        return output_capacitance
+
+    def annotate_loads(self, nodes=None):
+        '''Function to calculate the output capacitance of all the nodes once, or again for the given nodes after an edit
+
+        The loads may be shared with other analyses of the graph, so an edit
+        updates a copy of them.'''
+        if nodes is None:
+            self.loads = array("d", [self.output_capacitance(node) for node in range(len(self.graph))])
+        elif self.loads is not None:
+            loads = self.loads[:]
+            for node in nodes:
+                loads[node] = self.output_capacitance(node)
+            self.loads = loads
+
+    def set_loads(self, output_loads=None, wire_caps=None):
+        '''Function to set the load of primary outputs and the wire capacitance of nets, both by net name'''
+        port_loads, wire_caps = resolve_loads(self.graph, output_loads, wire_caps)
+        if not port_loads and not wire_caps:
+            return
+        self.port_loads.update(port_loads)
+        self.wire_caps.update(wire_caps)
+        # Drivers of the ports and the nets see new loads, and have to be re-timed
+        nodes = set(wire_caps)
+        nodes.update(self.graph.fanin_index[self.graph.fanin_offsets[port]] for port in port_loads)
+        self.annotate_loads(nodes)
+        self.changed_nodes.update(nodes)
+        self.netlist_changed()
+
+    def count_lookups(self, nodes):
+        '''Function to count the table lookups of the given nodes, and the ones extrapolated beyond the table indexes'''
+        graph = self.graph
+        lookups = 0
+        extrapolated = 0
+        # Lookups are counted after the pass from its results, the pass itself is not slowed down
+        with self.stats.counting():
+            for node in nodes:
+                cell = self.cells[graph.node_type[node]]
+                if cell is None:
+                    continue
+                output_capacitance = self.loads[node]
+                for fanin in graph.fanins(node):
+                    lookups += 1
+                    if cell.table.extrapolates(self.output_slew[fanin], output_capacitance):
+                        extrapolated += 1
+        self.stats.count("lut_lookups", lookups)
+        self.stats.count("extrapolated_lookups", extrapolated)
+
+    def evaluate_node(self, node):
+        '''Function to calculate cell delays, output slew and maximum output arrival time of a node'''
+        graph = self.graph
+        state = self.state
+        node_type = graph.node_type[node]
+        cell = self.cells[node_type]
+        # Check if the node is a logical gate
+        if cell is not None:
+            input_slew = state.output_slew
+            arrival = state.max_output_arrival
+            cell_delay = state.cell_delay
+            # Get the output capacitance of the node, annotated before the pass
+            output_capacitance = self.loads[node]
+            first_edge = graph.fanin_offsets[node]
+            last_edge = graph.fanin_offsets[node+1]
+            num_fanins = last_edge - first_edge
+            max_output_arrival = 0.0
+            output_slew = 0.0
+            arc_cache = self.arc_cache
+            # Perform lookups for delay and slew on every input pin
+            for edge in range(first_edge, last_edge):
+                fanin = graph.fanin_index[edge]
+                if arc_cache is not None:
+                    delay, slew = arc_cache.lookup(cell.table, input_slew[fanin], output_capacitance, num_fanins)
+                else:
+                    delay, slew = cell.table.lookup(input_slew[fanin], output_capacitance)
+                    # If the node has more than 2 inputs, multiply delay and slew with 'number of inputs / 2'
+                    if num_fanins > 2:
+                        delay *= num_fanins/2
+                        slew *= num_fanins/2
+                # Store cell delay
+                cell_delay[edge] = delay
+                # Calculate arrival time through the input, the first input with
+                # the maximum output arrival time gives the output slew
+                output_arrival = delay + arrival[fanin]
+                if edge == first_edge or output_arrival > max_output_arrival:
+                    max_output_arrival = output_arrival
+                    output_slew = slew
+            arrival[node] = max_output_arrival
+            input_slew[node] = output_slew
+        # Check if the node is output
+        elif node_type == OUTPUT:
+            # Get the maximum output arrival of first fan-in node
+            arrival = state.max_output_arrival
+            arrival[node] = arrival[graph.fanin_index[graph.fanin_offsets[node]]]
+
+    def require_node(self, node, required_time):
+        '''Function to calculate the required arrival time and slack of a node from its fan-outs
 
+        The required arrival time is the minimum over the fan-out arcs, the value
+        backward_traversal gives, but the node only writes its own values, so
+        nodes whose fan-outs are done can be timed in any order.'''
+        graph = self.graph
+        node_type = graph.node_type
+        fanin_offsets = graph.fanin_offsets
+        fanin_index = graph.fanin_index
+        required = self.state.back_traversal_arrival
+        # Assign required arrival time for output node
+        if node_type[node] == OUTPUT:
+            required[node] = required_time
+            self.state.slack[node] = required_time - self.state.max_output_arrival[node]
+            return
+        value = float("inf")
+        for edge in range(graph.fanout_offsets[node], graph.fanout_offsets[node+1]):
+            fanout = graph.fanout_index[edge]
+            fanout_type = node_type[fanout]
+            # Output ports require their net at the required arrival time of the circuit
+            if fanout_type == OUTPUT:
+                if fanin_index[fanin_offsets[fanout]] == node and value > required_time:
+                    value = required_time
+            # Logical gates require it a cell delay before their own required arrival time, on every pin it drives
+            elif self.cells[fanout_type] is not None:
+                for fanin_edge in range(fanin_offsets[fanout], fanin_offsets[fanout+1]):
+                    if fanin_index[fanin_edge] == node and value > required[fanout] - self.state.cell_delay[fanin_edge]:
+                        value = required[fanout] - self.state.cell_delay[fanin_edge]
+        required[node] = value
+        # Calculate Slack for logical gates and inputs
+        if self.cells[node_type[node]] is not None or node_type[node] == INPUT:
+            self.state.slack[node] = value - self.state.max_output_arrival[node]
+
+    def levelize(self):
+        '''Function to sort the nodes into levels once, all the passes reuse the order until the netlist changes
+
+        Raises CombinationalLoopError with the nets of a loop if the netlist has one.'''
+        self.sorted_order, self.level_offsets = self.graph.levelize()
+        self.position = None
+        # Every sorted node is queued and taken from the queue once
+        if self.stats is not None:
+            self.stats.count("queue_operations", 2 * len(self.sorted_order))
+
+    @timed("forward_traversal")
     def forward_traversal(self):
         '''# Function to perform forward traversal of netlist'''
-        # Copy length of fanins to another variable
-        in_degree = self.in_degree.copy()
-        # Populate input nodes to start forward traversal
-        queue = [node for node in in_degree if in_degree[node]==0]
-        # Create a list to store sorted list
-        sorted_order = []
-        # Iterate through netlist until queue length is not zero
-        while len(queue) != 0:
-            # Get the first node from queue
-            node = queue.pop(0)
-            # Append node to sorted list
-            sorted_order.append(node)
-            # Check if the node is a logical gate
-            if self.netlist[node].type in self.std_cell:
-                for fanin in self.netlist[node].fanins:
-                    self.netlist[node].input_slews.append(self.netlist[fanin].output_slew)
-                    self.netlist[node].input_arrival.append(self.netlist[fanin].max_output_arrival)
-                # Calculate output capacitance for the node
-                output_capacitance = 0.0
-                for fanout in self.netlist[node].fanouts:
-                    # If the node is not of output type, add it's standard cell's output capacitance
-                    if self.netlist[fanout].type != "OUTPUT":
-                        output_capacitance += self.std_cell[self.netlist[fanout].type].input_capacitance
-                    # If the node is of output type, add 4 times the Inverter cell's input capacitance
-                    else:
-                        output_capacitance += (4 * self.std_cell["INV"].input_capacitance)
-                self.cell_delay[node] = []
-                cell_transition = []
-                # Perform lookups for delay and slew
-                for input_slew in self.netlist[node].input_slews:
-                    delay = self.lookup(node, input_slew, output_capacitance, delay=True)
-                    slew = self.lookup(node, input_slew, output_capacitance, slew=True)
-                    # If the node has more than 2 inputs, multiply delay and slew with 'number of inputs / 2'
-                    if len(self.netlist[node].fanins) > 2:
-                        delay *= len(self.netlist[node].fanins)/2
-                        slew *= len(self.netlist[node].fanins)/2
-                    # Store cell delay
-                    self.cell_delay[node].append(delay)
-                    cell_transition.append(slew)
-                # Calculate arrival times for all the inputs of the node
-                for i in range(len(self.cell_delay[node])):
-                    self.netlist[node].output_arrival.append(self.cell_delay[node][i] + self.netlist[node].input_arrival[i])
-                # Get the maximum output arrival time
-                self.netlist[node].max_output_arrival = max(self.netlist[node].output_arrival)
-                # Get the maximum output arrival time index
-                max_arrival_out_index = self.netlist[node].output_arrival.index(self.netlist[node].max_output_arrival)
-                # Get the output slew using maximum output arrival time index
-                self.netlist[node].output_slew = cell_transition[max_arrival_out_index]
-            # Check if the node is input
-            elif self.netlist[node].type == "INPUT":
-                # Calculate output capacitance for the node
-                output_capacitance = 0.0
-                for fanout in self.netlist[node].fanouts:
-                    # If the node is not of output type, add it's standard cell's output capacitance
-                    fanout_type = self.netlist[fanout].type
-                    if fanout_type != "OUTPUT":
-                        output_capacitance += self.std_cell[fanout_type].input_capacitance
-                    # If the node is output type, add 4 times the Inverter cell's input capacitance
-                    else:
-                        output_capacitance += (4 * self.std_cell["INV"].input_capacitance)
-            # Check if the node is output
-            elif self.netlist[node].type == "OUTPUT":
-                # Get the first fan-in node of the node
-                fanin = self.netlist[node].fanins[0]
-                # Get the maximum output arrival of first fan-in node
-                self.netlist[node].max_output_arrival = self.netlist[fanin].max_output_arrival
-                # Get the maximum of maximum output arrival time of output node, or the cell delay
-                if self.total_circuit_delay < self.netlist[fanin].max_output_arrival:
-                    self.total_circuit_delay = self.netlist[fanin].max_output_arrival
-            # calculate the required arrival time
-            self.total_circuit_delay_slack = 1.1 * self.total_circuit_delay
-            # Iterate through neighboring nodes
-            for neighbor in self.netlist[node].fanouts:
-                # Once the neighbor is visited, subtract 1 from its in_degree
-                in_degree[neighbor] -= 1
-                # If in_degree is zero, all the inputs are ready for the neighboring node, and it can be appended to the queue
-                if in_degree[neighbor] == 0:
-                    queue.append(neighbor)
-        # Store the sorted order
-        self.sorted_order = sorted_order
+        # Sort the nodes once, so that the fan-ins of every node are ready before it
+        if self.level_offsets is None:
+            self.levelize()
+        # Calculate the output capacitance of all the nodes once
+        if self.loads is None:
+            self.annotate_loads()
+        sorted_order = self.sorted_order
+        for node in sorted_order:
+            self.evaluate_node(node)
+        # Get the maximum of maximum output arrival time of output node, and the required arrival time
+        self.set_circuit_delay()
+        if self.stats is not None:
+            self.stats.count("nodes_visited", len(sorted_order))
+            self.count_lookups(sorted_order)
 
+    @timed("backward_traversal")
     def backward_traversal(self):
         '''Function to perform backward traversal on netlist'''
-        # Copy length of fanouts to another variable
-        out_degree = self.out_degree.copy()
-        # Populate output nodes to start back traversal
-        queue = [node for node in out_degree if out_degree[node]==0]
-        # Iterate through netlist until queue length is not zero
-        while len(queue) != 0:
-            # Get the first node from queue
-            node = queue.pop(0)
+        graph = self.graph
+        node_type = graph.node_type
+        fanin_offsets = graph.fanin_offsets
+        fanin_index = graph.fanin_index
+        required = self.back_traversal_arrival
+        slack = self.slack
+        arrival = self.max_output_arrival
+        cell_delay = self.cell_delay
+        required_time = self.total_circuit_delay_slack
+        # Required arrival times start unassigned
+        for node in range(len(graph)):
+            required[node] = float("inf")
+        if self.level_offsets is None:
+            self.levelize()
+        # Visit the nodes in reverse sorted order, so that all the fan-outs of a node are done before it
+        for node in reversed(self.sorted_order):
             # Check if the node is a logical gate
-            if self.netlist[node].type in self.std_cell:
+            if self.cells[node_type[node]] is not None:
                 # Calculate Slack for the node
-                self.slack[node] = self.back_traversal_arrival[node] - self.netlist[node].max_output_arrival
+                slack[node] = required[node] - arrival[node]
                 # Assign required arrival times to the fan-in nodes of the given node
-                for i, fanin in enumerate(self.netlist[node].fanins):
-                    if fanin in self.back_traversal_arrival:
-                        if self.back_traversal_arrival[fanin] > self.back_traversal_arrival[node]-self.cell_delay[node][i]:
-                            self.back_traversal_arrival[fanin] = self.back_traversal_arrival[node] - self.cell_delay[node][i]
-                    else:
-                        self.back_traversal_arrival[fanin] =  self.back_traversal_arrival[node] - self.cell_delay[node][i]
+                for edge in range(fanin_offsets[node], fanin_offsets[node+1]):
+                    fanin = fanin_index[edge]
+                    if required[fanin] > required[node] - cell_delay[edge]:
+                        required[fanin] = required[node] - cell_delay[edge]
             # Check if the node is input
-            elif self.netlist[node].type == "INPUT":
+            elif node_type[node] == INPUT:
                 # Calculate Slack for the node
-                self.slack[node] = self.back_traversal_arrival[node] - self.netlist[node].max_output_arrival
+                slack[node] = required[node] - arrival[node]
             # Check if the node is output
-            elif self.netlist[node].type == "OUTPUT":
+            elif node_type[node] == OUTPUT:
                 # Assign required arrival time for output node
-                self.back_traversal_arrival[node] =  self.total_circuit_delay_slack
+                required[node] = required_time
                 # Calculate Slack for the node
-                self.slack[node] = self.back_traversal_arrival[node] - self.netlist[node].max_output_arrival
-                # Assign required arrival time to the fan-in node of the given node
-                fanin = self.netlist[node].fanins[0]
-                self.back_traversal_arrival[fanin] = self.back_traversal_arrival[node]
-            # Iterate through neighboring nodes
-            for neighbor in self.netlist[node].fanins:
-                # Once the neighbor is visited, subtract 1 from its out_degree
-                out_degree[neighbor] -= 1
-                # If out_degree is zero, output arrival time can be calculated for the node,
-                #  and it can be appended to the queue
-                if out_degree[neighbor] == 0:
-                    queue.append(neighbor)
-        # Create output directory if it doesnt exist
-        output_path = "../output"
-        if not os.path.isdir(output_path):
-            os.makedirs(output_path)
-        # Create a file to store the slack information of the netlist
-        result_file_slack = open("../output/ckt_traversal.txt", "w", encoding="utf8")
-        # Print the circuit delay
-        result_file_slack.write(f"Circuit delay: {(self.total_circuit_delay*1000):.5f} ps\n\n")
-        result_file_slack.write("Gate slacks:\n")
-        # Iterate through all the nodes and print its slack
-        for node in self.sorted_order:
-            node_type = self.netlist[node].type
-            if node_type != "OUTPUT":
-                result_file_slack.write(f"{node_type}-{node}: {(self.slack[node]*1000):.5f} ps\n")
-            else:
-                result_file_slack.write(f"{node_type}-{self.netlist[node].fanins[0]}: {(self.slack[node]*1000):.5f} ps\n")
-        # Close the file
-        result_file_slack.close()
+                slack[node] = required[node] - arrival[node]
+                # Assign required arrival time to the fan-in node of the given node, unless a gate needs it earlier
+                fanin = fanin_index[fanin_offsets[node]]
+                if required[fanin] > required[node]:
+                    required[fanin] = required[node]
+        # All the nodes are timed
+        self.changed_nodes.clear()
+        if self.stats is not None:
+            self.stats.count("nodes_visited", len(self.sorted_order))
 
-    def critical_path(self):
-        '''Function to find the critical path of the netlist'''
-        # Copy length of fanouts to another variable
-        out_degree = self.out_degree.copy()
+    def netlist_changed(self):
+        '''Function called after every netlist edit, to drop state compiled from the netlist'''
+
+    def set_cell(self, net, gate_type):
+        '''Function to change the standard cell of a gate, to change its type or to resize it'''
+        graph = self.graph
+        node = graph.ids.get(net)
+        if node is None or self.cells[graph.node_type[node]] is None:
+            raise ValueError(f"{net} is not a logical gate")
+        if gate_type not in self.std_cell:
+            raise ValueError(f"{gate_type} is not in the standard cell library")
+        # The graph may be shared with other analyses, edit a copy
+        graph = self.graph = graph.with_type(node, gate_type)
+        # Add the standard cell of a new gate type
+        for name in graph.type_names[len(self.cells):]:
+            self.cells.append(self.std_cell.get(name))
+        # The gate and its fan-ins, which see a new input capacitance, have to be re-timed
+        self.annotate_loads(graph.fanins(node))
+        self.changed_nodes.add(node)
+        self.changed_nodes.update(graph.fanins(node))
+        self.netlist_changed()
+
+    def reconnect(self, net, old_fanin, new_fanin):
+        '''Function to move an input pin of a gate or an output port from one net to another'''
+        graph = self.graph
+        node = graph.ids.get(net)
+        old_node = graph.ids.get(old_fanin)
+        new_node = graph.ids.get(new_fanin)
+        if node is None or old_node is None or new_node is None:
+            raise ValueError(f"{net}, {old_fanin} and {new_fanin} have to be nets of the netlist")
+        if graph.node_type[new_node] == OUTPUT:
+            raise ValueError(f"{new_fanin} is an output port and can't drive {net}")
+        if self.out_degree[old_node] == 1 and old_node != new_node:
+            raise ValueError(f"{old_fanin} would be left without fan-outs")
+        # The graph may be shared with other analyses, edit a copy
+        graph = graph.with_reconnect(node, old_node, new_node)
+        # Sort the nodes again, keep the old graph if the edit closes a loop
+        try:
+            graph.levelize()
+        except CombinationalLoopError:
+            raise ValueError(f"Driving {net} with {new_fanin} creates a combinational loop") from None
+        self.graph = graph
+        self.out_degree[old_node] -= 1
+        self.out_degree[new_node] += 1
+        self.levelize()
+        self.annotate_loads((old_node, new_node))
+        # The gate and both drivers, whose loads change, have to be re-timed
+        self.changed_nodes.update((node, old_node, new_node))
+        self.netlist_changed()
+
+    def apply_edits(self, edits):
+        '''Function to apply a list of netlist edits, all of them or none
+
+        Edits are lists, ["set_cell", net, gate_type] or ["reconnect", net,
+        old_fanin, new_fanin]. If an edit fails, the netlist is restored to the
+        one before the first edit and the error is raised again, the timing values
+        aren't changed by edits, so they stay the ones of the restored netlist.'''
+        # Edits copy the graph and the loads, the other edited values are copied here
+        saved = (self.graph, self.cells[:], self.loads, self.out_degree[:], set(self.changed_nodes),
+                 self.sorted_order, self.level_offsets, self.position)
+        try:
+            for edit in edits:
+                if edit[0] == "set_cell" and len(edit) == 3:
+                    self.set_cell(edit[1], edit[2])
+                elif edit[0] == "reconnect" and len(edit) == 4:
+                    self.reconnect(edit[1], edit[2], edit[3])
+                else:
+                    raise ValueError(f"Unknown edit {edit}")
+        except Exception:
+            (self.graph, self.cells, self.loads, self.out_degree, self.changed_nodes,
+             self.sorted_order, self.level_offsets, self.position) = saved
+            self.netlist_changed()
+            raise
+
+    @timed("update_timing")
+    def update_timing(self, tolerance=0.0):
+        '''Function to re-time the nodes affected by the netlist edits
+
+        Arrival times and slews are propagated through the fan-out cones of the
+        edited nodes, required arrival times and slacks through the fan-in cones of
+        the nodes whose timing changed. Propagation stops at nodes whose values
+        change by no more than the tolerance. Returns the number of re-timed nodes.'''
+        # Without a previous analysis, time the whole netlist
+        if len(self.sorted_order) != len(self.graph):
+            self.forward_traversal()
+            self.backward_traversal()
+            return 2 * len(self.graph)
+        if self.loads is None:
+            self.annotate_loads()
+        graph = self.graph
+        node_type = graph.node_type
+        fanin_offsets = graph.fanin_offsets
+        fanin_index = graph.fanin_index
+        fanout_offsets = graph.fanout_offsets
+        fanout_index = graph.fanout_index
+        if self.position is None:
+            self.position = array("i", bytes(4 * len(graph)))
+            for position, node in enumerate(self.sorted_order):
+                self.position[node] = position
+        position = self.position
+        # Step 1 - Re-time the fan-out cones in sorted order
+        queue = [(position[node], node) for node in self.changed_nodes]
+        heapq.heapify(queue)
+        queued = set(self.changed_nodes)
+        # Nodes whose slack or required arrival time has to be updated
+        arrival_changed = []
+        required_changed = set()
+        for node in self.changed_nodes:
+            # The fan-outs of the edited drivers changed
+            if node_type[node] != OUTPUT:
+                required_changed.add(node)
+        while queue:
+            node = heapq.heappop(queue)[1]
+            old_arrival = self.max_output_arrival[node]
+            old_slew = self.output_slew[node]
+            old_delay = self.cell_delay[fanin_offsets[node]:fanin_offsets[node+1]]
+            self.evaluate_node(node)
+            # The fan-ins of a gate with new cell delays get new required arrival times
+            if self.cell_delay[fanin_offsets[node]:fanin_offsets[node+1]] != old_delay:
+                required_changed.update(fanin_index[fanin_offsets[node]:fanin_offsets[node+1]])
+            if abs(self.max_output_arrival[node] - old_arrival) <= tolerance and \
+               abs(self.output_slew[node] - old_slew) <= tolerance:
+                continue
+            arrival_changed.append(node)
+            # Propagate the change to the fan-outs
+            for edge in range(fanout_offsets[node], fanout_offsets[node+1]):
+                neighbor = fanout_index[edge]
+                if neighbor not in queued:
+                    queued.add(neighbor)
+                    heapq.heappush(queue, (position[neighbor], neighbor))
+        retimed = len(queued)
+        self.changed_nodes.clear()
+        if self.stats is not None:
+            # Every re-timed node is pushed to the heap and popped once
+            self.stats.count("nodes_visited", retimed)
+            self.stats.count("queue_operations", 2 * retimed)
+            self.count_lookups(queued)
+        # Calculate the circuit delay and the required arrival time again
+        total_circuit_delay = self.circuit_delay()
+        if total_circuit_delay != self.total_circuit_delay:
+            # A new required arrival time changes the slack of every node
+            self.set_circuit_delay(total_circuit_delay)
+            self.backward_traversal()
+            return retimed + len(graph)
+        # Step 2 - Re-time the fan-in cones in reverse sorted order
+        required = self.back_traversal_arrival
+        queue = [(-position[node], node) for node in required_changed]
+        heapq.heapify(queue)
+        queued = set(required_changed)
+        while queue:
+            node = heapq.heappop(queue)[1]
+            # Required arrival time is the minimum over all the fan-out arcs
+            required_time = float("inf")
+            for edge in range(fanout_offsets[node], fanout_offsets[node+1]):
+                fanout = fanout_index[edge]
+                if node_type[fanout] == OUTPUT:
+                    required_time = min(required_time, self.total_circuit_delay_slack)
+                    continue
+                for fanin_edge in range(fanin_offsets[fanout], fanin_offsets[fanout+1]):
+                    if fanin_index[fanin_edge] == node:
+                        required_time = min(required_time, required[fanout] - self.cell_delay[fanin_edge])
+            old_required = required[node]
+            required[node] = required_time
+            self.slack[node] = required_time - self.max_output_arrival[node]
+            if required_time == old_required or abs(required_time - old_required) <= tolerance:
+                continue
+            # Propagate the change to the fan-ins
+            for edge in range(fanin_offsets[node], fanin_offsets[node+1]):
+                neighbor = fanin_index[edge]
+                if neighbor not in queued:
+                    queued.add(neighbor)
+                    heapq.heappush(queue, (-position[neighbor], neighbor))
+        # Calculate slack of the nodes with new arrival times
+        for node in arrival_changed:
+            self.slack[node] = required[node] - self.max_output_arrival[node]
+        if self.stats is not None:
+            self.stats.count("nodes_visited", len(queued))
+            self.stats.count("queue_operations", 2 * len(queued))
+        return retimed + len(queued)
+
+    @timed("report_slacks")
+    def report_slacks(self):
+        '''Function to write the circuit delay and the slack of all the nodes'''
+        # Create the text report, its lines are formatted in chunks into one large buffer
+        with report.open_report(self.output_dir, report.TEXT_REPORT) as result_file_slack:
+            report.write_slacks(result_file_slack, report.graph_labels(self.graph), self.slack,
+                                self.sorted_order, self.total_circuit_delay)
+
+    def trace_worst_path(self, slack):
+        '''Function to follow the least slacks of the given slack values from the worst endpoint back to an input
+
+        Returns the nodes of the path from the input to the endpoint.'''
+        graph = self.graph
         # Populate output nodes to start back traversal
-        outputs = [node for node in out_degree if out_degree[node]==0]
+        outputs = [node for node in range(len(graph)) if self.out_degree[node]==0]
         # Find the output node with the least slack
-        lowest_slack = min([self.slack[node] for node in outputs])
+        lowest_slack = min([slack[node] for node in outputs])
         # Check if multiples output nodes have same minimum slack
-        nodes_lowest_slack = [node for node in outputs if self.slack[node] == lowest_slack]
-        # Pick a random output node with same minimum slack
-        random_node_min_slack = random.choice(nodes_lowest_slack)
-        queue = []
-        queue.append(random_node_min_slack)
-        sorted_order = []
-        # Iterate through netlist until queue length is not zero
-        while len(queue) != 0:
-            node = queue.pop(0)
+        nodes_lowest_slack = [node for node in outputs if slack[node] == lowest_slack]
+        # Pick the first output node with same minimum slack, so that the report is reproducible
+        node = nodes_lowest_slack[0]
+        sorted_order = [node]
+        fanins = graph.fanins(node)
+        # Follow the fan-ins with the least slack until an input node, or an undriven net, is reached
+        while graph.node_type[node] != INPUT and fanins:
+            # Get the fan-in node with the least slack, the first one on ties
+            node = fanins[0]
+            for neighbor in fanins[1:]:
+                if slack[neighbor] < slack[node]:
+                    node = neighbor
             sorted_order.append(node)
-            # If an input node is reached, stop the queue
-            if self.netlist[node].type == "INPUT":
-                break
-            elif self.netlist[node].fanins:
-                # Get the fan-in node with the least slack
-                node_min_slack_neighbor = self.netlist[node].fanins[0]
-                min_slack_neighbor = self.slack[node_min_slack_neighbor]
-                for neighbor in self.netlist[node].fanins[1:]:
-                    if self.slack[neighbor] < min_slack_neighbor:
-                        min_slack_neighbor = self.slack[neighbor]
-                        node_min_slack_neighbor = neighbor
-                # Append the fan-in node with the last slack
-                queue.append(node_min_slack_neighbor)
+            fanins = graph.fanins(node)
+        if self.stats is not None:
+            self.stats.count("nodes_visited", len(sorted_order))
         # Reverse the path to get critical path from input to output node
         sorted_order.reverse()
+        return sorted_order
+
+    @timed("critical_path")
+    def find_critical_path(self):
+        '''Function to find the critical path of the netlist'''
         # Store the final critical path
-        self.final_critical_path = sorted_order[:]
-        # Append critical path to the file
-        critical_path_file = open("../output/ckt_traversal.txt", "a", encoding="utf-8")
-        critical_path_file.write("\nCritical path:\n")
-        # Print critical path
-        critical_path_print_list = []
-        for node in self.final_critical_path:
-            node_type = self.netlist[node].type
-            if node_type != "OUTPUT":
-                critical_path_print_list.append(f"{node_type}-{node}")
-            else:
-                critical_path_print_list.append(f"{node_type}-{self.netlist[node].fanins[0]}")
-        critical_path_file.write(",".join(critical_path_print_list))
-        # Close the file
-        critical_path_file.close()
+        self.final_critical_path = self.trace_worst_path(self.slack)
+        return self.final_critical_path
+
+    def critical_path(self):
+        '''Function to find the critical path of the netlist, and append it to the text report'''
+        self.find_critical_path()
+        labels = {node: self.graph.label(node) for node in self.final_critical_path}
+        with report.open_report(self.output_dir, report.TEXT_REPORT, "a") as critical_path_file:
+            report.write_critical_path(critical_path_file, labels, self.final_critical_path)
+
+    @timed("write_reports")
+    def write_reports(self, formats=None):
+        '''Function to write the reports of a timed netlist, the critical path included, in the given formats
+
+        The text report is written in one pass through one buffer, the binary
+        report holds the timing values of all the nodes as columns, it can be
+        turned into the text report on demand with report.py.'''
+        formats = self.report_formats if formats is None else formats
+        if "text" in formats:
+            labels = report.graph_labels(self.graph)
+            with report.open_report(self.output_dir, report.TEXT_REPORT) as report_file:
+                report.write_slacks(report_file, labels, self.slack, self.sorted_order, self.total_circuit_delay)
+                report.write_critical_path(report_file, labels, self.final_critical_path)
+        if "binary" in formats:
+            if not os.path.isdir(self.output_dir):
+                os.makedirs(self.output_dir)
+            report.write_binary(os.path.join(self.output_dir, report.BINARY_REPORT), self.graph, self.state,
+                                self.sorted_order, self.final_critical_path)
+
+    @timed("report_paths")
+    def report_paths(self, count):
+        '''Function to append the worst paths of the netlist and the worst path into every endpoint to the report'''
+        graph = self.graph
+        search = PathSearch(self)
+        with report.open_report(self.output_dir, report.TEXT_REPORT, "a") as paths_file:
+            paths_file.write(f"\n\nWorst {count} paths:\n")
+            for number, path in enumerate(search.worst_paths(count), 1):
+                paths_file.write(f"Path {number}: delay {(path.delay*1000):.5f} ps, slack {(path.slack*1000):.5f} ps\n")
+                # Print the delay of every stage and the arrival time after it
+                for node, stage_delay, arrival in zip(path.nodes, path.stage_delay, path.arrival):
+                    paths_file.write(f"    {graph.label(node)}: {(stage_delay*1000):.5f} ps, "
+                                     f"arrival {(arrival*1000):.5f} ps\n")
+            paths_file.write("\nWorst path per endpoint:\n")
+            for path in search.endpoint_paths():
+                paths_file.write(f"{graph.label(path.nodes[-1])}: slack {(path.slack*1000):.5f} ps: "
+                                 f"{','.join(graph.label(node) for node in path.nodes)}\n")
+
+    @timed("path_based")
+    def report_path_based(self, count):
+        '''Function to append the critical path and the worst paths re-timed with the slews of their own pins to the report'''
+        # Import the path-based analysis only when requested, it depends on NumPy
+        from path_based import PathBasedAnalysis
+        graph = self.graph
+        analysis = PathBasedAnalysis(self)
+        # The worst path of the search is the critical path, the least-slack walk can leave it at reconvergences
+        worst_paths = PathSearch(self).worst_paths(max(count, 1))
+        paths = worst_paths[:1] + worst_paths[:count]
+        retimed = analysis.retime(paths)
+        with report.open_report(self.output_dir, report.TEXT_REPORT, "a") as paths_file:
+            paths_file.write(f"\n\nPath-based analysis of {len(paths)} paths ({analysis.paths_per_second:.0f} paths/s):\n")
+            for number, (path, path_based) in enumerate(zip(paths, retimed)):
+                # The critical path comes first, then the worst paths
+                name = "Critical path" if number == 0 else f"Path {number}"
+                paths_file.write(f"{name}: graph-based slack {(path.slack*1000):.5f} ps, "
+                                 f"path-based slack {(path_based.slack*1000):.5f} ps, "
+                                 f"path-based delay {(path_based.delay*1000):.5f} ps: "
+                                 f"{','.join(graph.label(node) for node in path.nodes)}\n")
+        return retimed
 
     def execute(self):
         '''Function to perform Static Timing Analysis'''
@@ -289,32 +597,127 @@ class STA():
         # Step 2 - Perform backward traversal to calculate slack
         self.backward_traversal()
         # Step 3 - Perform backward traversal to find critical path
-        self.critical_path()
+        self.find_critical_path()
+        # Step 4 - Write the slacks and the critical path
+        self.write_reports()
 
 def parse_arguments():
     '''# Function to parse command line arguments'''
     parser = argparse.ArgumentParser()
     # Argument to read netlist
     parser.add_argument("--read_ckt", action = "store", help = "Provides details of the circuit.")
-    # Argument to read .lib files
-    parser.add_argument("--read_nldm", action = "store", help = "Reads .lib files.")
+    # Argument to read .lib files, several files are analyzed as corners in one traversal
+    parser.add_argument("--read_nldm", action = "store", nargs = "+", help = "Reads .lib files, one per corner.")
+    # Arguments to index the .lib files, and parse only the cells the netlist uses
+    parser.add_argument("--lazy_lib", action = "store_true",
+                        help = "Indexes the .lib files and parses only the cells of the netlist, printing the bytes read.")
+    parser.add_argument("--cell_map", action = "store",
+                        help = "Reads the cell of every gate type, one gate type and cell name per line, implies --lazy_lib.")
+    # Arguments to time setup and hold together, with the early and the late arrival times
+    parser.add_argument("--early_late", action = "store_true",
+                        help = "Propagates the minimum and maximum arrival times and slews, reporting setup and hold slacks.")
+    parser.add_argument("--hold_time", action = "store", type = float, default = 0.0,
+                        help = "Hold time of the outputs in ns for --early_late, the earliest the data may change.")
+    # Argument to compute each level of the netlist at once with NumPy
+    parser.add_argument("--vectorized", action = "store_true", help = "Uses the levelized, vectorized engine.")
+    # Argument to split every level of the netlist across processes sharing the timing arrays
+    parser.add_argument("--jobs", action = "store", type = int,
+                        help = "Splits every level across the given number of processes, small designs are timed serially.")
+    # Arguments to memoize the cell arc lookups
+    parser.add_argument("--arc-cache", action = "store", type = int, nargs = "?", const = ARC_CACHE_SIZE,
+                        help = "Memoizes the cell arc lookups, keeping at most the given number of entries.")
+    parser.add_argument("--arc-cache-tolerance", action = "store", type = float, default = 0.0,
+                        help = "Rounds input slews to multiples of the tolerance for the arc cache, 0 keeps exact values.")
+    # Arguments to annotate loads, files with one net and its capacitance per line
+    parser.add_argument("--output_loads", action = "store",
+                        help = "Reads the loads of primary outputs, 4 inverter inputs by default.")
+    parser.add_argument("--wire_caps", action = "store", help = "Reads the wire capacitance of nets.")
+    # Arguments for the reports, written to the output directory
+    parser.add_argument("--output_dir", action = "store", default = main_parser.OUTPUT_DIR,
+                        help = "Folder the reports are written to.")
+    parser.add_argument("--report", action = "store", nargs = "+", choices = report.REPORT_FORMATS, default = ["text"],
+                        help = "Reports to write, the text report, the binary report of all the timing values, or both.")
+    parser.add_argument("--details", action = "store_true", help = "Writes the gate counts, fan-outs and fan-ins to ckt_details.txt.")
+    # Argument to report the worst paths
+    parser.add_argument("--paths", action = "store", type = int, default = 0,
+                        help = "Reports the given number of worst paths and the worst path into every endpoint.")
+    # Argument to re-time the worst paths with the slews of their own pins
+    parser.add_argument("--pba", action = "store", type = int, default = None,
+                        help = "Re-times the critical path and the given number of worst paths with their own slews, reporting graph-based and path-based slack.")
+    # Arguments to query the slack of a few nets, timing only their cones
+    parser.add_argument("--slack", action = "store", nargs = "+",
+                        help = "Prints the slack of the given nets, or output ports named <net>-o, instead of the full report.")
+    parser.add_argument("--required_time", action = "store", type = float,
+                        help = "Required arrival time of the outputs for --slack, by default 1.1 times the circuit delay.")
+    # Arguments to skip or refresh the cache of parsed netlists and libraries
+    parser.add_argument("--no-cache", action = "store_true", help = "Parses the input files without the cache.")
+    parser.add_argument("--rebuild-cache", action = "store_true", help = "Parses the input files again and replaces their cache.")
+    parser.add_argument("--cache_dir", action = "store", default = parse_cache.CACHE_DIR,
+                        help = "Directory of the cache files, by default the cache folder next to src.")
+    # Arguments to instrument the analysis
+    parser.add_argument("--stats-json", action = "store_true",
+                        help = "Writes the time of every phase, operation counts and memory high-water marks to ckt_stats.json.")
+    parser.add_argument("--profile", action = "store_true", help = "Writes a cProfile dump of the analysis to ckt_traversal.prof.")
     args = parser.parse_args()
+    # Every engine option chooses the engine of the analysis, only one can be given
+    engines = [flag for flag, given in (("--early_late", args.early_late), ("--vectorized", args.vectorized),
+                                        ("--jobs", args.jobs is not None)) if given]
+    if len(engines) > 1:
+        parser.error(f"{' and '.join(engines)} choose different engines, give only one of them")
+    # Only the scalar lookups read the arc cache, the vectorized engine interpolates whole levels
+    # and the worker processes of --jobs look every arc up
+    if args.arc_cache is not None and engines and engines[0] != "--early_late":
+        parser.error(f"--arc-cache applies to the scalar engines only, it can't be given with {engines[0]}")
     return args
 
 def main():
     '''Main function of main_sta.py'''
     # Parse command line arguments
     inputs = parse_arguments()
+    corners = []
+    std_cell = None
+    netlist = None
+    sta = None
+    # Instrumentation is only created when requested
+    stats = Stats() if inputs.stats_json else None
+    profiler = cProfile.Profile() if inputs.profile else None
+    if profiler is not None:
+        profiler.enable()
     # Checks if the read_nldm argument is defined
     if inputs.read_nldm is not None:
-        # Path to the .lib file
-        path = inputs.read_nldm
-        path_lib = Path(path)
-        # Checks if the .lib file exist
-        if path_lib.exists():
-            # Call read_nldm function if the .lib file exists
-            std_cell = main_parser.read_nldm(path_lib)
-        else: print(".lib file doesn't exist.")
+        # Read the cell of every gate type, if given
+        cell_map = None
+        if inputs.cell_map is not None:
+            try:
+                cell_map = read_cell_map(inputs.cell_map)
+            except FileNotFoundError:
+                print(f"{inputs.cell_map} cell map file doesn't exist.")
+            except ValueError as error:
+                print(error)
+        for path in inputs.read_nldm if inputs.cell_map is None or cell_map is not None else []:
+            # Path to the .lib file
+            path_lib = Path(path)
+            # Checks if the .lib file exist
+            if path_lib.exists():
+                with phase(stats, "read_nldm"):
+                    if inputs.lazy_lib or inputs.cell_map is not None:
+                        # Index the cells, they are parsed when the analysis looks them up
+                        try:
+                            corners.append(LibertyLibrary(path_lib, cell_map, stats))
+                        except ValueError as error:
+                            print(error)
+                        else:
+                            # Gate types get the first of the cells named after them, unless a cell map gives one
+                            for gate_type, names in corners[-1].shadowed.items():
+                                print(f"{gate_type} matches cells {', '.join(names)} of {path}, {names[0]} is used, "
+                                      f"give the cell with --cell_map.")
+                    else:
+                        # Call read_nldm function if the .lib file exists, or load its cached form
+                        corners.append(parse_cache.read_library(path_lib, not inputs.no_cache, inputs.rebuild_cache,
+                                                                inputs.cache_dir, stats=stats))
+            else: print(f"{path} .lib file doesn't exist.")
+        if corners and len(corners) == len(inputs.read_nldm):
+            std_cell = corners[0]
     # Checks if the read_ckt argument is defined
     if inputs.read_ckt is not None:
         # Path to the netlist file
@@ -322,16 +725,126 @@ def main():
         path_bench = Path(path)
         # Checks if the netlist file exists
         if path_bench.exists():
-            # Call read_ckt function if the netlist exists
-            netlist = main_parser.read_ckt(path_bench)
+            # Call read_ckt function if the netlist exists, or load its cached timing graph
+            with phase(stats, "read_ckt"):
+                netlist = parse_cache.read_graph(path_bench, not inputs.no_cache, inputs.rebuild_cache, inputs.cache_dir,
+                                                 output_dir=inputs.output_dir, stats=stats, details=inputs.details)
         else:
             print(".bench file doesn't exist.")
+    # Read the load annotation files, if given
+    loads = {"output_loads": None, "wire_caps": None}
+    for name in loads:
+        path = getattr(inputs, name)
+        if path is not None:
+            if Path(path).exists():
+                try:
+                    loads[name] = read_loads(path)
+                except LoadError as error:
+                    print(error)
+                    netlist = None
+            else:
+                print(f"{path} load file doesn't exist.")
+                netlist = None
     # Check if standard cell and netlist exists
-    if std_cell is not None and netlist is not None:
-        # Create an object of STA class, and initialize it with standard cell and netlist
-        sta = STA(std_cell, netlist)
-        # Perform Static Timing Analysis
-        sta.execute()
+    try:
+        if std_cell is not None and netlist is not None and len(corners) > 1:
+            # Analyze all the corners in one traversal, named after their .lib files
+            from multi_corner import MultiCornerSTA
+            sta = MultiCornerSTA(corners, netlist, [Path(path).stem for path in inputs.read_nldm], inputs.output_dir)
+            if "binary" in inputs.report:
+                print("The binary report is written for single-corner analyses only.")
+            if inputs.early_late:
+                print("Setup and hold are timed together for single-corner analyses only.")
+            # Engines and reports of single-corner analyses, the corners are timed by their own engine
+            ignored = [flag for flag, given in (("--vectorized", inputs.vectorized), ("--jobs", inputs.jobs is not None),
+                                                ("--arc-cache", inputs.arc_cache is not None),
+                                                ("--paths", inputs.paths > 0), ("--pba", inputs.pba is not None))
+                       if given]
+            if ignored:
+                print(f"{', '.join(ignored)} apply to single-corner analyses only, and are ignored.")
+            sta.stats = stats
+            sta.set_loads(**loads)
+            if inputs.slack:
+                # Time all the corners, and print the worst and per-corner slack of the queried nets
+                try:
+                    for net, slacks in sta.slacks(inputs.slack, inputs.required_time).items():
+                        print(f"{sta.graph.label(sta.graph.ids[net])}: {(min(slacks)*1000):.5f} ps, " +
+                              ", ".join(f"{name} {(slack*1000):.5f} ps" for name, slack in zip(sta.corner_names, slacks)))
+                except ValueError as error:
+                    print(error)
+            else:
+                sta.execute()
+        elif std_cell is not None and netlist is not None:
+            # Create an object of STA class, and initialize it with standard cell and
+            # the netlist compiled to its timing graph
+            if inputs.early_late:
+                # Import the early/late engine only when requested, it is scalar
+                from early_late import EarlyLateSTA
+                sta = EarlyLateSTA(std_cell, netlist, inputs.output_dir, hold_time=inputs.hold_time)
+            elif inputs.vectorized:
+                # Import the vectorized engine only when requested, it depends on NumPy
+                from vector_sta import VectorSTA
+                sta = VectorSTA(std_cell, netlist, inputs.output_dir)
+            elif inputs.jobs is not None:
+                # Import the parallel engine only when requested
+                from parallel_sta import ParallelSTA
+                sta = ParallelSTA(std_cell, netlist, inputs.output_dir, processes=inputs.jobs)
+            else:
+                sta = STA(std_cell, netlist, inputs.output_dir)
+            sta.stats = stats
+            sta.report_formats = tuple(inputs.report)
+            # Memoize the arc lookups of the scalar engines if requested
+            if inputs.arc_cache is not None:
+                sta.arc_cache = ArcCache(inputs.arc_cache, inputs.arc_cache_tolerance)
+            sta.set_loads(**loads)
+            if inputs.slack:
+                # Time only the cones of the queried nets
+                query = SlackQuery(sta, inputs.required_time)
+                try:
+                    for net, slack in query.slacks(inputs.slack).items():
+                        print(f"{sta.graph.label(sta.graph.ids[net])}: {(slack*1000):.5f} ps")
+                except ValueError as error:
+                    print(error)
+            else:
+                # Perform Static Timing Analysis
+                sta.execute()
+                # Report the worst paths if requested
+                if inputs.paths > 0:
+                    sta.report_paths(inputs.paths)
+                # Re-time the critical path and the worst paths on their own if requested
+                if inputs.pba is not None:
+                    sta.report_path_based(inputs.pba)
+            # Summarize the cache only if the engine looked arcs up through it
+            if sta.arc_cache is not None and sta.arc_cache.hits + sta.arc_cache.misses:
+                print(sta.arc_cache.summary())
+                if stats is not None:
+                    for name, value in sta.arc_cache.counters().items():
+                        stats.count(name, value)
+        # Report the cells parsed from the indexed .lib files
+        for library in corners:
+            if isinstance(library, LibertyLibrary):
+                print(library.summary())
+    except CombinationalLoopError as error:
+        # Nodes on a loop can't be timed, report the loop instead
+        print(error)
+    except LoadError as error:
+        # Loads of nets that aren't in the netlist
+        print(error)
+    except LibertyError as error:
+        # Cells of indexed .lib files are parsed when they are looked up, in the middle of the analysis
+        print(error)
+    finally:
+        # Stop the worker processes of the parallel engine
+        if hasattr(sta, "close"):
+            sta.close()
+    # Write the instrumentation next to the report
+    output_dir = inputs.output_dir
+    if profiler is not None:
+        profiler.disable()
+        os.makedirs(output_dir, exist_ok=True)
+        profiler.dump_stats(os.path.join(output_dir, "ckt_traversal.prof"))
+    if stats is not None:
+        stats.write(output_dir)
 
 if __name__ == '__main__':
     main()
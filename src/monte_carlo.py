@@ -0,0 +1,214 @@
+'''Monte Carlo statistical timing, a batch of samples propagated through the netlist at once'''
+import argparse
+import os
+from pathlib import Path
+import time
+import tracemalloc
+import numpy as np
+import main_parser
+import parse_cache
+from multi_corner import MultiCornerSTA
+
+# Memory the timing state of one chunk of samples may take
+CHUNK_MEMORY = 256 * 1024 * 1024
+
+# Percentiles of the circuit delay and of the endpoint slacks in the report
+DELAY_PERCENTILES = (1, 5, 50, 95, 99)
+SLACK_PERCENTILES = (1, 5, 50)
+
+def gaussian_variation(rng, size, sigma):
+    '''Function to sample delay multipliers from a normal distribution around 1, clipped at 0'''
+    return np.maximum(1.0 + sigma * rng.standard_normal(size), 0.0)
+
+def lognormal_variation(rng, size, sigma):
+    '''Function to sample delay multipliers from a log-normal distribution with mean 1'''
+    return np.exp(sigma * rng.standard_normal(size) - sigma * sigma / 2)
+
+def uniform_variation(rng, size, sigma):
+    '''Function to sample delay multipliers uniformly from a range around 1 with the given standard deviation'''
+    half_width = sigma * np.sqrt(3.0)
+    return 1.0 + rng.uniform(-half_width, half_width, size)
+
+# Variation models, every model samples multipliers of the cell delays and output slews
+VARIATION_MODELS = {
+    "gaussian": gaussian_variation,
+    "lognormal": lognormal_variation,
+    "uniform": uniform_variation,
+}
+
+class MonteCarloSTA(MultiCornerSTA):
+    '''Monte Carlo Static Timing Analysis with random variation of every gate
+
+    Timing state holds one row per sample. The delay and output slew of every gate
+    are multiplied by a local factor, sampled for every gate and sample, and a
+    global factor, sampled for every sample. Slacks use the required arrival time
+    of the circuit without variation.'''
+    def __init__(self, std_cell, netlist, model="gaussian", sigma=0.05, global_sigma=0.0, seed=0,
+                 output_dir=main_parser.OUTPUT_DIR):
+        super().__init__([std_cell], netlist, output_dir=output_dir)
+        if model not in VARIATION_MODELS:
+            raise ValueError(f"Unknown variation model {model}, choose one of {', '.join(VARIATION_MODELS)}")
+        self.model = model                  # Name of the variation model
+        self.sigma = sigma                  # Standard deviation of the local variation
+        self.global_sigma = global_sigma    # Standard deviation of the global variation
+        self.seed = seed                    # Seed of the random number generator
+        self.variation = None               # Delay multipliers of all the samples and nodes in the chunk
+        self.endpoints = None               # Nodes without fan-outs
+        self.circuit_delay = None           # Circuit delay of every sample
+        self.endpoint_slack = None          # Slack of every sample at every endpoint
+        self.samples_per_second = 0.0       # Throughput of the last run
+        self.peak_memory = 0                # Peak memory allocated by the last measure_peak_memory run
+
+    def vary(self, pin_gates, delay, slew):
+        '''Function to multiply the delays and slews of the input pins of a level with their gate's variation'''
+        factor = self.variation[:, pin_gates]
+        return delay * factor, slew * factor
+
+    def chunk_size(self, samples):
+        '''Function to get the number of samples whose timing state fits in CHUNK_MEMORY'''
+        # Slew, arrival and variation of every node, cell delay of every arc, and
+        # about as much again for the temporary arrays of the levels
+        sample_bytes = 16 * (3 * len(self.graph) + len(self.graph.fanin_index))
+        return max(1, min(samples, CHUNK_MEMORY // sample_bytes))
+
+    def set_rows(self, rows):
+        '''Function to allocate the timing state for the given number of samples'''
+        self.output_slew = np.zeros((rows, len(self.graph)))
+        self.max_output_arrival = np.zeros((rows, len(self.graph)))
+        self.cell_delay = np.zeros((rows, len(self.graph.fanin_index)))
+
+    def run(self, samples, chunk=None):
+        '''Function to propagate the given number of samples, and measure the samples per second'''
+        start_time = time.perf_counter()
+        self.propagate(samples, chunk)
+        self.samples_per_second = samples / (time.perf_counter() - start_time)
+
+    def measure_peak_memory(self, samples, chunk=None):
+        '''Function to get the peak memory allocated by propagating the given number of samples
+
+        Tracing slows every allocation down, so the samples are propagated again
+        in a traced run of their own, with the same seed and results as run. A
+        trace the caller already started keeps running, only its peak is reset.'''
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            start_memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        else:
+            start_memory = 0
+            tracemalloc.start()
+        try:
+            self.propagate(samples, chunk)
+            self.peak_memory = tracemalloc.get_traced_memory()[1] - start_memory
+        finally:
+            if not tracing:
+                tracemalloc.stop()
+        return self.peak_memory
+
+    def propagate(self, samples, chunk=None):
+        '''Function to propagate the given number of samples, a chunk of samples at a time'''
+        if samples < 1:
+            raise ValueError(f"Monte Carlo needs at least one sample, got {samples}")
+        if chunk is not None and chunk < 1:
+            raise ValueError(f"Chunks need at least one sample, got {chunk}")
+        # Nominal run, for the required arrival time of the circuit
+        self.set_rows(1)
+        self.variation = np.ones((1, len(self.graph)))
+        self.forward_traversal()
+        required_time = float(self.total_circuit_delay_slack[0])
+        self.endpoints = np.flatnonzero(np.diff(np.frombuffer(self.graph.fanout_offsets, dtype=np.int32)) == 0)
+        rng = np.random.default_rng(self.seed)
+        variation_model = VARIATION_MODELS[self.model]
+        chunk = chunk or self.chunk_size(samples)
+        circuit_delay = []
+        endpoint_slack = []
+        for first in range(0, samples, chunk):
+            rows = min(chunk, samples - first)
+            self.set_rows(rows)
+            # Global variation is shared by all the gates of a sample, local variation is per gate
+            self.variation = variation_model(rng, (rows, len(self.graph)), self.sigma)
+            if self.global_sigma > 0:
+                self.variation *= variation_model(rng, (rows, 1), self.global_sigma)
+            self.forward_traversal()
+            circuit_delay.append(self.total_circuit_delay.copy())
+            # Endpoint slacks are kept in single precision, to bound the memory of large batches
+            endpoint_slack.append((required_time - self.max_output_arrival[:, self.endpoints]).astype(np.float32))
+        self.variation = None
+        self.circuit_delay = np.concatenate(circuit_delay)
+        self.endpoint_slack = np.concatenate(endpoint_slack)
+        self.total_circuit_delay_slack = np.array([required_time])
+
+    def report(self):
+        '''Function to write the circuit delay distribution and the endpoint slack percentiles'''
+        graph = self.graph
+        # Create output directory if it doesnt exist
+        if not os.path.isdir(self.output_dir):
+            os.makedirs(self.output_dir)
+        result_file = open(os.path.join(self.output_dir, "monte_carlo.txt"), "w", encoding="utf-8")
+        result_file.write(f"Samples: {len(self.circuit_delay)}, variation: {self.model}, sigma: {self.sigma}, "
+                          f"global sigma: {self.global_sigma}, seed: {self.seed}\n")
+        result_file.write(f"Required arrival time: {(self.total_circuit_delay_slack[0]*1000):.5f} ps\n\n")
+        # Print the circuit delay distribution
+        delay = self.circuit_delay * 1000
+        result_file.write(f"Circuit delay: mean {delay.mean():.5f} ps, std {delay.std():.5f} ps, "
+                          f"min {delay.min():.5f} ps, max {delay.max():.5f} ps\n")
+        percentiles = np.percentile(delay, DELAY_PERCENTILES)
+        result_file.write("Circuit delay percentiles: " + ", ".join(
+            f"p{percentile} {value:.5f} ps" for percentile, value in zip(DELAY_PERCENTILES, percentiles)) + "\n")
+        # Print the slack percentiles of every endpoint
+        result_file.write(f"\nEndpoint slacks ({', '.join(f'p{percentile}' for percentile in SLACK_PERCENTILES)}, mean):\n")
+        slack = self.endpoint_slack.astype(np.float64) * 1000
+        percentiles = np.percentile(slack, SLACK_PERCENTILES, axis=0)
+        mean = slack.mean(axis=0)
+        for number, node in enumerate(self.endpoints):
+            values = ", ".join(f"{value:.5f} ps" for value in list(percentiles[:, number]) + [mean[number]])
+            result_file.write(f"{graph.label(node)}: {values}\n")
+        # Close the file
+        result_file.close()
+
+def parse_arguments():
+    '''Function to parse command line arguments'''
+    parser = argparse.ArgumentParser()
+    # Arguments to read the netlist and the .lib file
+    parser.add_argument("--read_ckt", action = "store", required = True, help = "Provides details of the circuit.")
+    parser.add_argument("--read_nldm", action = "store", required = True, help = "Reads .lib files.")
+    # Arguments of the sampling
+    parser.add_argument("--samples", action = "store", type = int, default = 1000, help = "Number of samples.")
+    parser.add_argument("--variation", action = "store", choices = list(VARIATION_MODELS), default = "gaussian",
+                        help = "Distribution of the delay multipliers.")
+    parser.add_argument("--sigma", action = "store", type = float, default = 0.05,
+                        help = "Standard deviation of the variation of every gate.")
+    parser.add_argument("--global_sigma", action = "store", type = float, default = 0.0,
+                        help = "Standard deviation of the variation shared by all the gates of a sample.")
+    parser.add_argument("--seed", action = "store", type = int, default = 0, help = "Seed of the random number generator.")
+    parser.add_argument("--chunk", action = "store", type = int, default = None,
+                        help = "Samples propagated at once, by default as many as fit in 256 MiB.")
+    # Argument to measure the peak memory, in a second run of the samples
+    parser.add_argument("--peak_memory", action = "store_true",
+                        help = "Propagates the samples again with tracemalloc, and prints their peak memory.")
+    # Argument for the directory of monte_carlo.txt
+    parser.add_argument("--output_dir", action = "store", default = main_parser.OUTPUT_DIR,
+                        help = "Directory monte_carlo.txt is written to.")
+    args = parser.parse_args()
+    # The distributions need at least one sample
+    if args.samples < 1:
+        parser.error(f"--samples must be at least 1, got {args.samples}")
+    if args.chunk is not None and args.chunk < 1:
+        parser.error(f"--chunk must be at least 1, got {args.chunk}")
+    return args
+
+def main():
+    '''Main function of monte_carlo.py'''
+    # Parse command line arguments
+    inputs = parse_arguments()
+    std_cell = parse_cache.read_library(Path(inputs.read_nldm))
+    graph = parse_cache.read_graph(Path(inputs.read_ckt))
+    sta = MonteCarloSTA(std_cell, graph, inputs.variation, inputs.sigma, inputs.global_sigma, inputs.seed,
+                        inputs.output_dir)
+    sta.run(inputs.samples, inputs.chunk)
+    sta.report()
+    print(f"{inputs.samples} samples, {sta.samples_per_second:.0f} samples/s")
+    if inputs.peak_memory:
+        print(f"Peak memory {sta.measure_peak_memory(inputs.samples, inputs.chunk)/1024/1024:.1f} MiB")
+
+if __name__ == '__main__':
+    main()
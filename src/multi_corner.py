@@ -0,0 +1,279 @@
+'''Multi-corner Static Timing Analysis, all the corners propagated in one levelized traversal'''
+import numpy as np
+from instrumentation import timed
+from load_annotation import resolve_loads
+import main_parser
+from nldm_table import stack_tables
+import report
+from timing_graph import INPUT, OUTPUT, TimingGraph
+from timing_state import required_arrival_time
+from vector_sta import gather_ranges
+
+class MultiCornerSTA:
+    '''Static Timing Analysis of a netlist with several standard cell libraries at once
+
+    Timing state holds one row per corner, every level of the netlist is computed
+    for all the corners with the same gathers, so the levelization and the graph
+    walk are shared. Every corner gives the same values as STA with its library.'''
+    def __init__(self, corners, netlist, corner_names=None, output_dir=main_parser.OUTPUT_DIR):
+        # Compile a netlist dictionary from read_ckt into the array-backed timing graph
+        if not isinstance(netlist, TimingGraph):
+            netlist = TimingGraph.from_netlist(netlist)
+        self.graph = netlist        # Timing graph
+        self.corners = corners      # Standard cells of every corner
+        self.corner_names = corner_names or [f"corner{number}" for number in range(len(corners))]
+        self.output_dir = output_dir    # Directory the reports are written to
+        num_corners = len(corners)
+        num_nodes = len(self.graph)
+        # Standard cell of every gate type code in every corner, None for ports
+        self.cells = [[std_cell.get(name) for name in self.graph.type_names] for std_cell in corners]
+        for code, name in enumerate(self.graph.type_names):
+            if len({cells[code] is None for cells in self.cells}) > 1:
+                raise ValueError(f"{name} is missing in some of the corner libraries")
+        self.order = None           # Nodes in levelized order
+        self.level_offsets = None   # Start of every level in the levelized order
+        self.schedule = []          # Gather and scatter arrays of all the levels
+        self.slew_index = None      # Input slew indexes of all the lookup tables, flattened
+        self.grid = None            # Delay and slew values of all the lookup tables, flattened
+        self.row_stride = 0         # Distance between consecutive rows of a lookup table in grid
+        self.outputs = None         # Output ports and their nets
+        self.output_slew = np.zeros((num_corners, num_nodes))    # Output slew of all the nodes
+        self.max_output_arrival = np.zeros((num_corners, num_nodes))    # Maximum output arrival time of all the nodes
+        self.cell_delay = np.zeros((num_corners, len(self.graph.fanin_index)))    # Cell delays of all the fan-in arcs
+        self.back_traversal_arrival = np.zeros((num_corners, num_nodes))   # Required arrival time for all the nodes
+        self.slack = np.zeros((num_corners, num_nodes))  # Slack of the nodes
+        self.total_circuit_delay = np.zeros(num_corners)     # Total circuit delay of every corner
+        self.total_circuit_delay_slack = np.zeros(num_corners)   # Required arrival time of every corner
+        self.stats = None           # Instrumentation of the passes, None to disable it
+        self.port_loads = {}        # Load of the output ports given by the user, by node ID, in all the corners
+        self.wire_caps = {}         # Wire capacitance of the nets given by the user, by node ID, in all the corners
+
+    def set_loads(self, output_loads=None, wire_caps=None):
+        '''Function to set the load of primary outputs and the wire capacitance of nets of all the corners, by net name'''
+        port_loads, wire_caps = resolve_loads(self.graph, output_loads, wire_caps)
+        self.port_loads.update(port_loads)
+        self.wire_caps.update(wire_caps)
+        # Compile the loads again with the next traversal
+        if port_loads or wire_caps:
+            self.order = None
+
+    def compute_output_load(self):
+        '''Function to calculate the output capacitance of all the nodes in every corner'''
+        graph = self.graph
+        # Input capacitance of every gate type code, output ports load 4 inverters
+        capacitance = np.zeros((len(self.corners), len(graph.type_names)))
+        for corner, cells in enumerate(self.cells):
+            for code, cell in enumerate(cells):
+                if cell is not None:
+                    capacitance[corner, code] = cell.input_capacitance
+            capacitance[corner, OUTPUT] = 4 * self.corners[corner]["INV"].input_capacitance
+        node_type = np.frombuffer(graph.node_type, dtype=np.uint8)
+        # Input capacitance of every node, output ports with a given load take it instead
+        pin_capacitance = capacitance[:, node_type]
+        for port, port_load in self.port_loads.items():
+            pin_capacitance[:, port] = port_load
+        fanout_offsets = np.frombuffer(graph.fanout_offsets, dtype=np.int32)
+        fanout_index = np.frombuffer(graph.fanout_index, dtype=np.int32)
+        fanout_count = np.diff(fanout_offsets)
+        # Add the fan-out capacitances one pin at a time, in fan-out order,
+        # so that the sums are rounded the same way as STA.output_capacitance
+        output_load = np.zeros((len(self.corners), len(graph)))
+        for pin in range(int(fanout_count.max()) if len(graph) else 0):
+            nodes = np.flatnonzero(fanout_count > pin)
+            output_load[:, nodes] += pin_capacitance[:, fanout_index[fanout_offsets[nodes] + pin]]
+        # Add the wire capacitance of the nets
+        for node, wire_cap in self.wire_caps.items():
+            output_load[:, node] += wire_cap
+        return output_load
+
+    def compile_schedule(self):
+        '''Function to levelize the netlist and precompute everything a level needs except the slews'''
+        graph = self.graph
+        num_corners = len(self.corners)
+        num_types = len(graph.type_names)
+        # Levels of the timing graph, shared with the analyses of other engines
+        sorted_order, level_offsets = graph.levelize()
+        self.order = np.frombuffer(sorted_order, dtype=np.int32)
+        self.level_offsets = np.frombuffer(level_offsets, dtype=np.int32)
+        output_load = self.compute_output_load()
+        # Lookup tables of every corner and gate type, flattened so that one index reaches any entry
+        input_slew, load_index, row_count, column_count, grid = stack_tables(
+            [None if cell is None else cell.table for cells in self.cells for cell in cells])
+        rows = input_slew.shape[1]
+        columns = load_index.shape[1]
+        self.slew_index = input_slew.reshape(-1)
+        self.grid = grid.reshape(-1)
+        # Bracketing counts the indexes at or below a value, beyond the first and the
+        # second to last index the first and last 2 rows or columns are used
+        slew_bounds = input_slew[:, :-1].copy()
+        load_bounds = load_index[:, :-1].copy()
+        slew_bounds[:, 0] = -np.inf
+        load_bounds[:, 0] = -np.inf
+        slew_bounds[np.arange(rows - 1) >= row_count[:, None] - 1] = np.inf
+        load_bounds[np.arange(columns - 1) >= column_count[:, None] - 1] = np.inf
+        node_type = np.frombuffer(graph.node_type, dtype=np.uint8)
+        fanin_offsets = np.frombuffer(graph.fanin_offsets, dtype=np.int32)
+        fanin_index = np.frombuffer(graph.fanin_index, dtype=np.int32)
+        is_gate = np.array([cell is not None for cell in self.cells[0]])[node_type]
+        corner_base = np.arange(num_corners)[:, None] * num_types
+        self.schedule = []
+        for level in range(len(self.level_offsets) - 1):
+            nodes = self.order[int(self.level_offsets[level]):int(self.level_offsets[level+1])]
+            gates = nodes[is_gate[nodes]]
+            if len(gates) == 0:
+                continue
+            edges = gather_ranges(fanin_offsets, gates)
+            num_fanins = fanin_offsets[gates + 1] - fanin_offsets[gates]
+            pin_gate = np.repeat(np.arange(len(gates)), num_fanins)
+            pin_start = np.cumsum(num_fanins) - num_fanins
+            # Table of every corner and pin
+            tables = corner_base + node_type[gates][pin_gate]
+            # The output capacitance of a gate is fixed, so are its columns of the lookup tables
+            load = output_load[:, gates][:, pin_gate]
+            column1 = (load_bounds[tables] <= load[..., None]).sum(axis=2) - 1
+            c1 = load_index[tables, column1]
+            c2 = load_index[tables, column1 + 1]
+            # If the node has more than 2 inputs, multiply delay and slew with 'number of inputs / 2'
+            derate = np.where(num_fanins > 2, num_fanins / 2, 1.0)[pin_gate]
+            if (num_fanins <= 2).all():
+                derate = None
+            # Pin arrivals are arranged as one row per gate, padded with -inf
+            width = int(num_fanins.max())
+            pin_slot = pin_gate * width + (np.arange(len(edges)) - pin_start[pin_gate])
+            self.schedule.append((
+                gates, gates[pin_gate], edges, fanin_index[edges], slew_bounds[tables], tables * rows,
+                (tables * rows * columns + column1) * 2, c2 - load, load - c1, c2 - c1, derate,
+                width, pin_slot, pin_start))
+        self.row_stride = 2 * columns
+        outputs = np.flatnonzero(node_type == OUTPUT)
+        self.outputs = (outputs, fanin_index[fanin_offsets[outputs]])
+
+    def start_inputs(self, inputs):
+        '''Function to set the slew and arrival time of the primary inputs in every row, the default input slew at time 0'''
+        self.output_slew[:, inputs] = main_parser.PRIMARY_INPUT_SLEW
+
+    def vary(self, pin_gates, delay, slew):
+        '''Function to adjust the delays and slews of the input pins of a level, given the gate of every pin'''
+        return delay, slew
+
+    @timed("forward_traversal")
+    def forward_traversal(self):
+        '''Function to perform forward traversal of netlist for all the corners, one level at a time'''
+        # Levelize the netlist and compile the lookup tables and loads once
+        if self.order is None:
+            self.compile_schedule()
+        slew_index = self.slew_index
+        grid = self.grid
+        row_stride = self.row_stride
+        output_slew = self.output_slew
+        arrival = self.max_output_arrival
+        node_type = np.frombuffer(self.graph.node_type, dtype=np.uint8)
+        output_slew[:] = 0.0
+        arrival[:] = 0.0
+        # Primary inputs start with their slew and arrival time
+        self.start_inputs(np.flatnonzero(node_type == INPUT))
+        num_rows = len(arrival)
+        for (gates, pin_gates, edges, fanins, slew_bounds, slew_base, grid_base, w_c2, w_c1, column_span, derate,
+             width, pin_slot, pin_start) in self.schedule:
+            # Gather fan-in slews of all the input pins of the level in every corner
+            input_slew = output_slew[:, fanins]
+            # Bracket the input slews, and 2D-interpolate delay and slew together
+            row1 = (slew_bounds <= input_slew[..., None]).sum(axis=2) - 1
+            t1 = slew_index[slew_base + row1]
+            t2 = slew_index[slew_base + row1 + 1]
+            w_t2 = t2 - input_slew
+            w_t1 = input_slew - t1
+            denominator = column_span * (t2 - t1)
+            v11 = grid_base + row1 * row_stride
+            v21 = v11 + row_stride
+            delay = (grid[v11]*w_c2*w_t2 + grid[v11+2]*w_c1*w_t2
+                     + grid[v21]*w_c2*w_t1 + grid[v21+2]*w_c1*w_t1)/denominator
+            slew = (grid[v11+1]*w_c2*w_t2 + grid[v11+3]*w_c1*w_t2
+                    + grid[v21+1]*w_c2*w_t1 + grid[v21+3]*w_c1*w_t1)/denominator
+            if derate is not None:
+                delay *= derate
+                slew *= derate
+            delay, slew = self.vary(pin_gates, delay, slew)
+            self.cell_delay[:, edges] = delay
+            # The first pin with the maximum arrival time gives the output slew
+            pin_arrival = np.full((num_rows, len(gates) * width), -np.inf)
+            pin_arrival[:, pin_slot] = delay + arrival[:, fanins]
+            pin_arrival = pin_arrival.reshape(num_rows, len(gates), width)
+            latest_pin = pin_arrival.argmax(axis=2)
+            arrival[:, gates] = np.take_along_axis(pin_arrival, latest_pin[..., None], axis=2)[..., 0]
+            output_slew[:, gates] = np.take_along_axis(slew, pin_start + latest_pin, axis=1)
+        # Output ports take the arrival time of their net
+        outputs, output_fanins = self.outputs
+        arrival[:, outputs] = arrival[:, output_fanins]
+        self.total_circuit_delay = np.maximum(arrival[:, outputs].max(axis=1, initial=0.0), 0.0)
+        # calculate the required arrival time
+        self.total_circuit_delay_slack = required_arrival_time(self.total_circuit_delay)
+        if self.stats is not None:
+            # Every corner, or sample, visits every node and looks up every input pin
+            self.stats.count("nodes_visited", num_rows * len(self.graph))
+            self.stats.count("lut_lookups", num_rows * sum(len(level[2]) for level in self.schedule))
+            self.stats.count("levels", len(self.schedule))
+
+    @timed("backward_traversal")
+    def backward_traversal(self):
+        '''Function to perform backward traversal of netlist for all the corners, one level at a time'''
+        required = self.back_traversal_arrival
+        required[:] = np.inf
+        # Output ports and their nets get the required arrival time of the circuit
+        outputs, output_fanins = self.outputs
+        required[:, outputs] = self.total_circuit_delay_slack[:, None]
+        np.minimum.at(required, (slice(None), output_fanins), self.total_circuit_delay_slack[:, None])
+        # Fan-outs are in later levels, so every level is final before it is visited
+        for gates, _, edges, fanins, *_, pin_start in reversed(self.schedule):
+            num_fanins = np.diff(np.append(pin_start, len(edges)))
+            gate_required = np.repeat(required[:, gates], num_fanins, axis=1)
+            np.minimum.at(required, (slice(None), fanins), gate_required - self.cell_delay[:, edges])
+        # Calculate Slack for the nodes
+        np.subtract(required, self.max_output_arrival, out=self.slack)
+
+    @timed("report_slacks")
+    def report_slacks(self):
+        '''Function to write the circuit delay and the worst and per-corner slack of all the nodes'''
+        graph = self.graph
+        worst_slack = self.slack.min(axis=0)
+        # Slacks of every node in ps, formatted once for all the corners
+        corner_slacks = (self.slack.T * 1000).tolist()
+        with report.open_report(self.output_dir, report.TEXT_REPORT) as result_file_slack:
+            # Print the worst circuit delay, and the circuit delay of every corner
+            result_file_slack.write(f"Circuit delay: {(self.total_circuit_delay.max()*1000):.5f} ps\n")
+            for name, delay in zip(self.corner_names, self.total_circuit_delay):
+                result_file_slack.write(f"{name} circuit delay: {(delay*1000):.5f} ps\n")
+            result_file_slack.write(f"\nGate slacks (worst, {', '.join(self.corner_names)}):\n")
+            # Format the lines of the nodes in chunks, every write call copies one block to the buffer
+            order = self.order.tolist()
+            for start in range(0, len(order), report.REPORT_CHUNK):
+                result_file_slack.write("".join([
+                    f"{graph.label(node)}: {(worst_slack[node]*1000):.5f} ps, "
+                    f"{', '.join(f'{slack:.5f} ps' for slack in corner_slacks[node])}\n"
+                    for node in order[start:start + report.REPORT_CHUNK]]))
+
+    def slacks(self, nets, required_time=None):
+        '''Function to get the slack of the given nets and output ports in every corner
+
+        All the corners are timed in full, the required arrival time of the outputs
+        is 1.1 times the circuit delay of every corner unless one is given.'''
+        nets = list(nets)
+        nodes = []
+        for net in nets:
+            node = self.graph.ids.get(net)
+            if node is None:
+                raise ValueError(f"{net} is not a net of the netlist")
+            nodes.append(node)
+        self.forward_traversal()
+        if required_time is not None:
+            self.total_circuit_delay_slack = np.full(len(self.corners), float(required_time))
+        self.backward_traversal()
+        return {net: self.slack[:, node].tolist() for net, node in zip(nets, nodes)}
+
+    def execute(self):
+        '''Function to perform Static Timing Analysis of all the corners'''
+        # Step 1 - Perform forward traversal to check the circuit delay and required arrival time
+        self.forward_traversal()
+        # Step 2 - Perform backward traversal to calculate slack
+        self.backward_traversal()
+        self.report_slacks()
@@ -0,0 +1,215 @@
+'''Compiled NLDM lookup tables'''
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+
+# Entries kept by an arc cache before the least recently used ones are evicted
+ARC_CACHE_SIZE = 65536
+
+class NLDMTable:
+    '''Immutable delay and slew lookup table of a standard cell
+
+    The delay and slew grids are stacked, entry (row, column) holds the delay at
+    2*(row*columns + column) and the slew right after it, so one bracketing of the
+    input slew and output load serves both. Values beyond the first or the last
+    index are extrapolated from the first or the last 2 rows or columns.'''
+    __slots__ = ("input_slew", "output_load", "values", "rows", "columns")
+
+    def __init__(self, input_slew, output_load, delay, slew):
+        if len(input_slew) < 2 or len(output_load) < 2:
+            raise ValueError("lookup table needs at least 2 indexes on both axes")
+        set_attribute = object.__setattr__
+        set_attribute(self, "input_slew", array("d", input_slew))    # Index 1 - Input slews
+        set_attribute(self, "output_load", array("d", output_load))  # Index 2 - Output loads
+        set_attribute(self, "rows", len(input_slew))
+        set_attribute(self, "columns", len(output_load))
+        values = array("d")
+        for delay_row, slew_row in zip(delay, slew):
+            for delay_value, slew_value in zip(delay_row, slew_row):
+                values.append(delay_value)
+                values.append(slew_value)
+        if len(values) != 2 * self.rows * self.columns:
+            raise ValueError("lookup table values don't match its indexes")
+        set_attribute(self, "values", values)  # Stacked delay and slew grids
+
+    def __setattr__(self, name, value):
+        raise AttributeError("NLDMTable is immutable")
+
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        # Restore a pickled table, for example in the worker processes of a batch run
+        for name, value in zip(self.__slots__, state):
+            object.__setattr__(self, name, value)
+
+    @classmethod
+    def from_cell(cls, cell):
+        '''Function to compile the lookup tables of a Lib object'''
+        return cls(cell.input_slew, cell.output_load, cell.delay, cell.slew)
+
+    def lookup(self, input_slew, output_capacitance):
+        '''Function to look up the delay and output slew of an input slew and output load'''
+        loads = self.output_load
+        # Column right below the value, clamped to the first and last 2 indexes
+        column1 = min(max(bisect_right(loads, output_capacitance) - 1, 0), self.columns - 2)
+        c1 = loads[column1]
+        c2 = loads[column1+1]
+        return self._interpolate(input_slew, column1, c1, c2, c2-output_capacitance, output_capacitance-c1)
+
+    def lookup_early_late(self, late_slew, early_slew, output_capacitance):
+        '''Function to look up the delay and output slew of a late and an early input slew at one output load
+
+        The output load is bracketed once for both, and equal input slews are
+        interpolated once. Returns the late delay and slew, then the early ones,
+        the values lookup gives for each input slew.'''
+        loads = self.output_load
+        # Column right below the output load, and its weights, shared by both input slews
+        column1 = min(max(bisect_right(loads, output_capacitance) - 1, 0), self.columns - 2)
+        c1 = loads[column1]
+        c2 = loads[column1+1]
+        w_c2 = c2-output_capacitance
+        w_c1 = output_capacitance-c1
+        late_delay, late_output_slew = self._interpolate(late_slew, column1, c1, c2, w_c2, w_c1)
+        if early_slew == late_slew:
+            return late_delay, late_output_slew, late_delay, late_output_slew
+        return (late_delay, late_output_slew) + self._interpolate(early_slew, column1, c1, c2, w_c2, w_c1)
+
+    def _interpolate(self, input_slew, column1, c1, c2, w_c2, w_c1):
+        '''Function to interpolate the delay and output slew of an input slew in a bracketed column
+
+        Brackets the input slew between 2 rows, clamped like the column, and
+        weighs the 4 surrounding entries of both grids with the column weights.'''
+        slews = self.input_slew
+        row1 = min(max(bisect_right(slews, input_slew) - 1, 0), self.rows - 2)
+        t1 = slews[row1]
+        t2 = slews[row1+1]
+        # Weights of the 2D-interpolation, shared by delay and slew
+        w_t2 = t2-input_slew
+        w_t1 = input_slew-t1
+        denominator = (c2-c1) * (t2-t1)
+        values = self.values
+        v11 = 2 * (row1*self.columns + column1)
+        v21 = v11 + 2*self.columns
+        delay = (values[v11]*w_c2*w_t2 + values[v11+2]*w_c1*w_t2
+                 + values[v21]*w_c2*w_t1 + values[v21+2]*w_c1*w_t1)/denominator
+        slew = (values[v11+1]*w_c2*w_t2 + values[v11+3]*w_c1*w_t2
+                + values[v21+1]*w_c2*w_t1 + values[v21+3]*w_c1*w_t1)/denominator
+        return delay, slew
+
+    def extrapolates(self, input_slew, output_capacitance):
+        '''Function to check if the lookup of an input slew and output load is extrapolated beyond the indexes'''
+        return not (self.input_slew[0] <= input_slew <= self.input_slew[-1]
+                    and self.output_load[0] <= output_capacitance <= self.output_load[-1])
+
+    def lookup_batch(self, input_slew, output_capacitance):
+        '''Function to look up delays and output slews of arrays of input slews and output loads'''
+        # Import NumPy only for batches, scalar lookups don't need it
+        import numpy as np
+        input_slew = np.asarray(input_slew, dtype=np.float64)
+        output_capacitance = np.asarray(output_capacitance, dtype=np.float64)
+        slews = np.frombuffer(self.input_slew, dtype=np.float64)
+        loads = np.frombuffer(self.output_load, dtype=np.float64)
+        grid = np.frombuffer(self.values, dtype=np.float64).reshape(self.rows, self.columns, 2)
+        row1 = np.clip(slews.searchsorted(input_slew, side="right") - 1, 0, self.rows - 2)
+        column1 = np.clip(loads.searchsorted(output_capacitance, side="right") - 1, 0, self.columns - 2)
+        t1 = slews[row1]
+        t2 = slews[row1+1]
+        c1 = loads[column1]
+        c2 = loads[column1+1]
+        w_c2 = (c2-output_capacitance)[..., None]
+        w_c1 = (output_capacitance-c1)[..., None]
+        w_t2 = (t2-input_slew)[..., None]
+        w_t1 = (input_slew-t1)[..., None]
+        terms = grid[row1, column1]*w_c2*w_t2 + grid[row1, column1+1]*w_c1*w_t2
+        terms += grid[row1+1, column1]*w_c2*w_t1
+        terms += grid[row1+1, column1+1]*w_c1*w_t1
+        values = terms / ((c2-c1) * (t2-t1))[..., None]
+        return values[..., 0], values[..., 1]
+
+class ArcCache:
+    '''Memo of the delay and slew of cell arcs, keyed on the lookup table, input slew, output load and fan-in count
+
+    Gates of one type driving the same fan-out types have the same output load,
+    and the ones near the primary inputs see the same input slews, so their
+    lookups repeat. Input slews are rounded to multiples of the tolerance, and
+    looked up at the rounded value so that results don't depend on the order of
+    the lookups, a tolerance of 0 gives the same values as the tables. The least
+    recently used entries are evicted beyond max_size. Keys hold the tables
+    themselves, so one cache can serve all the designs of a batch.'''
+    def __init__(self, max_size=ARC_CACHE_SIZE, tolerance=0.0):
+        if max_size < 1:
+            raise ValueError("arc cache needs room for at least 1 entry")
+        if tolerance < 0:
+            raise ValueError("arc cache tolerance can't be negative")
+        self.max_size = max_size    # Most entries kept
+        self.tolerance = tolerance  # Input slew quantization step, 0 for exact keys
+        self.entries = OrderedDict()    # Delay and slew of every key, from the least to the most recently used
+        self.hits = 0               # Lookups answered by the cache
+        self.misses = 0             # Lookups computed from the tables
+        self.evictions = 0          # Entries evicted to stay within max_size
+
+    def lookup(self, table, input_slew, output_capacitance, num_fanins):
+        '''Function to get the delay and output slew of an arc, scaled by 'number of inputs / 2' beyond 2 inputs'''
+        if self.tolerance:
+            slew_key = round(input_slew / self.tolerance)
+            input_slew = slew_key * self.tolerance
+        else:
+            slew_key = input_slew
+        key = (table, slew_key, output_capacitance, num_fanins)
+        entries = self.entries
+        value = entries.get(key)
+        if value is not None:
+            self.hits += 1
+            entries.move_to_end(key)
+            return value
+        self.misses += 1
+        delay, slew = table.lookup(input_slew, output_capacitance)
+        # If the node has more than 2 inputs, multiply delay and slew with 'number of inputs / 2'
+        if num_fanins > 2:
+            delay *= num_fanins/2
+            slew *= num_fanins/2
+        value = entries[key] = (delay, slew)
+        if len(entries) > self.max_size:
+            entries.popitem(last=False)
+            self.evictions += 1
+        return value
+
+    def counters(self):
+        '''Function to get the hits, misses, evictions and size of the cache'''
+        return {"arc_cache_hits": self.hits, "arc_cache_misses": self.misses,
+                "arc_cache_evictions": self.evictions, "arc_cache_entries": len(self.entries)}
+
+    def summary(self):
+        '''Function to get a line with the counters and hit rate of the cache'''
+        lookups = self.hits + self.misses
+        hit_rate = self.hits / lookups if lookups else 0.0
+        return (f"Arc cache: {self.hits} hits, {self.misses} misses ({hit_rate:.1%} hit rate), "
+                f"{self.evictions} evictions, {len(self.entries)} entries")
+
+def stack_tables(tables):
+    '''Function to stack lookup tables of several cells into padded NumPy arrays
+
+    Returns the input slew and output load indexes, padded with infinity, the
+    number of indexes and the stacked delay and slew grids of every table.
+    Missing tables (None) are left as padding.'''
+    # Import NumPy only for stacking, scalar lookups don't need it
+    import numpy as np
+    present = [table for table in tables if table is not None]
+    rows = max([table.rows for table in present], default=2)
+    columns = max([table.columns for table in present], default=2)
+    input_slew = np.full((len(tables), rows + 1), np.inf)
+    output_load = np.full((len(tables), columns + 1), np.inf)
+    row_count = np.full(len(tables), 2)
+    column_count = np.full(len(tables), 2)
+    grid = np.zeros((len(tables), rows + 1, columns + 1, 2))
+    for code, table in enumerate(tables):
+        if table is None:
+            continue
+        input_slew[code, :table.rows] = table.input_slew
+        output_load[code, :table.columns] = table.output_load
+        row_count[code] = table.rows
+        column_count[code] = table.columns
+        grid[code, :table.rows, :table.columns] = np.frombuffer(
+            table.values, dtype=np.float64).reshape(table.rows, table.columns, 2)
+    return input_slew, output_load, row_count, column_count, grid
@@ -0,0 +1,302 @@
+'''Static Timing Analysis of one design on several processes, level by level, with the timing graph and state in shared memory'''
+from array import array
+import multiprocessing
+from multiprocessing import shared_memory
+import os
+from threading import BrokenBarrierError
+import weakref
+import main_parser
+from instrumentation import phase
+from main_sta import STA
+from timing_graph import TimingGraph
+from timing_state import TimingState
+
+# Smallest design timed on worker processes, smaller ones are timed serially as
+# starting the workers and copying the arrays takes longer than the traversal
+PARALLEL_MIN_NODES = 200000
+
+# Nodes every process needs in a level for the level to be split, smaller levels
+# are timed by the main process, and consecutive ones share one synchronization
+PARALLEL_LEVEL_NODES = 64
+
+# Arrays of the timing graph and the timing state placed in shared memory
+GRAPH_ARRAYS = ("node_type", "fanin_offsets", "fanin_index", "fanout_offsets", "fanout_index")
+STATE_ARRAYS = ("output_slew", "max_output_arrival", "cell_delay", "back_traversal_arrival", "slack")
+
+# Arrays every pass reads from the timing state, and writes back to it
+FORWARD_INPUTS = ("output_slew", "max_output_arrival", "cell_delay")
+FORWARD_OUTPUTS = ("output_slew", "max_output_arrival", "cell_delay")
+BACKWARD_INPUTS = ("max_output_arrival", "cell_delay", "slack")
+BACKWARD_OUTPUTS = ("back_traversal_arrival", "slack")
+
+def schedule_levels(level_offsets, processes):
+    '''Function to group the levels into segments of the sorted order, that are timed between two synchronizations
+
+    Returns (start, stop, split) for every segment, levels large enough are split
+    across the processes, runs of small levels are timed by the main process.'''
+    segments = []
+    for level in range(len(level_offsets) - 1):
+        start = level_offsets[level]
+        stop = level_offsets[level+1]
+        split = stop - start >= PARALLEL_LEVEL_NODES * processes
+        if not split and segments and not segments[-1][2]:
+            segments[-1] = (segments[-1][0], stop, False)
+        else:
+            segments.append((start, stop, split))
+    return segments
+
+def attach_arrays(memory, layout):
+    '''Function to get typed views of the arrays of a shared memory block, by name'''
+    return {name: memory.buf[offset:offset + length * array(typecode).itemsize].cast(typecode)
+            for name, (typecode, offset, length) in layout.items()}
+
+class LevelWorker:
+    '''Timing of a share of the nodes of every level, on views of the shared timing graph and state
+
+    Forward evaluation is the one of STA, so that both give the same values. The
+    required arrival time of a node is taken from its fan-outs with require_node,
+    instead of every node lowering the ones of its fan-ins, so that the nodes of a
+    level only write their own values.'''
+    evaluate_node = STA.evaluate_node
+    require_node = STA.require_node
+
+    def __init__(self, std_cell, type_names, views, order, barrier, index, processes):
+        self.std_cell = std_cell    # Standard cell
+        self.cells = [std_cell.get(name) for name in type_names]
+        self.arc_cache = None       # Arcs are looked up, a memo would be private to every process
+        self.loads = views["loads"] # Output capacitance of all the nodes
+        # Timing graph and timing state on the shared arrays
+        self.graph = TimingGraph()
+        for name in GRAPH_ARRAYS:
+            setattr(self.graph, name, views[name])
+        self.state = TimingState.__new__(TimingState)
+        for name in STATE_ARRAYS:
+            setattr(self.state, name, views[name])
+        self.order = order          # Sorted order of the nodes
+        self.barrier = barrier      # Barrier all the processes meet at after every segment
+        self.index = index          # Number of this process, the main process is 0
+        self.processes = processes  # Number of processes timing the design
+
+    def run(self, segments, backward, required_time):
+        '''Function to time the share of this process of every segment, in sorted order or in reverse sorted order'''
+        index = self.index
+        processes = self.processes
+        if backward:
+            segments = reversed(segments)
+        for start, stop, split in segments:
+            if split:
+                first = start + (stop - start) * index // processes
+                last = start + (stop - start) * (index + 1) // processes
+            elif index == 0:
+                first, last = start, stop
+            else:
+                first = last = start
+            if backward:
+                for position in range(last - 1, first - 1, -1):
+                    self.require_node(self.order[position], required_time)
+            else:
+                for position in range(first, last):
+                    self.evaluate_node(self.order[position])
+            # The next segment reads the values of this one
+            self.barrier.wait()
+
+def serve_levels(memory_name, layout, std_cell, type_names, segments, barrier, index, processes, connection):
+    '''Function run by every worker process, timing its share of the levels for every pass the main process starts'''
+    memory = shared_memory.SharedMemory(name=memory_name)
+    views = attach_arrays(memory, layout)
+    worker = LevelWorker(std_cell, type_names, views, views["order"], barrier, index, processes)
+    try:
+        while True:
+            command = connection.recv()
+            if command is None:
+                break
+            backward, required_time = command
+            try:
+                worker.run(segments, backward, required_time)
+            except BrokenBarrierError:
+                # Another process failed, the main process reports it
+                continue
+            except Exception as error:  # pylint: disable=broad-except
+                # Release the other processes from the barrier, and report the error
+                barrier.abort()
+                connection.send(f"{type(error).__name__}: {error}")
+    finally:
+        del worker
+        for view in views.values():
+            view.release()
+        memory.close()
+
+def close_pool(memory, views, processes, connections):
+    '''Function to stop the worker processes and free the shared memory'''
+    for connection in connections:
+        try:
+            connection.send(None)
+        except OSError:
+            pass
+    for process in processes:
+        process.join(timeout=5)
+        if process.is_alive():
+            process.terminate()
+    for connection in connections:
+        connection.close()
+    for view in views.values():
+        view.release()
+    memory.close()
+    memory.unlink()
+
+class LevelPool:
+    '''Worker processes and the shared memory holding the timing graph and the timing state of one design
+
+    The arrays are copied to shared memory once, worker processes attach to the
+    block by name, so passes only send a command to every worker.'''
+    def __init__(self, sta, processes):
+        graph = sta.graph
+        arrays = {name: getattr(graph, name) for name in GRAPH_ARRAYS}
+        arrays["order"] = sta.sorted_order
+        arrays["loads"] = sta.loads
+        for name in STATE_ARRAYS:
+            arrays[name] = getattr(sta.state, name)
+        # Doubles first, so that every array is aligned to its item size
+        layout = {}
+        size = 0
+        for name in sorted(arrays, key=lambda name: -arrays[name].itemsize):
+            layout[name] = (arrays[name].typecode, size, len(arrays[name]))
+            size += len(arrays[name]) * arrays[name].itemsize
+        self.memory = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        self.views = attach_arrays(self.memory, layout)
+        for name in GRAPH_ARRAYS + ("order", "loads"):
+            self.views[name][:] = memoryview(arrays[name])
+        self.segments = schedule_levels(sta.level_offsets, processes)
+        self.barrier = multiprocessing.Barrier(processes)
+        self.processes = []
+        self.connections = []
+        for index in range(1, processes):
+            connection, worker_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=serve_levels, daemon=True,
+                args=(self.memory.name, layout, sta.std_cell, graph.type_names, self.segments,
+                      self.barrier, index, processes, worker_connection))
+            process.start()
+            worker_connection.close()
+            self.processes.append(process)
+            self.connections.append(connection)
+        # The main process times its share as process 0
+        self.worker = LevelWorker(sta.std_cell, graph.type_names, self.views, self.views["order"],
+                                  self.barrier, 0, processes)
+        # Free the shared memory with the pool, or at exit
+        self.finalizer = weakref.finalize(self, close_pool, self.memory, self.views, self.processes, self.connections)
+
+    def load(self, state, names):
+        '''Function to copy arrays of a timing state to shared memory'''
+        for name in names:
+            self.views[name][:] = memoryview(getattr(state, name))
+
+    def store(self, state, names):
+        '''Function to copy arrays of shared memory to a timing state'''
+        for name in names:
+            memoryview(getattr(state, name))[:] = self.views[name]
+
+    def run(self, backward, required_time=0.0):
+        '''Function to time all the levels on all the processes, a pool that failed can't be used again'''
+        for connection in self.connections:
+            connection.send((backward, required_time))
+        try:
+            self.worker.run(self.segments, backward, required_time)
+        except BrokenBarrierError:
+            # Collect the error of the worker that broke the barrier
+            errors = [connection.recv() for connection in self.connections if connection.poll(5)]
+            raise RuntimeError(f"Worker process failed: {'; '.join(errors) or 'no error reported'}") from None
+        except BaseException:
+            self.barrier.abort()
+            raise
+
+    def close(self):
+        '''Function to stop the worker processes and free the shared memory'''
+        self.worker = None
+        self.finalizer()
+
+class ParallelSTA(STA):
+    '''Static Timing Analysis with every level of the netlist split across worker processes
+
+    Results are the same as the ones of STA. Designs below min_nodes, and
+    analyses with one process, are timed serially. Worker processes are started
+    by the first parallel pass and kept until close() or the next netlist edit.'''
+    def __init__(self, std_cell, netlist, output_dir=main_parser.OUTPUT_DIR, state=None,
+                 processes=None, min_nodes=PARALLEL_MIN_NODES):
+        super().__init__(std_cell, netlist, output_dir, state)
+        self.processes = processes or os.cpu_count() or 1   # Number of processes, the main process included
+        self.min_nodes = min_nodes  # Smallest design timed on worker processes
+        self.pool = None            # Worker processes and shared memory, once a parallel pass started them
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        '''Function to stop the worker processes and free the shared memory'''
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+
+    def netlist_changed(self):
+        '''Function to stop the worker processes after an edit, the next pass shares the edited graph'''
+        self.close()
+
+    def is_parallel(self):
+        '''Function to check if the passes are split across worker processes'''
+        return self.processes > 1 and len(self.graph) >= self.min_nodes
+
+    def start_pool(self):
+        '''Function to levelize the netlist, annotate the loads, and start the worker processes on the shared arrays'''
+        if self.level_offsets is None:
+            self.levelize()
+        # Loads are annotated once, and shared with the workers
+        if self.loads is None:
+            self.annotate_loads()
+        if self.pool is None:
+            self.pool = LevelPool(self, self.processes)
+        return self.pool
+
+    def run_pass(self, inputs, outputs, backward, required_time=0.0):
+        '''Function to time all the levels on the worker processes, from and to the timing state'''
+        pool = self.start_pool()
+        try:
+            pool.load(self.state, inputs)
+            pool.run(backward, required_time)
+            pool.store(self.state, outputs)
+        except BaseException:
+            # Workers may be left in the middle of the pass, the next pass starts new ones
+            self.close()
+            raise
+        return pool
+
+    def forward_traversal(self):
+        '''Function to perform forward traversal of netlist, every level split across the processes'''
+        if not self.is_parallel():
+            super().forward_traversal()
+            return
+        with phase(self.stats, "forward_traversal"):
+            pool = self.run_pass(FORWARD_INPUTS, FORWARD_OUTPUTS, backward=False)
+            # Get the maximum of maximum output arrival time of output node, and the required arrival time
+            self.set_circuit_delay()
+            if self.stats is not None:
+                self.stats.count("nodes_visited", len(self.sorted_order))
+                self.stats.count("levels", len(self.level_offsets) - 1)
+                self.stats.count("synchronizations", len(pool.segments))
+                self.count_lookups(self.sorted_order)
+
+    def backward_traversal(self):
+        '''Function to perform backward traversal on netlist, every level split across the processes'''
+        if not self.is_parallel():
+            super().backward_traversal()
+            return
+        with phase(self.stats, "backward_traversal"):
+            pool = self.run_pass(BACKWARD_INPUTS, BACKWARD_OUTPUTS, backward=True,
+                                 required_time=self.total_circuit_delay_slack)
+            # All the nodes are timed
+            self.changed_nodes.clear()
+            if self.stats is not None:
+                self.stats.count("nodes_visited", len(self.sorted_order))
+                self.stats.count("synchronizations", len(pool.segments))
@@ -0,0 +1,214 @@
+'''On-disk cache of parsed netlists and compiled standard cell libraries'''
+from array import array
+import hashlib
+import mmap
+import os
+from pathlib import Path
+import struct
+import main_parser
+from nldm_table import NLDMTable
+from timing_graph import TimingGraph
+
+# Directory of the cache files, next to the source folder whatever the working directory
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache")
+
+# Size the cache directory is trimmed to, least recently used files are evicted first
+CACHE_SIZE_LIMIT = 256 * 1024 * 1024
+
+# Magic bytes and format version of a cache file
+CACHE_MAGIC = b"STACACHE"
+CACHE_FORMAT = 1
+
+# Header and section table entries of a cache file, a section is a typed array
+HEADER = struct.Struct("<8sII")
+SECTION = struct.Struct("<8sQQ")
+
+def cache_path(path, kind, cache_dir=CACHE_DIR):
+    '''Function to get the cache file of a source file from its content hash and the parser version'''
+    digest = hashlib.sha256(f"{kind}:{main_parser.PARSER_VERSION}:{CACHE_FORMAT}:".encode())
+    digest.update(Path(path).read_bytes())
+    return Path(cache_dir) / f"{kind}-{digest.hexdigest()[:40]}.bin"
+
+def write_sections(path, sections):
+    '''Function to write typed arrays to a cache file, every array starts on an 8 byte boundary'''
+    offset = HEADER.size + SECTION.size * len(sections)
+    entries = []
+    for values in sections:
+        offset += -offset % 8
+        entries.append(SECTION.pack(values.typecode.encode(), offset, len(values) * values.itemsize))
+        offset += len(values) * values.itemsize
+    # Write a temporary file and rename it, so that readers never see a partial file
+    temp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        with open(temp_path, "wb") as cache_file:
+            cache_file.write(HEADER.pack(CACHE_MAGIC, CACHE_FORMAT, len(sections)))
+            cache_file.write(b"".join(entries))
+            for values in sections:
+                cache_file.write(bytes(-cache_file.tell() % 8))
+                values.tofile(cache_file)
+        os.replace(temp_path, path)
+    except BaseException:
+        # Don't leave the partial file behind, like after a full disk
+        temp_path.unlink(missing_ok=True)
+        raise
+
+def read_sections(path):
+    '''Function to memory-map a cache file and copy out its typed arrays, returns None if the file is invalid'''
+    try:
+        with open(path, "rb") as cache_file, \
+             mmap.mmap(cache_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            magic, file_format, count = HEADER.unpack_from(mapped)
+            if magic != CACHE_MAGIC or file_format != CACHE_FORMAT:
+                return None
+            sections = []
+            with memoryview(mapped) as view:
+                for number in range(count):
+                    typecode, offset, size = SECTION.unpack_from(mapped, HEADER.size + SECTION.size * number)
+                    values = array(typecode.rstrip(b"\0").decode())
+                    if offset + size > len(mapped) or size % values.itemsize:
+                        return None
+                    values.frombytes(view[offset:offset+size])
+                    sections.append(values)
+            return sections
+    except (OSError, ValueError, struct.error):
+        return None
+
+def encode_strings(strings):
+    '''Function to pack strings into a byte array, one string per line'''
+    return array("B", "\n".join(strings).encode())
+
+def decode_strings(values):
+    '''Function to unpack the strings packed by encode_strings'''
+    if len(values) == 0:
+        return []
+    return values.tobytes().decode().split("\n")
+
+def graph_sections(graph):
+    '''Function to get the typed arrays of a timing graph'''
+    return [encode_strings(graph.names), encode_strings(graph.type_names), graph.node_type,
+            graph.fanin_offsets, graph.fanin_index, graph.fanout_offsets, graph.fanout_index]
+
+def graph_from_sections(sections):
+    '''Function to build a timing graph from the typed arrays of graph_sections'''
+    graph = TimingGraph()
+    names, type_names, graph.node_type, graph.fanin_offsets, graph.fanin_index, \
+        graph.fanout_offsets, graph.fanout_index = sections
+    graph.names = decode_strings(names)
+    graph.ids = {name: node for node, name in enumerate(graph.names)}
+    graph.type_names = decode_strings(type_names)
+    graph.type_codes = {name: code for code, name in enumerate(graph.type_names)}
+    return graph
+
+def library_sections(std_cell):
+    '''Function to get the typed arrays of a standard cell library'''
+    # Cells are stored once, names like NOT and BUFF point to the cell they alias
+    cells = []
+    for cell in std_cell.values():
+        if cell not in cells:
+            cells.append(cell)
+    cell_index = array("i", [cells.index(cell) for cell in std_cell.values()])
+    shapes = array("i")
+    values = array("d")
+    for cell in cells:
+        shapes.extend([len(cell.input_slew), len(cell.output_load)])
+        values.append(cell.input_capacitance)
+        values.extend(cell.input_slew)
+        values.extend(cell.output_load)
+        for row in cell.delay:
+            values.extend(row)
+        for row in cell.slew:
+            values.extend(row)
+    strings = list(std_cell) + [name for cell in cells for name in (cell.cell_name, cell.gate_type)]
+    return [encode_strings(strings), cell_index, shapes, values]
+
+def library_from_sections(sections):
+    '''Function to build a standard cell library from the typed arrays of library_sections'''
+    strings, cell_index, shapes, values = sections
+    strings = decode_strings(strings)
+    names = strings[:len(cell_index)]
+    cells = []
+    position = 0
+    for number in range(len(shapes) // 2):
+        rows = shapes[2*number]
+        columns = shapes[2*number+1]
+        cell = main_parser.Lib()
+        cell.cell_name = strings[len(names) + 2*number]
+        cell.gate_type = strings[len(names) + 2*number + 1]
+        cell.input_capacitance = values[position]
+        position += 1
+        cell.input_slew = values[position:position+rows].tolist()
+        position += rows
+        cell.output_load = values[position:position+columns].tolist()
+        position += columns
+        for table in (cell.delay, cell.slew):
+            for _ in range(rows):
+                table.append(values[position:position+columns].tolist())
+                position += columns
+        cell.table = NLDMTable.from_cell(cell)
+        cells.append(cell)
+    return {name: cells[index] for name, index in zip(names, cell_index)}
+
+def evict(cache_dir=CACHE_DIR, size_limit=CACHE_SIZE_LIMIT):
+    '''Function to delete the least recently used cache files until the cache fits in its size limit'''
+    entries = []
+    for path in Path(cache_dir).glob("*.bin"):
+        try:
+            status = path.stat()
+        except OSError:
+            continue
+        entries.append((status.st_mtime, status.st_size, path))
+    entries.sort()
+    total_size = sum(entry[1] for entry in entries)
+    # Keep the most recent file even if it alone is over the limit
+    for _, size, path in entries[:-1]:
+        if total_size <= size_limit:
+            break
+        path.unlink(missing_ok=True)
+        total_size -= size
+
+def cached(path, kind, parse, to_sections, from_sections, cache_dir, rebuild, stats=None):
+    '''Function to load the parsed form of a source file from the cache, parsing and storing it on a miss'''
+    cache_file = cache_path(path, kind, cache_dir)
+    if not rebuild and cache_file.exists():
+        sections = read_sections(cache_file)
+        if sections is not None:
+            # Mark the file as recently used, a read-only cache is still read
+            try:
+                os.utime(cache_file)
+            except OSError:
+                pass
+            if stats is not None:
+                stats.count("cache_hits")
+            return from_sections(sections)
+    if stats is not None:
+        stats.count("cache_misses")
+    result = parse(path)
+    # The cache only saves time, a cache directory that can't be written doesn't stop the run
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        write_sections(cache_file, to_sections(result))
+        evict(cache_dir)
+    except OSError:
+        if stats is not None:
+            stats.count("cache_write_errors")
+    return result
+
+def read_graph(path, cache=True, rebuild=False, cache_dir=CACHE_DIR, output_dir=main_parser.OUTPUT_DIR, stats=None,
+               details=False):
+    '''Function to read a netlist into a timing graph, through the cache unless it is disabled
+
+    Writing the details of the netlist needs the netlist to be parsed, so the
+    cache is refreshed instead of read.'''
+    def parse(path):
+        return TimingGraph.from_netlist(main_parser.read_ckt(path, output_dir, stats, details))
+    if not cache:
+        return parse(path)
+    return cached(path, "ckt", parse, graph_sections, graph_from_sections, cache_dir, rebuild or details, stats)
+
+def read_library(path, cache=True, rebuild=False, cache_dir=CACHE_DIR, stats=None):
+    '''Function to read a .lib file into standard cells, through the cache unless it is disabled'''
+    def parse(path):
+        return main_parser.read_nldm(path, stats=stats)
+    if not cache:
+        return parse(path)
+    return cached(path, "lib", parse, library_sections, library_from_sections, cache_dir, rebuild, stats)
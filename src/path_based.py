@@ -0,0 +1,179 @@
+'''Path-based re-analysis of timing paths, every path re-timed with the slews of its own pins'''
+import itertools
+import time
+import numpy as np
+from nldm_table import stack_tables
+from path_search import TimingPath
+
+# Paths re-timed together in one batch
+PBA_BATCH = 4096
+
+class PathBasedAnalysis:
+    '''Path-based re-timing of the paths of a timed STA object
+
+    Graph-based propagation gives every node the slew of its first input with the
+    latest arrival time, whichever path goes through it. A path re-timed on its own
+    propagates the slews of its own pins from its primary input, the delay of every
+    stage is looked up with the output slew of the stage before it at the output
+    load of the gate, scaled by 'number of inputs / 2' beyond 2 inputs as in the
+    graph. The slew of the latest input isn't always the largest one, so the
+    path-based slack can be larger or smaller than the graph-based one. A path
+    that takes the latest input at every gate gets the graph-based values.
+
+    Paths are re-timed in batches, the table columns of all the stages of a batch
+    are bracketed at once, as the output loads are fixed, then stage k of all the
+    paths of the batch is looked up at once.'''
+    def __init__(self, sta):
+        self.sta = sta              # Timed analysis whose graph, loads and timing state are used
+        self.graph = None           # Timing graph the compiled tables belong to
+        self.loads = None           # Loads the compiled values belong to
+        self.output_load = None     # Output capacitance of all the nodes
+        self.slew_index = None      # Input slew indexes of all the lookup tables, flattened
+        self.slew_bounds = None     # Input slew bracketing bounds of every lookup table
+        self.load_index = None      # Output load indexes of every lookup table
+        self.load_bounds = None     # Output load bracketing bounds of every lookup table
+        self.grid = None            # Delay and slew values of all the lookup tables, flattened
+        self.rows = 0               # Input slew indexes of a lookup table, padding included
+        self.columns = 0            # Output load indexes of a lookup table, padding included
+        self.is_gate = None         # Whether every node is a logical gate
+        self.derate = None          # Delay and slew scaling of every node, 'number of inputs / 2' beyond 2 inputs
+        self.paths_per_second = 0.0 # Throughput of the last re-timing
+
+    def compile_tables(self):
+        '''Function to stack the lookup tables of all the gate type codes, and compile the loads and derates of the nodes'''
+        sta = self.sta
+        if sta.loads is None:
+            sta.annotate_loads()
+        graph = sta.graph
+        self.graph = graph
+        self.loads = sta.loads
+        self.output_load = np.frombuffer(sta.loads, dtype=np.float64)
+        input_slew, load_index, row_count, column_count, grid = stack_tables(
+            [None if cell is None else cell.table for cell in sta.cells])
+        self.rows = input_slew.shape[1]
+        self.columns = load_index.shape[1]
+        self.slew_index = input_slew.reshape(-1)
+        self.load_index = load_index
+        self.grid = grid.reshape(-1)
+        # Bracketing counts the indexes at or below a value, beyond the first and the
+        # second to last index the first and last 2 rows or columns are used
+        self.slew_bounds = input_slew[:, :-1].copy()
+        self.load_bounds = load_index[:, :-1].copy()
+        self.slew_bounds[:, 0] = -np.inf
+        self.load_bounds[:, 0] = -np.inf
+        self.slew_bounds[np.arange(self.rows - 1) >= row_count[:, None] - 1] = np.inf
+        self.load_bounds[np.arange(self.columns - 1) >= column_count[:, None] - 1] = np.inf
+        node_type = np.frombuffer(graph.node_type, dtype=np.uint8)
+        self.is_gate = np.array([cell is not None for cell in sta.cells])[node_type]
+        num_fanins = np.diff(np.frombuffer(graph.fanin_offsets, dtype=np.int32))
+        self.derate = np.where(num_fanins > 2, num_fanins / 2, 1.0)
+
+    def retime_path(self, path):
+        '''Function to re-time one path with the slews of its own pins, one lookup at a time'''
+        sta = self.sta
+        graph = sta.graph
+        if sta.loads is None:
+            sta.annotate_loads()
+        nodes = path.nodes
+        slew = sta.output_slew[nodes[0]]
+        stage_delay = [0.0]
+        arrival = [sta.max_output_arrival[nodes[0]]]
+        for node in nodes[1:]:
+            cell = sta.cells[graph.node_type[node]]
+            delay = 0.0
+            # Output ports pass the arrival time and slew of their net on
+            if cell is not None:
+                delay, slew = cell.table.lookup(slew, sta.loads[node])
+                # If the node has more than 2 inputs, multiply delay and slew with 'number of inputs / 2'
+                num_fanins = graph.fanin_offsets[node+1] - graph.fanin_offsets[node]
+                if num_fanins > 2:
+                    delay *= num_fanins/2
+                    slew *= num_fanins/2
+            stage_delay.append(delay)
+            arrival.append(arrival[-1] + delay)
+        return TimingPath(list(nodes), stage_delay, arrival, sta.back_traversal_arrival[nodes[-1]] - arrival[-1])
+
+    def retime_batch(self, paths):
+        '''Function to re-time a batch of paths with the slews of their own pins, a stage of all the paths at a time'''
+        sta = self.sta
+        node_type = np.frombuffer(self.graph.node_type, dtype=np.uint8)
+        lengths = np.array([len(path.nodes) for path in paths])
+        width = int(lengths.max())
+        # Nodes of the paths as one column per path, stage by stage, padded with the last node
+        path_of = np.repeat(np.arange(len(paths)), lengths)
+        stage_of = np.arange(len(path_of)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        path_nodes = np.fromiter(itertools.chain.from_iterable(path.nodes for path in paths), dtype=np.int64,
+                                 count=len(path_of))
+        nodes = np.empty((width, len(paths)), dtype=np.int64)
+        nodes[:] = path_nodes[np.cumsum(lengths) - 1]
+        nodes[stage_of, path_of] = path_nodes
+        gates = self.is_gate[nodes] & (np.arange(width)[:, None] < lengths)
+        # The output load of a gate is fixed, so are its columns of the lookup tables
+        tables = node_type[nodes].astype(np.int64)
+        load = self.output_load[nodes]
+        column1 = (self.load_bounds[tables] <= load[..., None]).sum(axis=2) - 1
+        c1 = self.load_index[tables, column1]
+        c2 = self.load_index[tables, column1 + 1]
+        # Output ports and the padding have no tables, their values are masked out
+        with np.errstate(invalid="ignore"):
+            w_c2 = c2 - load
+            w_c1 = load - c1
+            column_span = c2 - c1
+        grid_base = (tables * self.rows * self.columns + column1) * 2
+        slew_base = tables * self.rows
+        derate = self.derate[nodes]
+        slew_index = self.slew_index
+        slew_bounds = self.slew_bounds
+        grid = self.grid
+        row_stride = 2 * self.columns
+        # Paths start with the slew and arrival time of their primary input
+        slew = np.frombuffer(sta.output_slew, dtype=np.float64)[nodes[0]].copy()
+        stage_delay = np.zeros((width, len(paths)))
+        arrival = np.zeros((width, len(paths)))
+        arrival[0] = np.frombuffer(sta.max_output_arrival, dtype=np.float64)[nodes[0]]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            for stage in range(1, width):
+                gate = gates[stage]
+                # Bracket the input slews, and 2D-interpolate delay and slew together
+                row1 = (slew_bounds[tables[stage]] <= slew[:, None]).sum(axis=1) - 1
+                t1 = slew_index[slew_base[stage] + row1]
+                t2 = slew_index[slew_base[stage] + row1 + 1]
+                w_t2 = t2 - slew
+                w_t1 = slew - t1
+                stage_w_c2 = w_c2[stage]
+                stage_w_c1 = w_c1[stage]
+                denominator = column_span[stage] * (t2 - t1)
+                v11 = grid_base[stage] + row1 * row_stride
+                v21 = v11 + row_stride
+                delay = (grid[v11]*stage_w_c2*w_t2 + grid[v11+2]*stage_w_c1*w_t2
+                         + grid[v21]*stage_w_c2*w_t1 + grid[v21+2]*stage_w_c1*w_t1)/denominator
+                output_slew = (grid[v11+1]*stage_w_c2*w_t2 + grid[v11+3]*stage_w_c1*w_t2
+                               + grid[v21+1]*stage_w_c2*w_t1 + grid[v21+3]*stage_w_c1*w_t1)/denominator
+                # Output ports and the padding pass the arrival time and slew on
+                stage_delay[stage] = np.where(gate, delay * derate[stage], 0.0)
+                slew = np.where(gate, output_slew * derate[stage], slew)
+                arrival[stage] = arrival[stage - 1] + stage_delay[stage]
+        # Slack of every path at its endpoint
+        last = (lengths - 1, np.arange(len(paths)))
+        slack = np.frombuffer(sta.back_traversal_arrival, dtype=np.float64)[nodes[last]] - arrival[last]
+        # Stage delays and arrival times of every path are a row of one array
+        stage_delay = np.ascontiguousarray(stage_delay.T)
+        arrival = np.ascontiguousarray(arrival.T)
+        return [TimingPath(path.nodes, stage_delay[row, :length], arrival[row, :length], path_slack)
+                for row, (path, length, path_slack) in enumerate(zip(paths, lengths.tolist(), slack.tolist()))]
+
+    def retime(self, paths, batch=PBA_BATCH):
+        '''Function to re-time paths with the slews of their own pins, a batch of paths at a time
+
+        Returns the re-timed paths in the order of the given ones, their stage
+        delays and arrival times are NumPy arrays.'''
+        start_time = time.perf_counter()
+        # Compile the tables again if the netlist or the loads were edited
+        if self.graph is not self.sta.graph or self.loads is None or self.loads is not self.sta.loads:
+            self.compile_tables()
+        retimed = []
+        for first in range(0, len(paths), batch):
+            retimed.extend(self.retime_batch(paths[first:first + batch]))
+        elapsed = time.perf_counter() - start_time
+        self.paths_per_second = len(paths) / elapsed if elapsed > 0 else 0.0
+        return retimed
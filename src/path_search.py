@@ -0,0 +1,119 @@
+'''Enumeration of the worst timing paths of a timed netlist'''
+import heapq
+
+class TimingPath:
+    '''Timing path from a primary input to an endpoint'''
+    __slots__ = ("nodes", "stage_delay", "arrival", "slack")
+
+    def __init__(self, nodes, stage_delay, arrival, slack):
+        self.nodes = nodes              # Nodes of the path, from the primary input to the endpoint
+        self.stage_delay = stage_delay  # Delay of the arc into every node, 0 for the primary input
+        self.arrival = arrival          # Arrival time of the path at every node
+        self.slack = slack              # Slack of the path at its endpoint
+
+    @property
+    def delay(self):
+        '''Function to get the delay of the path'''
+        return self.arrival[-1]
+
+class PathSearch:
+    '''Search of the worst paths of a netlist, from the arrival times and cell delays of a timed STA object
+
+    The worst path into a node follows the fan-in arc with the latest arrival time,
+    which is the maximum output arrival time of the forward traversal. Paths are
+    enumerated in order of decreasing delay by deviating from worst paths: when a
+    path is found, every arc it could have taken instead is queued with the delay
+    of the worst path through it, so K paths take K queue pops.'''
+    def __init__(self, sta):
+        self.sta = sta
+        self.worst_edges = {}   # Fan-in arc with the latest arrival time of every visited node
+
+    def worst_edge(self, node):
+        '''Function to get the fan-in arc with the latest arrival time of a node, None for primary inputs'''
+        edge = self.worst_edges.get(node, -1)
+        if edge != -1:
+            return edge
+        graph = self.sta.graph
+        arrival = self.sta.max_output_arrival
+        cell_delay = self.sta.cell_delay
+        edge = None
+        latest = 0.0
+        # The first input with the latest arrival time wins, as in the forward traversal
+        for fanin_edge in range(graph.fanin_offsets[node], graph.fanin_offsets[node+1]):
+            path_arrival = cell_delay[fanin_edge] + arrival[graph.fanin_index[fanin_edge]]
+            if edge is None or path_arrival > latest:
+                edge = fanin_edge
+                latest = path_arrival
+        self.worst_edges[node] = edge
+        return edge
+
+    def endpoints(self):
+        '''Function to get the endpoints of the netlist, the nodes without fan-outs'''
+        return [node for node in range(len(self.sta.graph)) if self.sta.out_degree[node] == 0]
+
+    def build_path(self, endpoint, edges):
+        '''Function to build a timing path from its fan-in arcs, listed from the primary input'''
+        graph = self.sta.graph
+        cell_delay = self.sta.cell_delay
+        start = graph.fanin_index[edges[0]] if edges else endpoint
+        nodes = [start]
+        stage_delay = [0.0]
+        arrival = [self.sta.max_output_arrival[start]]
+        for number, edge in enumerate(edges):
+            # The arc leads to the source of the next arc, the last arc to the endpoint
+            nodes.append(graph.fanin_index[edges[number+1]] if number + 1 < len(edges) else endpoint)
+            stage_delay.append(cell_delay[edge])
+            arrival.append(arrival[-1] + cell_delay[edge])
+        slack = self.sta.back_traversal_arrival[endpoint] - arrival[-1]
+        return TimingPath(nodes, stage_delay, arrival, slack)
+
+    def worst_paths(self, count):
+        '''Function to get the given number of paths with the largest delays, worst first'''
+        graph = self.sta.graph
+        fanin_index = graph.fanin_index
+        fanin_offsets = graph.fanin_offsets
+        arrival = self.sta.max_output_arrival
+        cell_delay = self.sta.cell_delay
+        # Queue entries are the negative path delay, an insertion counter for ties, the
+        # endpoint, the node the path deviates into, the delay from that node to the
+        # endpoint, and the arcs from that node to the endpoint as a linked list
+        queue = [(-arrival[node], number, node, node, 0.0, None) for number, node in enumerate(self.endpoints())]
+        heapq.heapify(queue)
+        counter = len(queue)
+        paths = []
+        while queue and len(paths) < count:
+            _, _, endpoint, node, suffix_delay, suffix = heapq.heappop(queue)
+            # Complete the path with the worst path into the node, queueing the deviations on the way
+            while True:
+                worst = self.worst_edge(node)
+                if worst is None:
+                    break
+                for edge in range(fanin_offsets[node], fanin_offsets[node+1]):
+                    if edge != worst:
+                        path_delay = cell_delay[edge] + arrival[fanin_index[edge]] + suffix_delay
+                        heapq.heappush(queue, (-path_delay, counter, endpoint, fanin_index[edge],
+                                               suffix_delay + cell_delay[edge], (edge, suffix)))
+                        counter += 1
+                suffix_delay += cell_delay[worst]
+                suffix = (worst, suffix)
+                node = fanin_index[worst]
+            # Unlink the arcs, the first one leaves the primary input
+            edges = []
+            while suffix is not None:
+                edges.append(suffix[0])
+                suffix = suffix[1]
+            paths.append(self.build_path(endpoint, edges))
+        return paths
+
+    def endpoint_paths(self):
+        '''Function to get the worst path into every endpoint, in netlist order'''
+        paths = []
+        for endpoint in self.endpoints():
+            edges = []
+            node = endpoint
+            while self.worst_edge(node) is not None:
+                edges.append(self.worst_edge(node))
+                node = self.sta.graph.fanin_index[edges[-1]]
+            edges.reverse()
+            paths.append(self.build_path(endpoint, edges))
+        return paths
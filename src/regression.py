@@ -0,0 +1,378 @@
+'''Benchmark and golden regression suite over the .bench files and engines, with the time of every phase and feature checks'''
+import argparse
+import json
+import os
+from pathlib import Path
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from benchmark import random_edit
+from early_late import EarlyLateSTA
+import main_parser
+from main_sta import STA
+from nldm_table import ArcCache
+import parse_cache
+from path_based import PathBasedAnalysis
+from path_search import PathSearch
+import report
+from slack_query import SlackQuery
+
+# Directory containing the .bench files
+BENCH_DIR = '../bench'
+
+# Path to the NLDM library file
+NLDM_LIB_PATH = '../sample_NLDM.lib'
+
+# Directory of the golden reports, one sub-folder per design
+GOLDEN_DIR = '../output'
+
+# Stored timings the suite is compared against
+BASELINE_PATH = '../benchmark_baseline.json'
+
+# Phases of the analysis, in the order they run
+PHASES = ("read_nldm", "read_ckt", "forward_traversal", "backward_traversal", "critical_path")
+
+# Engines the designs are timed and compared with, 'arc_cache' is STA with a memo of the arc
+# lookups, 'warm_cache' STA on the library and netlist loaded from a warm parse cache
+ENGINES = ("scalar", "vectorized", "parallel", "arc_cache", "warm_cache")
+
+# Processes of the parallel engine, designs of every size are split across them
+PARALLEL_PROCESSES = 2
+
+# Worst paths re-timed by the path search and path-based checks
+CHECK_PATHS = 20
+
+# Random netlist edits re-timed incrementally by the ECO check
+CHECK_EDITS = 10
+
+# Nets whose slacks are queried by the slack query check
+CHECK_QUERIES = 10
+
+# Slowdown over the baseline, relative, that is flagged as a regression
+REGRESSION_THRESHOLD = 0.25
+
+# Slowdown, in seconds, below which a phase is never flagged, timer noise of the smallest designs
+REGRESSION_FLOOR = 0.002
+
+def time_phase(function, repeat, warmup):
+    '''Function to time a function over warm-up and measured runs, returns the statistics in seconds'''
+    for _ in range(warmup):
+        function()
+    times = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start_time)
+    return {
+        "min": min(times),
+        "median": statistics.median(times),
+        "mean": statistics.mean(times),
+        "stdev": statistics.stdev(times) if len(times) > 1 else 0.0,
+    }
+
+def make_sta(engine, std_cell, netlist, output_dir):
+    '''Function to create the analysis of an engine, parallel analyses have to be closed'''
+    if engine == "vectorized":
+        # Import NumPy only for the vectorized engine
+        from vector_sta import VectorSTA
+        return VectorSTA(std_cell, netlist, output_dir)
+    if engine == "parallel":
+        from parallel_sta import ParallelSTA
+        return ParallelSTA(std_cell, netlist, output_dir, processes=PARALLEL_PROCESSES, min_nodes=0)
+    sta = STA(std_cell, netlist, output_dir)
+    if engine == "arc_cache":
+        sta.arc_cache = ArcCache()
+    return sta
+
+def read_cells(engine, nldm_path, cache_dir):
+    '''Function to read the library the way an engine does, through the parse cache for warm_cache'''
+    if engine == "warm_cache":
+        return parse_cache.read_library(nldm_path, cache_dir=cache_dir)
+    return main_parser.read_nldm(nldm_path)
+
+def read_design(engine, bench_path, output_dir, cache_dir):
+    '''Function to read a netlist the way an engine does, through the parse cache for warm_cache'''
+    if engine == "warm_cache":
+        return parse_cache.read_graph(bench_path, cache_dir=cache_dir, output_dir=output_dir)
+    return main_parser.read_ckt(bench_path, output_dir)
+
+def peak_memory(engine, bench_path, nldm_path, output_dir, cache_dir):
+    '''Function to get the peak memory allocated by one full analysis of a design with an engine'''
+    tracemalloc.start()
+    std_cell = read_cells(engine, nldm_path, cache_dir)
+    sta = make_sta(engine, std_cell, read_design(engine, bench_path, output_dir, cache_dir), output_dir)
+    try:
+        sta.execute()
+    finally:
+        if engine == "parallel":
+            sta.close()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+def golden_lines(path):
+    '''Function to read the circuit delay and slack lines of a report, the ones before the critical path'''
+    lines = []
+    with open(path, encoding="utf-8") as report:
+        for line in report:
+            # The critical path of the golden reports broke ties at random, it is not compared
+            if line.startswith("Critical"):
+                break
+            if line.strip():
+                lines.append(line.rstrip("\n"))
+    return lines
+
+def compare_golden(sta, golden_path):
+    '''Function to compare the delays and slacks of a timed design with its golden report
+
+    Returns the number of lines that differ and the first difference.'''
+    sta.report_slacks()
+    lines = golden_lines(os.path.join(sta.output_dir, "ckt_traversal.txt"))
+    expected = golden_lines(golden_path)
+    differences = [(want, got) for want, got in zip(expected, lines) if want != got]
+    differences += [(want, None) for want in expected[len(lines):]]
+    differences += [(None, got) for got in lines[len(expected):]]
+    return len(differences), differences[0] if differences else None
+
+def run_design(std_cell, bench_path, output_dir, repeat, warmup, engine="scalar", cache_dir=None):
+    '''Function to time every phase of one design with an engine and compare it with its golden report'''
+    result = {}
+    if engine == "warm_cache":
+        # Fill the cache, the timed reads load it
+        read_design(engine, bench_path, output_dir, cache_dir)
+    result["read_ckt"] = time_phase(lambda: read_design(engine, bench_path, output_dir, cache_dir), repeat, warmup)
+    sta = make_sta(engine, std_cell, read_design(engine, bench_path, output_dir, cache_dir), output_dir)
+    try:
+        result["forward_traversal"] = time_phase(sta.forward_traversal, repeat, warmup)
+        result["backward_traversal"] = time_phase(sta.backward_traversal, repeat, warmup)
+        result["critical_path"] = time_phase(sta.critical_path, repeat, warmup)
+        result["nodes"] = len(sta.graph)
+        golden_path = os.path.join(GOLDEN_DIR, bench_path.stem, "ckt_traversal.txt")
+        if os.path.isfile(golden_path):
+            result["golden_differences"], result["first_difference"] = compare_golden(sta, golden_path)
+    finally:
+        if engine == "parallel":
+            sta.close()
+    return result
+
+def check_report_round_trip(sta, output_dir):
+    '''Function to check that the text report report.py writes from the binary report is the text report
+
+    Returns True if the reports are the same.'''
+    sta.find_critical_path()
+    report_dir = sta.output_dir
+    sta.output_dir = os.path.join(output_dir, "text")
+    try:
+        sta.write_reports(["text", "binary"])
+    finally:
+        sta.output_dir = report_dir
+    columns = report.TimingColumns(os.path.join(output_dir, "text", report.BINARY_REPORT))
+    try:
+        columns.write_text(os.path.join(output_dir, "converted"))
+    finally:
+        columns.close()
+    with open(os.path.join(output_dir, "text", report.TEXT_REPORT), encoding="utf-8") as text_report, \
+         open(os.path.join(output_dir, "converted", report.TEXT_REPORT), encoding="utf-8") as converted_report:
+        return text_report.read() == converted_report.read()
+
+def check_features(std_cell, bench_path, output_dir):
+    '''Function to check path search, path-based analysis, slack queries and ECO re-timing against full analyses
+
+    Returns the failed checks. The values are compared exactly, each feature
+    gives the values of a full analysis, or of the scalar re-timing for the
+    batched path-based one. Text reports converted from the binary reports of
+    the scalar and the early/late analyses are compared with their text reports.'''
+    design = bench_path.stem
+    failures = []
+    sta = STA(std_cell, main_parser.read_ckt(bench_path, output_dir), output_dir)
+    sta.forward_traversal()
+    sta.backward_traversal()
+    graph = sta.graph
+    # The binary report turns into the text report, with the hold slacks of the early/late analysis
+    early_late = EarlyLateSTA(std_cell, graph, output_dir)
+    early_late.forward_traversal()
+    early_late.backward_traversal()
+    for name, analysis in (("scalar", sta), ("early/late", early_late)):
+        if not check_report_round_trip(analysis, os.path.join(output_dir, "round_trip")):
+            failures.append(f"{design}: text report of the {name} binary report differs from its text report")
+    # Worst paths come in order of decreasing delay, the worst one ends at the latest endpoint,
+    # and the worst path into an endpoint has its arrival time and slack
+    search = PathSearch(sta)
+    paths = search.worst_paths(CHECK_PATHS)
+    endpoints = search.endpoints()
+    if any(path.delay < next_path.delay for path, next_path in zip(paths, paths[1:])):
+        failures.append(f"{design}: worst paths are not in order of decreasing delay")
+    if paths and paths[0].delay != max(sta.max_output_arrival[node] for node in endpoints):
+        failures.append(f"{design}: worst path delay {paths[0].delay!r} isn't the latest arrival time")
+    for path in search.endpoint_paths():
+        endpoint = path.nodes[-1]
+        if path.delay != sta.max_output_arrival[endpoint] or path.slack != sta.slack[endpoint]:
+            failures.append(f"{design}: worst path into {graph.label(endpoint)} has delay {path.delay!r} "
+                            f"and slack {path.slack!r}, expected {sta.max_output_arrival[endpoint]!r} "
+                            f"and {sta.slack[endpoint]!r}")
+            break
+    # Batched path-based re-timing gives the values of one path at a time
+    analysis = PathBasedAnalysis(sta)
+    for path, batched in zip(paths, analysis.retime(paths)):
+        scalar = analysis.retime_path(path)
+        if list(batched.arrival) != scalar.arrival or batched.slack != scalar.slack:
+            failures.append(f"{design}: path-based re-timing of the path to {graph.label(path.nodes[-1])} "
+                            f"differs between batched and one at a time")
+            break
+    # Slack queries time cones of a fresh analysis, output ports and gates spread over the netlist
+    step = max(len(graph) // CHECK_QUERIES, 1)
+    nets = [graph.names[node] for node in list(sta.output_ports)[:CHECK_QUERIES] + list(range(0, len(graph), step))]
+    slacks = SlackQuery(STA(std_cell, graph, output_dir)).slacks(nets)
+    for net in nets:
+        if slacks[net] != sta.slack[graph.ids[net]]:
+            failures.append(f"{design}: slack query of {net} gives {slacks[net]!r}, "
+                            f"expected {sta.slack[graph.ids[net]]!r}")
+            break
+    # Random edits re-timed incrementally give the values of a full analysis of the edited netlist
+    rng = random.Random(0)
+    for _ in range(CHECK_EDITS):
+        random_edit(sta, rng)
+        sta.update_timing()
+    full_sta = STA(std_cell, sta.graph, output_dir)
+    full_sta.forward_traversal()
+    full_sta.backward_traversal()
+    if (sta.total_circuit_delay != full_sta.total_circuit_delay or sta.max_output_arrival != full_sta.max_output_arrival
+            or sta.slack != full_sta.slack):
+        failures.append(f"{design}: incremental re-timing after {CHECK_EDITS} edits differs from a full analysis")
+    return failures
+
+def find_regressions(results, baseline, threshold):
+    '''Function to list the phases and peak memories that are worse than the baseline beyond the threshold'''
+    regressions = []
+    # Runs are the library and every design with every engine, '<design>/<engine>'
+    for run, result in results.items():
+        if run not in baseline:
+            continue
+        for phase in PHASES + ("read_nldm_warm",):
+            if phase not in result or phase not in baseline[run]:
+                continue
+            # Medians are compared, they are the least disturbed by the other load of the machine
+            now = result[phase]["median"]
+            before = baseline[run][phase]["median"]
+            if now > before * (1 + threshold) and now - before > REGRESSION_FLOOR:
+                regressions.append(f"{run} {phase}: {before*1000:.2f} ms -> {now*1000:.2f} ms")
+        if "peak_memory" in result and "peak_memory" in baseline[run]:
+            now = result["peak_memory"]
+            before = baseline[run]["peak_memory"]
+            if now > before * (1 + threshold):
+                regressions.append(f"{run} peak memory: {before/1024:.0f} KiB -> {now/1024:.0f} KiB")
+    return regressions
+
+def print_summary(results):
+    '''Function to print the median time of every phase and the golden comparison of every design and engine'''
+    library = results.pop("library")
+    for phase in ("read_nldm", "read_nldm_warm"):
+        if phase in library:
+            print(f"{phase}: median {library[phase]['median']*1000:.2f} ms, "
+                  f"stdev {library[phase]['stdev']*1000:.2f} ms")
+    print(f"\n{'design':<20} {'nodes':>7} {'read_ckt':>9} {'forward':>9} {'backward':>9} {'critical':>9} "
+          f"{'peak KiB':>9}  golden")
+    for run in sorted(results):
+        result = results[run]
+        times = " ".join(f"{result[phase]['median']*1000:>9.2f}" for phase in PHASES[1:])
+        if "golden_differences" not in result:
+            golden = "missing"
+        elif result["golden_differences"]:
+            golden = f"{result['golden_differences']} lines differ"
+        else:
+            golden = "ok"
+        print(f"{run:<20} {result['nodes']:>7} {times} {result['peak_memory']/1024:>9.0f}  {golden}")
+    print("\nMedian times in ms, runs are named <design>/<engine>")
+    results["library"] = library
+
+def parse_arguments():
+    '''Function to parse command line arguments'''
+    parser = argparse.ArgumentParser()
+    # Argument to read .lib files
+    parser.add_argument("--read_nldm", action = "store", default = NLDM_LIB_PATH, help = "Reads .lib files.")
+    # Arguments for the designs
+    parser.add_argument("--bench_dir", action = "store", default = BENCH_DIR, help = "Folder of the .bench files.")
+    parser.add_argument("--designs", nargs = "*", help = "Designs in the bench folder to run.")
+    # Arguments for the engines and the feature checks
+    parser.add_argument("--engine", nargs = "+", choices = ENGINES, default = list(ENGINES),
+                        help = "Engines the designs are timed and compared with, all of them by default.")
+    parser.add_argument("--no_checks", action = "store_true",
+                        help = "Skips the path search, path-based, slack query and ECO checks.")
+    # Arguments for the measurements
+    parser.add_argument("--repeat", action = "store", type = int, default = 5, help = "Measured runs of every phase.")
+    parser.add_argument("--warmup", action = "store", type = int, default = 1, help = "Runs of every phase before measuring.")
+    # Arguments for the baseline
+    parser.add_argument("--baseline", action = "store", default = BASELINE_PATH, help = "Stored timings to compare against.")
+    parser.add_argument("--save_baseline", action = "store_true", help = "Stores the timings of this run as the baseline.")
+    parser.add_argument("--threshold", action = "store", type = float, default = REGRESSION_THRESHOLD,
+                        help = "Relative slowdown over the baseline that is flagged as a regression.")
+    args = parser.parse_args()
+    return args
+
+def main():
+    '''Main function of regression.py'''
+    # Parse command line arguments
+    inputs = parse_arguments()
+    nldm_path = Path(inputs.read_nldm)
+    bench_paths = sorted(Path(inputs.bench_dir).glob("*.bench"))
+    if inputs.designs:
+        bench_paths = [path for path in bench_paths if path.stem in inputs.designs]
+    # The library is shared by all the designs, its phase is measured once
+    results = {"library": {"read_nldm": time_phase(lambda: main_parser.read_nldm(nldm_path), inputs.repeat, inputs.warmup)}}
+    std_cell = main_parser.read_nldm(nldm_path)
+    check_failures = []
+    # Reports and the parse cache of the suite are written to scratch folders, the golden
+    # reports and the cache of the repository stay untouched
+    with tempfile.TemporaryDirectory() as output_dir, tempfile.TemporaryDirectory() as cache_dir:
+        cells = {engine: std_cell for engine in inputs.engine}
+        if "warm_cache" in inputs.engine:
+            # Fill the cache, the timed reads load it
+            read_cells("warm_cache", nldm_path, cache_dir)
+            results["library"]["read_nldm_warm"] = time_phase(lambda: read_cells("warm_cache", nldm_path, cache_dir),
+                                                              inputs.repeat, inputs.warmup)
+            cells["warm_cache"] = read_cells("warm_cache", nldm_path, cache_dir)
+        for bench_path in bench_paths:
+            for engine in inputs.engine:
+                result = run_design(cells[engine], bench_path, output_dir, inputs.repeat, inputs.warmup, engine, cache_dir)
+                # Memory is measured in a separate run, tracing slows down the timed runs
+                result["peak_memory"] = peak_memory(engine, bench_path, nldm_path, output_dir, cache_dir)
+                results[f"{bench_path.stem}/{engine}"] = result
+            if not inputs.no_checks:
+                check_failures += check_features(std_cell, bench_path, output_dir)
+    print_summary(results)
+    if not inputs.no_checks:
+        print(f"Feature checks of {len(bench_paths)} designs: {len(check_failures) or 'no'} failures")
+    failures = [f"{run}: golden report differs, expected {result['first_difference'][0]!r}, "
+                f"got {result['first_difference'][1]!r}"
+                for run, result in sorted(results.items()) if result.get("golden_differences")]
+    failures += check_failures
+    if inputs.save_baseline:
+        baseline = {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "repeat": inputs.repeat,
+            "designs": results,
+        }
+        with open(inputs.baseline, "w", encoding="utf-8") as baseline_file:
+            json.dump(baseline, baseline_file, indent=1, sort_keys=True)
+        print(f"Baseline stored in {inputs.baseline}")
+    elif os.path.isfile(inputs.baseline):
+        with open(inputs.baseline, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+        failures += find_regressions(results, baseline["designs"], inputs.threshold)
+    else:
+        print(f"No baseline in {inputs.baseline}, run with --save_baseline to store one")
+    # Any regression or golden difference fails the suite
+    if failures:
+        print("\nRegressions:")
+        for failure in failures:
+            print(failure)
+        sys.exit(1)
+    print("\nNo regressions")
+
+if __name__ == '__main__':
+    main()
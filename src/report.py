@@ -0,0 +1,192 @@
+'''Timing reports, buffered text reports and a columnar binary format that can be memory-mapped'''
+import argparse
+from array import array
+import mmap
+import os
+import struct
+from timing_graph import OUTPUT
+
+# Size of the write buffer of the reports, they are written in large blocks
+REPORT_BUFFER_SIZE = 1 << 20
+
+# Report formats, the text report and the columnar binary report
+REPORT_FORMATS = ("text", "binary")
+
+# File names of the text and the binary report
+TEXT_REPORT = "ckt_traversal.txt"
+BINARY_REPORT = "ckt_timing.bin"
+
+# Binary report header, magic, version, number of columns, number of nodes, circuit delay and required time
+BINARY_MAGIC = b"STATIMNG"
+BINARY_VERSION = 1
+BINARY_HEADER = struct.Struct("<8sIIqdd")
+
+# Entry of every column in the binary report, name, array type code, offset and number of items
+BINARY_COLUMN = struct.Struct("<16s1s7xqq")
+
+# Nodes formatted per write of the text reports
+REPORT_CHUNK = 4096
+
+def open_report(output_dir, file_name, mode="w"):
+    '''Function to open a report of the output directory for writing, with a large write buffer'''
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+    return open(os.path.join(output_dir, file_name), mode, encoding="utf-8", buffering=REPORT_BUFFER_SIZE)
+
+def write_slacks(report_file, labels, slack, order, circuit_delay):
+    '''Function to write the circuit delay and the slack of the nodes in the given order'''
+    report_file.write(f"Circuit delay: {(circuit_delay*1000):.5f} ps\n\nGate slacks:\n")
+    # Format the lines in chunks, every write call copies one block to the buffer
+    for start in range(0, len(order), REPORT_CHUNK):
+        report_file.write("".join([f"{labels[node]}: {(slack[node]*1000):.5f} ps\n"
+                                   for node in order[start:start + REPORT_CHUNK]]))
+
+def write_early_late_slacks(report_file, labels, slack, hold_slack, order, circuit_delay, shortest_path_delay):
+    '''Function to write the circuit delay, the shortest path delay and the setup and hold slack of the nodes in the given order'''
+    report_file.write(f"Circuit delay: {(circuit_delay*1000):.5f} ps\n"
+                      f"Shortest path delay: {(shortest_path_delay*1000):.5f} ps\n\nGate slacks (setup, hold):\n")
+    # Format the lines in chunks, every write call copies one block to the buffer
+    for start in range(0, len(order), REPORT_CHUNK):
+        report_file.write("".join([f"{labels[node]}: {(slack[node]*1000):.5f} ps, {(hold_slack[node]*1000):.5f} ps\n"
+                                   for node in order[start:start + REPORT_CHUNK]]))
+
+def write_critical_path(report_file, labels, path, title="Critical path"):
+    '''Function to write the critical path, after the slacks'''
+    report_file.write(f"\n{title}:\n")
+    report_file.write(",".join([labels[node] for node in path]))
+
+def graph_labels(graph):
+    '''Function to get the report label of every node of a timing graph'''
+    return [graph.label(node) for node in range(len(graph))]
+
+def write_binary(path, graph, state, order, critical_path=(), extra_columns=()):
+    '''Function to write the timing values of all the nodes as columns, that downstream tools can memory-map
+
+    The file starts with a header and a table of the columns, every column is an
+    array aligned to 8 bytes. Columns indexed by node ID are node_type, arrival,
+    slew, required and slack, with name_offsets (one more item) into the UTF-8
+    net names. type_names holds the gate type names separated by newlines, order
+    the report order of the nodes and critical_path the nodes of the critical
+    path. Extra columns are given as name, array type code and values. Output
+    ports are named '<net>-o'.'''
+    encoded = [name.encode("utf-8") for name in graph.names]
+    name_offsets = array("q", [0])
+    offset = 0
+    for name in encoded:
+        offset += len(name)
+        name_offsets.append(offset)
+    columns = [("node_type", "B", graph.node_type), ("arrival", "d", state.max_output_arrival),
+               ("slew", "d", state.output_slew), ("required", "d", state.back_traversal_arrival),
+               ("slack", "d", state.slack), ("name_offsets", "q", name_offsets), ("names", "B", b"".join(encoded)),
+               ("type_names", "B", "\n".join(graph.type_names).encode("utf-8")),
+               ("order", "i", array("i", order)), ("critical_path", "i", array("i", critical_path))]
+    columns.extend(extra_columns)
+    # Place every column after the header and the column table, aligned to 8 bytes
+    entries = []
+    offset = BINARY_HEADER.size + BINARY_COLUMN.size * len(columns)
+    for name, typecode, values in columns:
+        # Names longer than the column entry would be cut short
+        if len(name.encode("ascii")) > 16:
+            raise ValueError(f"Column name {name} is longer than 16 characters")
+        data = memoryview(values).cast("B")
+        entries.append((name, typecode, offset, len(data) // array(typecode).itemsize, data))
+        offset += -(-len(data) // 8) * 8
+    with open(path, "wb", buffering=REPORT_BUFFER_SIZE) as binary_file:
+        binary_file.write(BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, len(columns), len(graph),
+                                             state.total_circuit_delay, state.total_circuit_delay_slack))
+        for name, typecode, offset, length, _ in entries:
+            binary_file.write(BINARY_COLUMN.pack(name.encode("ascii"), typecode.encode("ascii"), offset, length))
+        for _, _, offset, _, data in entries:
+            binary_file.write(bytes(offset - binary_file.tell()))
+            binary_file.write(data)
+
+class TimingColumns:
+    '''Columns of a binary timing report, memory-mapped and read-only
+
+    Every column is a memoryview of the mapped file, typed like the array it was
+    written from, so that values are read without copying, and NumPy can wrap
+    them with numpy.asarray.'''
+    def __init__(self, path):
+        with open(path, "rb") as binary_file:
+            self.mapped = mmap.mmap(binary_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, num_columns, self.num_nodes, self.circuit_delay, self.required_time = \
+            BINARY_HEADER.unpack_from(self.mapped)
+        if magic != BINARY_MAGIC or version != BINARY_VERSION:
+            raise ValueError(f"{path} is not a version {BINARY_VERSION} binary timing report")
+        self.view = memoryview(self.mapped)    # View of the whole file, the columns are slices of it
+        self.columns = {}           # Typed view of every column by name
+        for number in range(num_columns):
+            name, typecode, offset, length = BINARY_COLUMN.unpack_from(
+                self.mapped, BINARY_HEADER.size + number * BINARY_COLUMN.size)
+            typecode = typecode.decode("ascii")
+            size = length * array(typecode).itemsize
+            self.columns[name.rstrip(b"\0").decode("ascii")] = \
+                self.view[offset:offset + size].cast(typecode)
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def names(self):
+        '''Function to get the net name of every node'''
+        names = bytes(self.columns["names"])
+        offsets = self.columns["name_offsets"]
+        return [names[offsets[node]:offsets[node+1]].decode("utf-8") for node in range(self.num_nodes)]
+
+    def labels(self):
+        '''Function to get the report label of every node, output ports are named after their net'''
+        type_names = bytes(self.columns["type_names"]).decode("utf-8").split("\n")
+        node_type = self.columns["node_type"]
+        return [f"OUTPUT-{name[:-2]}" if node_type[node] == OUTPUT else f"{type_names[node_type[node]]}-{name}"
+                for node, name in enumerate(self.names())]
+
+    def close(self):
+        '''Function to release the views and unmap the file'''
+        for view in self.columns.values():
+            view.release()
+        self.columns = {}
+        self.view.release()
+        self.mapped.close()
+
+    def write_text(self, output_dir):
+        '''Function to write the text report of the binary report
+
+        Reports of the early/late analysis, having a hold_slack column, get the
+        shortest path delay, the hold slacks and the hold critical path too.'''
+        labels = self.labels()
+        columns = self.columns
+        with open_report(output_dir, TEXT_REPORT) as report_file:
+            if "hold_slack" in columns:
+                write_early_late_slacks(report_file, labels, columns["slack"], columns["hold_slack"], columns["order"],
+                                        self.circuit_delay, columns["shortest_delay"][0])
+                write_critical_path(report_file, labels, columns["critical_path"])
+                report_file.write("\n")
+                write_critical_path(report_file, labels, columns["hold_path"], "Hold critical path")
+            else:
+                write_slacks(report_file, labels, columns["slack"], columns["order"], self.circuit_delay)
+                write_critical_path(report_file, labels, columns["critical_path"])
+
+def parse_arguments():
+    '''Function to parse command line arguments'''
+    parser = argparse.ArgumentParser()
+    # Argument for the binary report
+    parser.add_argument("binary", help = "Path of a binary timing report written by main_sta.py --report binary.")
+    # Argument for the directory of the text report
+    parser.add_argument("--output_dir", action = "store", default = None,
+                        help = "Directory the text report is written to, by default the one of the binary report.")
+    args = parser.parse_args()
+    return args
+
+def main():
+    '''Main function of report.py'''
+    # Parse command line arguments
+    inputs = parse_arguments()
+    output_dir = inputs.output_dir or os.path.dirname(os.path.abspath(inputs.binary))
+    columns = TimingColumns(inputs.binary)
+    try:
+        columns.write_text(output_dir)
+    finally:
+        columns.close()
+    print(f"{os.path.join(output_dir, TEXT_REPORT)}: {columns.num_nodes} nodes")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+'''Slack queries of a few nets or endpoints, timing only the cones they depend on'''
+from array import array
+from timing_state import required_arrival_time
+
+class SlackQuery:
+    '''Lazy slack queries on an analysis
+
+    Arrival times are calculated for the fan-in cones of the queried nodes, and
+    required arrival times for their fan-out cones, whose cell delays need the
+    fan-in cones of the fan-out cones too. Cones are taken in sorted order, by
+    the position of their nodes. Values are written to the timing state of the
+    analysis, they are the ones a full analysis gives, and are kept for the next
+    queries, so overlapping cones are timed once. The required arrival time of the
+    circuit, 1.1 times the circuit delay, needs the arrival times of all the
+    outputs, a given required time (a clock constraint) keeps queries within cones.
+    Output ports are named '<net>-o'.'''
+    def __init__(self, sta, required_time=None):
+        self.sta = sta              # Analysis whose graph, loads and timing state are used
+        self.required_time = required_time  # Required arrival time of the outputs, None for 1.1 times the circuit delay
+        self.graph = None           # Timing graph the kept values belong to
+        self.loads = None           # Loads the kept values belong to
+        self.position = None        # Position of every node in the sorted order
+        self.arrival_ready = None   # Nodes whose arrival time and slew are calculated
+        self.required_ready = None  # Nodes whose required arrival time and slack are calculated
+        self.circuit_required_time = None   # Required arrival time of the outputs, once calculated
+        self.arrivals_timed = 0     # Number of nodes whose arrival time was calculated
+        self.requireds_timed = 0    # Number of nodes whose required arrival time was calculated
+
+    def reset(self):
+        '''Function to drop the kept values, and index the sorted order of the analysis'''
+        sta = self.sta
+        if sta.level_offsets is None:
+            sta.levelize()
+        if sta.loads is None:
+            sta.annotate_loads()
+        self.graph = sta.graph
+        self.loads = sta.loads
+        self.position = array("i", bytes(4 * len(self.graph)))
+        for position, node in enumerate(sta.sorted_order):
+            self.position[node] = position
+        self.arrival_ready = bytearray(len(self.graph))
+        self.required_ready = bytearray(len(self.graph))
+        self.circuit_required_time = None
+
+    def set_required_time(self, required_time):
+        '''Function to change the required arrival time of the outputs, None for 1.1 times the circuit delay'''
+        self.required_time = required_time
+        self.circuit_required_time = None
+        if self.required_ready is not None:
+            self.required_ready = bytearray(len(self.graph))
+
+    def nodes(self, nets):
+        '''Function to get the node IDs of nets, and drop the kept values if the netlist or the loads were edited'''
+        if self.sta.graph is not self.graph or self.sta.loads is not self.loads:
+            self.reset()
+        nodes = []
+        for net in nets:
+            node = self.graph.ids.get(net)
+            if node is None:
+                raise ValueError(f"{net} is not a net of the netlist")
+            nodes.append(node)
+        return nodes
+
+    def time_arrivals(self, nodes):
+        '''Function to calculate the arrival times and slews of the fan-in cones of the nodes'''
+        graph = self.graph
+        ready = self.arrival_ready
+        # Collect the nodes of the cones that aren't calculated yet
+        cone = set()
+        stack = [node for node in nodes if not ready[node]]
+        while stack:
+            node = stack.pop()
+            if node in cone:
+                continue
+            cone.add(node)
+            for fanin in graph.fanins(node):
+                if not ready[fanin] and fanin not in cone:
+                    stack.append(fanin)
+        # Fan-ins come first in the sorted order
+        for node in sorted(cone, key=self.position.__getitem__):
+            self.sta.evaluate_node(node)
+            ready[node] = 1
+        self.arrivals_timed += len(cone)
+
+    def output_required_time(self):
+        '''Function to get the required arrival time of the outputs, calculating the circuit delay if none is given'''
+        if self.required_time is not None:
+            return self.required_time
+        if self.circuit_required_time is None:
+            self.time_arrivals(self.sta.output_ports)
+            self.circuit_required_time = required_arrival_time(self.sta.circuit_delay())
+        return self.circuit_required_time
+
+    def time_required(self, nodes):
+        '''Function to calculate the required arrival times and slacks of the fan-out cones of the nodes'''
+        graph = self.graph
+        ready = self.required_ready
+        required_time = self.output_required_time()
+        # Collect the nodes of the cones that aren't calculated yet
+        cone = set()
+        stack = [node for node in nodes if not ready[node]]
+        while stack:
+            node = stack.pop()
+            if node in cone:
+                continue
+            cone.add(node)
+            for fanout in graph.fanouts(node):
+                if not ready[fanout] and fanout not in cone:
+                    stack.append(fanout)
+        # Cell delays of the cones, and the arrival times of the nodes, are needed for their slacks
+        self.time_arrivals(cone)
+        # Fan-outs come first in the reverse sorted order
+        for node in sorted(cone, key=self.position.__getitem__, reverse=True):
+            self.sta.require_node(node, required_time)
+            ready[node] = 1
+        self.requireds_timed += len(cone)
+
+    def arrivals(self, nets):
+        '''Function to get the arrival time of the given nets'''
+        nets = list(nets)
+        nodes = self.nodes(nets)
+        self.time_arrivals(nodes)
+        return {net: self.sta.max_output_arrival[node] for net, node in zip(nets, nodes)}
+
+    def slacks(self, nets):
+        '''Function to get the slack of the given nets and output ports'''
+        nets = list(nets)
+        nodes = self.nodes(nets)
+        self.time_required(nodes)
+        return {net: self.sta.slack[node] for net, node in zip(nets, nodes)}
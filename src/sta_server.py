@@ -0,0 +1,381 @@
+'''Long-running static timing analysis server, keeping libraries and designs in memory'''
+import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+from pathlib import Path
+import main_parser
+import parse_cache
+from main_sta import STA
+from path_search import PathSearch
+
+# Unix socket the server listens on by default
+SOCKET_PATH = '../sta_server.sock'
+
+# Requests of one connection that may be in progress at once, the connection is
+# not read any further until one of them is answered
+MAX_PIPELINE = 64
+
+# Longest request line, in bytes
+MAX_REQUEST_SIZE = 1 << 20
+
+class Design:
+    '''Design resident in the server, with its analysis and the lock serializing the requests on it'''
+    __slots__ = ("sta", "lock", "timed")
+
+    def __init__(self, sta):
+        self.sta = sta                  # Analysis of the design
+        self.lock = asyncio.Lock()      # Held by every request on the design
+        self.timed = False              # Whether the design has been analyzed since it was loaded
+
+class STAServer:
+    '''Server of timing requests, one JSON object per line in both directions
+
+    Every request has an 'op', and an 'id' that is copied to its response, so
+    that a client can send many requests without waiting and match the
+    responses, which come in the order the requests finish. Parsing and timing
+    run on a bounded pool of worker threads, the queries run on the event loop.
+    Requests on one design run one at a time, in the order they arrive.'''
+    def __init__(self, workers=2, cache=True, output_dir=main_parser.OUTPUT_DIR, cache_dir=parse_cache.CACHE_DIR):
+        self.executor = ThreadPoolExecutor(max_workers=workers)   # Workers for parsing and timing
+        self.cache = cache              # Whether netlists and libraries are read through the parse cache
+        self.cache_dir = cache_dir      # Directory of the parse cache files
+        self.output_dir = output_dir    # Directory the reports of every design are written to
+        self.libraries = {}             # Standard cells of every loaded .lib file
+        self.library_reads = {}         # Reads of the .lib files being loaded, awaited by all their requests
+        self.designs = {}               # Resident designs by name
+        self.stopped = None             # Future set when a shutdown is requested
+        self.connections = {}           # Writer of every open connection, by its handler task
+        self.operations = {
+            "ping": self.ping,
+            "load_library": self.load_library,
+            "load_design": self.load_design,
+            "unload_design": self.unload_design,
+            "designs": self.list_designs,
+            "run": self.run,
+            "query": self.query,
+            "paths": self.paths,
+            "edit": self.edit,
+            "shutdown": self.shutdown,
+        }
+
+    async def in_worker(self, function, *args):
+        '''Function to run a CPU-heavy job on the worker pool'''
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    def design(self, request):
+        '''Function to get the resident design a request is about'''
+        design = self.designs.get(request.get("design"))
+        if design is None:
+            raise ValueError(f"Design {request.get('design')} is not loaded")
+        return design
+
+    async def ping(self, request):
+        '''Function to answer a ping'''
+        return {"designs": len(self.designs), "libraries": len(self.libraries)}
+
+    async def library(self, path):
+        '''Function to get the standard cells of a .lib file, reading them on first use'''
+        path = os.path.abspath(path)
+        if path in self.libraries:
+            return self.libraries[path]
+        # Requests for a file being read wait for the same read, so that it is read once
+        reading = self.library_reads.get(path)
+        if reading is None:
+            reading = self.library_reads[path] = asyncio.ensure_future(self.read_library(path))
+        # A cancelled request doesn't cancel the read the other requests wait for
+        return await asyncio.shield(reading)
+
+    async def read_library(self, path):
+        '''Function to read the standard cells of a .lib file on a worker, and keep them'''
+        try:
+            self.libraries[path] = await self.in_worker(parse_cache.read_library, Path(path), self.cache, False,
+                                                         self.cache_dir)
+        finally:
+            # A failed read is tried again by the next request
+            del self.library_reads[path]
+        return self.libraries[path]
+
+    async def load_library(self, request):
+        '''Function to read a .lib file and keep its standard cells'''
+        std_cell = await self.library(request["path"])
+        return {"cells": sorted(name for name, cell in std_cell.items() if name == cell.gate_type)}
+
+    async def load_design(self, request):
+        '''Function to read a netlist and keep it with its analysis, replacing a design of the same name'''
+        name = request.get("design") or Path(request["bench"]).stem
+        std_cell = await self.library(request["library"])
+        output_dir = os.path.join(self.output_dir, name)
+        graph = await self.in_worker(parse_cache.read_graph, Path(request["bench"]), self.cache, False,
+                                     self.cache_dir, output_dir)
+        if request.get("vectorized"):
+            # Import the vectorized engine only when requested, it depends on NumPy
+            from vector_sta import VectorSTA
+            sta = VectorSTA(std_cell, graph, output_dir)
+        else:
+            sta = STA(std_cell, graph, output_dir)
+        # Wait for the requests on the design it replaces
+        old_design = self.designs.get(name)
+        if old_design is not None:
+            async with old_design.lock:
+                self.designs[name] = Design(sta)
+        else:
+            self.designs[name] = Design(sta)
+        return {"design": name, "nodes": len(graph), "arcs": len(graph.fanin_index)}
+
+    async def unload_design(self, request):
+        '''Function to drop a resident design'''
+        design = self.design(request)
+        async with design.lock:
+            del self.designs[request["design"]]
+        return {}
+
+    async def list_designs(self, request):
+        '''Function to list the resident designs'''
+        return {name: {"nodes": len(design.sta.graph), "timed": design.timed} for name, design in self.designs.items()}
+
+    def summary(self, sta):
+        '''Function to get the circuit delay, the required arrival time and the worst slack of a timed design'''
+        return {"circuit_delay": sta.total_circuit_delay, "required_time": sta.total_circuit_delay_slack,
+                "worst_slack": min(sta.slack) if len(sta.slack) else 0.0}
+
+    async def run(self, request):
+        '''Function to analyze a design, and write its report if asked to'''
+        design = self.design(request)
+        async with design.lock:
+            sta = design.sta
+            def analyze():
+                sta.forward_traversal()
+                sta.backward_traversal()
+                if request.get("report"):
+                    sta.find_critical_path()
+                    sta.write_reports()
+            await self.in_worker(analyze)
+            design.timed = True
+            return self.summary(sta)
+
+    async def time_once(self, design):
+        '''Function to analyze a design for a query, unless it has been analyzed already'''
+        if not design.timed:
+            await self.in_worker(design.sta.update_timing)
+            design.timed = True
+
+    async def query(self, request):
+        '''Function to get the arrival time, slew, required arrival time and slack of nets'''
+        design = self.design(request)
+        async with design.lock:
+            await self.time_once(design)
+            sta = design.sta
+            graph = sta.graph
+            nets = request["nets"] if "nets" in request else [request["net"]]
+            result = {}
+            for net in nets:
+                node = graph.ids.get(net)
+                if node is None:
+                    raise ValueError(f"{net} is not a net of {request['design']}")
+                result[net] = {"type": graph.type_name(node), "arrival": sta.max_output_arrival[node],
+                               "slew": sta.output_slew[node], "required": sta.back_traversal_arrival[node],
+                               "slack": sta.slack[node]}
+            return result
+
+    async def paths(self, request):
+        '''Function to get the worst paths of a design'''
+        design = self.design(request)
+        async with design.lock:
+            await self.time_once(design)
+            sta = design.sta
+            paths = await self.in_worker(PathSearch(sta).worst_paths, int(request.get("count", 1)))
+            return [{"delay": path.delay, "slack": path.slack,
+                     "nodes": [sta.graph.label(node) for node in path.nodes]} for path in paths]
+
+    async def edit(self, request):
+        '''Function to apply netlist edits to a design and re-time the affected cones
+
+        Edits are lists, ["set_cell", net, gate_type] or ["reconnect", net, old_fanin, new_fanin].
+        They are applied all or none, a failed edit leaves the design as it was.'''
+        design = self.design(request)
+        tolerance = float(request.get("tolerance", 0.0))
+        async with design.lock:
+            await self.time_once(design)
+            sta = design.sta
+            # Edits copy the graph, they run on a worker so that other designs are served meanwhile
+            await self.in_worker(sta.apply_edits, request["edits"])
+            # Until the edits are re-timed, the design has to be timed again before it is queried
+            design.timed = False
+            retimed = await self.in_worker(sta.update_timing, tolerance)
+            design.timed = True
+            result = self.summary(sta)
+            result["retimed"] = retimed
+            return result
+
+    async def shutdown(self, request):
+        '''Function to stop the server once the response is sent'''
+        asyncio.get_running_loop().call_soon(self.stop)
+        return {}
+
+    def stop(self):
+        '''Function to stop the server, pipelined shutdown requests stop it once'''
+        if not self.stopped.done():
+            self.stopped.set_result(None)
+
+    async def answer(self, request, writer, write_lock, pipeline):
+        '''Function to serve one request and write its response'''
+        try:
+            operation = self.operations.get(request.get("op"))
+            if operation is None:
+                raise ValueError(f"Unknown operation {request.get('op')}")
+            response = {"id": request.get("id"), "ok": True, "result": await operation(request)}
+        except Exception as error:  # pylint: disable=broad-except
+            # Errors of a request are sent back, the server keeps running
+            response = {"id": request.get("id"), "ok": False, "error": f"{type(error).__name__}: {error}"}
+        try:
+            async with write_lock:
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            # The client is gone, its remaining responses are dropped
+            pass
+        finally:
+            pipeline.release()
+
+    async def connection(self, reader, writer):
+        '''Function to serve the pipelined requests of a client connection'''
+        write_lock = asyncio.Lock()
+        pipeline = asyncio.Semaphore(MAX_PIPELINE)
+        tasks = set()
+        self.connections[asyncio.current_task()] = writer
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("request has to be a JSON object")
+                except ValueError as error:
+                    async with write_lock:
+                        writer.write(json.dumps({"id": None, "ok": False, "error": f"Bad request: {error}"}).encode()
+                                     + b"\n")
+                    continue
+                # Read the next request while this one is served, up to MAX_PIPELINE at once
+                await pipeline.acquire()
+                task = asyncio.create_task(self.answer(request, writer, write_lock, pipeline))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        except (ConnectionError, ValueError):
+            # The client is gone, or sent a line over MAX_REQUEST_SIZE
+            pass
+        finally:
+            del self.connections[asyncio.current_task()]
+            writer.close()
+
+    async def serve(self, socket_path=SOCKET_PATH, port=None):
+        '''Function to serve clients on a Unix socket, or on a localhost port if one is given, until shutdown'''
+        self.stopped = asyncio.get_running_loop().create_future()
+        if port is not None:
+            server = await asyncio.start_server(self.connection, "127.0.0.1", port, limit=MAX_REQUEST_SIZE)
+        else:
+            # Remove the socket of a server that didn't shut down cleanly
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+            server = await asyncio.start_unix_server(self.connection, socket_path, limit=MAX_REQUEST_SIZE)
+        async with server:
+            await self.stopped
+            # Close the open connections, their handlers finish the requests in progress
+            handlers = list(self.connections)
+            for writer in self.connections.values():
+                writer.close()
+            await asyncio.gather(*handlers, return_exceptions=True)
+        if port is None:
+            os.unlink(socket_path)
+        self.executor.shutdown()
+
+class STAClient:
+    '''Client of the timing server, requests can be sent concurrently over one connection'''
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.next_id = 0
+        self.pending = {}   # Futures of the requests waiting for their response
+        self.receiver = asyncio.create_task(self.receive())
+
+    @classmethod
+    async def connect(cls, socket_path=SOCKET_PATH, port=None):
+        '''Function to connect to a server on a Unix socket, or on a localhost port if one is given'''
+        if port is not None:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port, limit=MAX_REQUEST_SIZE)
+        else:
+            reader, writer = await asyncio.open_unix_connection(socket_path, limit=MAX_REQUEST_SIZE)
+        return cls(reader, writer)
+
+    async def receive(self):
+        '''Function to hand the responses to the requests waiting for them'''
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                break
+            response = json.loads(line)
+            future = self.pending.pop(response["id"], None)
+            if future is not None:
+                future.set_result(response)
+        # The server closed the connection
+        for future in self.pending.values():
+            future.set_exception(ConnectionError("server closed the connection"))
+
+    async def request(self, op, **arguments):
+        '''Function to send a request and wait for its result, errors of the server are raised as RuntimeError'''
+        self.next_id += 1
+        future = asyncio.get_running_loop().create_future()
+        self.pending[self.next_id] = future
+        self.writer.write(json.dumps({"id": self.next_id, "op": op, **arguments}).encode() + b"\n")
+        await self.writer.drain()
+        response = await future
+        if not response["ok"]:
+            raise RuntimeError(response["error"])
+        return response["result"]
+
+    async def close(self):
+        '''Function to close the connection'''
+        self.writer.close()
+        await self.writer.wait_closed()
+        self.receiver.cancel()
+
+def parse_arguments():
+    '''Function to parse command line arguments'''
+    parser = argparse.ArgumentParser()
+    # Arguments for the address of the server
+    parser.add_argument("--socket", action = "store", default = SOCKET_PATH, help = "Unix socket to listen on.")
+    parser.add_argument("--port", action = "store", type = int, default = None,
+                        help = "Localhost port to listen on, instead of the Unix socket.")
+    # Argument for the number of worker threads
+    parser.add_argument("--workers", action = "store", type = int, default = 2,
+                        help = "Worker threads for parsing and timing.")
+    # Argument to read .lib files before serving
+    parser.add_argument("--read_nldm", action = "store", nargs = "*", default = [], help = "Reads .lib files at start.")
+    # Argument for the directory of the reports of run requests
+    parser.add_argument("--output_dir", action = "store", default = main_parser.OUTPUT_DIR,
+                        help = "Directory of the reports, one folder per design, by default the output folder.")
+    # Argument to skip the cache of parsed netlists and libraries
+    parser.add_argument("--no-cache", action = "store_true", help = "Parses the input files without the cache.")
+    parser.add_argument("--cache_dir", action = "store", default = parse_cache.CACHE_DIR,
+                        help = "Directory of the cache files, by default the cache folder next to src.")
+    args = parser.parse_args()
+    return args
+
+def main():
+    '''Main function of sta_server.py'''
+    # Parse command line arguments
+    inputs = parse_arguments()
+    server = STAServer(inputs.workers, not inputs.no_cache, inputs.output_dir, inputs.cache_dir)
+    for path in inputs.read_nldm:
+        server.libraries[os.path.abspath(path)] = parse_cache.read_library(Path(path), not inputs.no_cache, False,
+                                                                            inputs.cache_dir)
+    print(f"Serving on {inputs.port if inputs.port is not None else inputs.socket}", flush=True)
+    asyncio.run(server.serve(inputs.socket, inputs.port))
+
+if __name__ == '__main__':
+    main()
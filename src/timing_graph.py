@@ -0,0 +1,187 @@
+'''Compiled, array-backed form of the circuit netlist'''
+from array import array
+
+# Type codes reserved for the primary ports, logical gate types are numbered after them
+INPUT = 0
+OUTPUT = 1
+
+class CombinationalLoopError(ValueError):
+    '''Error raised when the netlist has a combinational loop, its nodes can't be timed'''
+    def __init__(self, loop, untimed):
+        self.loop = loop        # Nets of one loop in signal order, the first net repeated at the end
+        self.untimed = untimed  # Number of nodes on or behind the loops
+        super().__init__(f"Combinational loop {' -> '.join(loop)}, {untimed} nodes can't be timed")
+
+class TimingGraph:
+    '''Netlist with nets interned to integer IDs and fan-in/fan-out stored as CSR arrays
+
+    A compiled graph is read-only, so that any number of analyses can share it.
+    Timing values are held by the analyses, and netlist edits return an edited
+    copy of the graph.'''
+    __slots__ = ("names", "ids", "type_names", "type_codes", "node_type",
+                 "fanin_offsets", "fanin_index", "fanout_offsets", "fanout_index", "levels")
+
+    def __init__(self):
+        self.names = []     # Net name of every node ID
+        self.ids = {}       # Node ID of every net name
+        self.type_names = ["INPUT", "OUTPUT"]  # Gate type name of every type code
+        self.type_codes = {"INPUT": INPUT, "OUTPUT": OUTPUT}   # Type code of every gate type name
+        self.node_type = array("B")     # Type code of every node
+        self.fanin_offsets = array("i", [0])    # Start of every node's fan-ins in fanin_index
+        self.fanin_index = array("i")   # Fan-in node IDs of all the nodes
+        self.fanout_offsets = array("i", [0])   # Start of every node's fan-outs in fanout_index
+        self.fanout_index = array("i")  # Fan-out node IDs of all the nodes
+        self.levels = None  # Sorted order and level offsets, once the graph is levelized
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def from_netlist(cls, circuit):
+        '''Function to compile the dictionary of Gates objects returned by read_ckt'''
+        graph = cls()
+        # Intern the net names in netlist order, so that traversal order is unchanged
+        for node_id, name in enumerate(circuit):
+            graph.ids[name] = node_id
+            graph.names.append(name)
+        ids = graph.ids
+        for gate in circuit.values():
+            graph.node_type.append(graph.intern_type(gate.type))
+            # Append fan-ins and fan-outs of the node, and close its CSR rows
+            graph.fanin_index.extend([ids[fanin] for fanin in gate.fanins])
+            graph.fanin_offsets.append(len(graph.fanin_index))
+            graph.fanout_index.extend([ids[fanout] for fanout in gate.fanouts])
+            graph.fanout_offsets.append(len(graph.fanout_index))
+        return graph
+
+    def intern_type(self, type_name):
+        '''Function to get the type code of a gate type, adding it if it is new'''
+        code = self.type_codes.get(type_name)
+        if code is None:
+            code = len(self.type_names)
+            self.type_names.append(type_name)
+            self.type_codes[type_name] = code
+        return code
+
+    def copy(self):
+        '''Function to copy the graph for an edit, the net names are shared as edits don't change them'''
+        graph = TimingGraph()
+        graph.names = self.names
+        graph.ids = self.ids
+        graph.type_names = self.type_names[:]
+        graph.type_codes = dict(self.type_codes)
+        graph.node_type = self.node_type[:]
+        graph.fanin_offsets = self.fanin_offsets[:]
+        graph.fanin_index = self.fanin_index[:]
+        graph.fanout_offsets = self.fanout_offsets[:]
+        graph.fanout_index = self.fanout_index[:]
+        return graph
+
+    def with_type(self, node, type_name):
+        '''Function to get a copy of the graph with the gate type of a node changed'''
+        graph = self.copy()
+        graph.node_type[node] = graph.intern_type(type_name)
+        # Types don't change the order, the copy keeps the levels
+        graph.levels = self.levels
+        return graph
+
+    def with_reconnect(self, node, old_fanin, new_fanin):
+        '''Function to get a copy of the graph with the first input pin of a node driven by one net moved to another net
+
+        The fan-in arc keeps its place in fanin_index, so arrays aligned with the
+        arcs stay valid, the fan-out arc is moved to the end of the new driver's row.'''
+        first_edge = self.fanin_offsets[node]
+        last_edge = self.fanin_offsets[node+1]
+        if old_fanin not in self.fanin_index[first_edge:last_edge]:
+            raise ValueError(f"{self.names[old_fanin]} doesn't drive {self.names[node]}")
+        graph = self.copy()
+        if old_fanin == new_fanin:
+            graph.levels = self.levels
+            return graph
+        fanout_offsets = graph.fanout_offsets
+        graph.fanin_index[graph.fanin_index.index(old_fanin, first_edge, last_edge)] = new_fanin
+        # Remove the fan-out arc from the old driver
+        del graph.fanout_index[graph.fanout_index.index(node, fanout_offsets[old_fanin], fanout_offsets[old_fanin+1])]
+        for row in range(old_fanin+1, len(fanout_offsets)):
+            fanout_offsets[row] -= 1
+        # Append the fan-out arc to the new driver
+        graph.fanout_index.insert(fanout_offsets[new_fanin+1], node)
+        for row in range(new_fanin+1, len(fanout_offsets)):
+            fanout_offsets[row] += 1
+        return graph
+
+    def levelize(self):
+        '''Function to sort the nodes so that every node comes after its fan-ins, grouped into levels
+
+        Returns the nodes in the order of a queue-based topological sort, and the
+        start of every level in that order. Level k holds the nodes whose last
+        fan-in is in level k-1. Raises CombinationalLoopError if the netlist has a loop.
+        The levels are computed once, and shared by all the analyses of the graph.'''
+        if self.levels is not None:
+            return self.levels
+        fanin_offsets = self.fanin_offsets
+        fanout_offsets = self.fanout_offsets
+        fanout_index = self.fanout_index
+        in_degree = array("i", [fanin_offsets[node+1] - fanin_offsets[node] for node in range(len(self))])
+        # Primary inputs and undriven nodes form the first level, in netlist order
+        order = array("i", [node for node in range(len(self)) if in_degree[node] == 0])
+        level_offsets = array("i", [0])
+        first = 0
+        # The order doubles as the queue, every level appends the next one
+        while first < len(order):
+            last = len(order)
+            for position in range(first, last):
+                node = order[position]
+                for edge in range(fanout_offsets[node], fanout_offsets[node+1]):
+                    neighbor = fanout_index[edge]
+                    in_degree[neighbor] -= 1
+                    # All the inputs of the neighbor are ready, it goes to the next level
+                    if in_degree[neighbor] == 0:
+                        order.append(neighbor)
+            level_offsets.append(last)
+            first = last
+        if len(order) != len(self):
+            self.raise_loop(in_degree)
+        self.levels = (order, level_offsets)
+        return self.levels
+
+    def raise_loop(self, in_degree):
+        '''Function to raise CombinationalLoopError with one loop, from the in-degrees left by a topological sort'''
+        # Nodes left with fan-ins are on a loop or behind one, and every one of them
+        # has a fan-in left, so following those fan-ins has to come back to a node
+        node = next(node for node in range(len(self)) if in_degree[node] > 0)
+        path = []
+        seen = {}
+        while node not in seen:
+            seen[node] = len(path)
+            path.append(node)
+            node = next(fanin for fanin in self.fanins(node) if in_degree[fanin] > 0)
+        # Fan-ins were followed backwards, list the loop in signal order
+        loop = path[seen[node]:]
+        loop.reverse()
+        names = [self.names[node] for node in loop]
+        raise CombinationalLoopError(names + names[:1], sum(1 for degree in in_degree if degree > 0))
+
+    def fanins(self, node):
+        '''Function to get the fan-in node IDs of a node'''
+        return self.fanin_index[self.fanin_offsets[node]:self.fanin_offsets[node+1]]
+
+    def fanouts(self, node):
+        '''Function to get the fan-out node IDs of a node'''
+        return self.fanout_index[self.fanout_offsets[node]:self.fanout_offsets[node+1]]
+
+    def type_name(self, node):
+        '''Function to get the gate type name of a node'''
+        return self.type_names[self.node_type[node]]
+
+    def label(self, node):
+        '''Function to get the report label of a node, output ports are named after their net'''
+        if self.node_type[node] == OUTPUT:
+            return f"OUTPUT-{self.names[self.fanin_index[self.fanin_offsets[node]]]}"
+        return f"{self.type_names[self.node_type[node]]}-{self.names[node]}"
+
+    def nbytes(self):
+        '''Function to get the memory held by the CSR and type arrays'''
+        arrays = (self.node_type, self.fanin_offsets, self.fanin_index,
+                  self.fanout_offsets, self.fanout_index)
+        return sum(len(values) * values.itemsize for values in arrays)
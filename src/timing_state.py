@@ -0,0 +1,52 @@
+'''Per-analysis timing values of a timing graph'''
+from array import array
+import main_parser
+from timing_graph import INPUT
+
+# Required arrival time of the outputs, as a multiple of the circuit delay
+REQUIRED_TIME_FACTOR = 1.1
+
+def required_arrival_time(total_circuit_delay):
+    '''Function to get the required arrival time of the outputs for a circuit delay, or an array of them
+
+    Every engine derives its required arrival time here, so that they all agree.'''
+    return REQUIRED_TIME_FACTOR * total_circuit_delay
+
+class TimingState:
+    '''Arrival times, slews, cell delays, required arrival times and slacks of one analysis
+
+    The values are array-backed and indexed by node ID or fan-in arc, the graph
+    they belong to is not changed, so several timing states, in the same thread
+    or not, can share one graph.'''
+    __slots__ = ("output_slew", "max_output_arrival", "cell_delay", "back_traversal_arrival", "slack",
+                 "total_circuit_delay", "total_circuit_delay_slack")
+
+    def __init__(self, graph):
+        num_nodes = len(graph)
+        self.output_slew = array("d", bytes(8 * num_nodes))   # Output slew of all the nodes
+        self.max_output_arrival = array("d", bytes(8 * num_nodes))    # Maximum output arrival time of all the nodes
+        self.cell_delay = array("d", bytes(8 * len(graph.fanin_index)))  # Cell delays of all the fan-in arcs
+        self.back_traversal_arrival = array("d", bytes(8 * num_nodes))    # Required arrival time for all the nodes
+        self.slack = array("d", bytes(8 * num_nodes)) # Slack of the nodes
+        self.total_circuit_delay = 0.0     # Total circuit delay
+        self.total_circuit_delay_slack = 0.0   # Required arrival time for the circuit
+        # Primary inputs start with the default input slew
+        for node in range(num_nodes):
+            if graph.node_type[node] == INPUT:
+                self.output_slew[node] = main_parser.PRIMARY_INPUT_SLEW
+
+    def copy(self):
+        '''Function to copy the timing values, for example to branch a what-if analysis from a timed design'''
+        state = TimingState.__new__(TimingState)
+        for name in self.__slots__:
+            value = getattr(self, name)
+            setattr(state, name, value[:] if isinstance(value, array) else value)
+        return state
+
+def state_attribute(name):
+    '''Function to create a property forwarding an attribute of an analysis to its timing state'''
+    def get_value(self):
+        return getattr(self.state, name)
+    def set_value(self, value):
+        setattr(self.state, name, value)
+    return property(get_value, set_value, doc=f"{name} of the timing state")
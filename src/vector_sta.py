@@ -0,0 +1,329 @@
+'''Levelized, NumPy-vectorized Static Timing Analysis'''
+from array import array
+import numpy as np
+from instrumentation import timed
+import main_parser
+from main_sta import STA
+from nldm_table import stack_tables
+from timing_graph import OUTPUT
+
+# Widest level, in input pins, whose input slews are gathered once for every slew weight
+REPLICATED_PINS = 1024
+
+def gather_ranges(offsets, nodes):
+    '''Function to concatenate the CSR index ranges of the given nodes'''
+    starts = offsets[nodes]
+    counts = offsets[nodes + 1] - starts
+    total = int(counts.sum())
+    if total == 0:
+        return np.zeros(0, dtype=np.int64)
+    # Shift a running count so that every range continues from its own start
+    shifts = np.repeat(starts - np.cumsum(counts) + counts, counts)
+    return shifts + np.arange(total)
+
+class LevelSchedule:
+    '''Gather indexes, scratch views and scatter views of one level of the vectorized forward traversal'''
+    __slots__ = ("gather", "fanin_buffer", "fanin_arrival", "input_slew", "slews", "slew_groups", "table_base",
+                 "corners", "products", "slew_index", "denominator", "pair1", "pair2", "pair3", "pair4",
+                 "column_weight", "derate", "pin_values", "delay", "arrival", "pin_latest", "pin_slot",
+                 "latest", "latest_arrival", "row_start", "level_state")
+
+    def __init__(self, gather, fanin_state, slews, slew_groups, table_base, corners, column_weight, derate,
+                 values, pin_slot, latest, width, level_state):
+        self.gather = gather                    # Positions of the fan-in arrivals, then slews, in the timing state
+        self.fanin_buffer = fanin_state.reshape(-1)     # Scratch the gathered arrivals and slews are written to
+        self.fanin_arrival = fanin_state[0]     # Arrival time into every pin
+        self.input_slew = fanin_state[1]        # Input slew of every pin
+        self.slews = slews                      # Input slews, once for every slew weight
+        self.slew_groups = slew_groups          # Pins and bounds of every input slew index group
+        self.table_base = table_base            # Corner entry before the row and column of every pin
+        self.corners = corners                  # Scratch the corners of every pin are gathered to
+        self.products = corners[:8]             # Corner values of delay and slew, weighted in place
+        self.slew_index = corners[8:16]         # Input slew indexes of the corners, made slew weights in place
+        self.denominator = corners[16:]         # Interpolation denominators of delay and slew
+        self.pair1 = corners[0:2]               # Weighted corners, summed in the order of NLDMTable.lookup
+        self.pair2 = corners[2:4]
+        self.pair3 = corners[4:6]
+        self.pair4 = corners[6:8]
+        self.column_weight = column_weight      # Output load weights of the corners, the first 4 negated
+        self.derate = derate                    # 'Number of inputs / 2' of every pin, None if no gate needs it
+        self.pin_values = values[:2]            # Delay and slew of every pin
+        self.delay = values[0]                  # Delay through every pin
+        self.arrival = values[2]                # Arrival time through every pin
+        self.pin_latest = values[1:]            # Slew and arrival time through every pin
+        self.pin_slot = pin_slot                # Slot of every pin in the padded rows, None if no row is padded
+        self.latest = latest                    # Slews and arrival times, padded to one row per gate
+        self.latest_arrival = latest[1].reshape(-1, width)  # Padded arrival times, one row per gate
+        self.row_start = np.arange(len(self.latest_arrival)) * width  # First slot of every gate
+        self.level_state = level_state          # Output slews and arrival times of the gates of the level
+
+class VectorSTA(STA):
+    '''Static Timing Analysis with every level of the netlist computed at once'''
+    def __init__(self, std_cell, netlist, output_dir=main_parser.OUTPUT_DIR, state=None):
+        super().__init__(std_cell, netlist, output_dir, state)
+        self.order = None           # Nodes in levelized order, a view of the sorted order
+        self.output_load = None     # Output capacitance of all the nodes
+        self.table = None           # Delay and slew corners of all the gate types, rows and columns
+        self.slew_position = None   # Position of the output slew of every node in the timing state
+        self.arrival_position = None    # Position of the arrival time of every node in the timing state
+        self.timing_state = None    # Output slews and arrival times, a block per level then the untimed nodes
+        self.pin_values = None      # Delay, output slew and arrival time through every input pin, a block per level
+        self.edge_layout = None     # Fan-in arcs in the levelized layout of the pins
+        self.delay_index = None     # Positions of the delays of the fan-in arcs in the pin values
+        self.outputs = None         # Output ports and their nets
+        self.schedule = []          # LevelSchedule of every level
+
+    def netlist_changed(self):
+        '''Function to levelize the netlist and compile the schedule again after an edit'''
+        self.order = None
+
+    def compile_tables(self):
+        '''Function to stack the lookup tables of all the gate type codes'''
+        cells = self.cells
+        input_slew, output_load, row_count, column_count, grid = stack_tables(
+            [None if cell is None else cell.table for cell in cells])
+        rows = input_slew.shape[1] - 1
+        columns = output_load.shape[1] - 1
+        # Corners (v11, v12, v21, v22) of the delay and slew tables at every row and column,
+        # the input slew index t2 of the row for the first 4 of them and t1 for the last 4,
+        # and the denominator (c2-c1)*(t2-t1) of the interpolation for delay and slew,
+        # stored one row per value so that gathered values are contiguous and every
+        # value of a pin has its own row to be combined with. Entries are ordered by
+        # gate type, column and row, so consecutive rows are next to each other
+        with np.errstate(invalid="ignore"):
+            denominator = ((output_load[:, None, 1:] - output_load[:, None, :-1])
+                           * (input_slew[:, 1:, None] - input_slew[:, :-1, None]))
+        slew_index = np.stack([input_slew[:, 1:, None].repeat(columns, axis=2)] * 4
+                              + [input_slew[:, :-1, None].repeat(columns, axis=2)] * 4
+                              + [denominator] * 2, axis=3)
+        corners = np.concatenate([grid[:, :-1, :-1], grid[:, :-1, 1:], grid[:, 1:, :-1], grid[:, 1:, 1:],
+                                  slew_index], axis=3)
+        self.table = np.ascontiguousarray(corners.transpose(0, 2, 1, 3).reshape(-1, 18).T)
+        # Bracketing counts the indexes at or below a value, beyond the first and
+        # the second to last index the first and last 2 rows or columns are used,
+        # as in NLDMTable.lookup
+        slew_bounds = input_slew[:, :-1].copy()
+        load_bounds = output_load[:, :-1].copy()
+        slew_bounds[:, 0] = -np.inf
+        load_bounds[:, 0] = -np.inf
+        slew_bounds[np.arange(rows) >= row_count[:, None] - 1] = np.inf
+        load_bounds[np.arange(columns) >= column_count[:, None] - 1] = np.inf
+        # Gate types sharing their input slew index form a group, that is bracketed with one search
+        groups = {}
+        slew_group = np.array([groups.setdefault(tuple(bounds), len(groups)) for bounds in slew_bounds])
+        group_bounds = [np.array(bounds) for bounds in groups]
+        return output_load, slew_group, group_bounds, load_bounds, rows, columns
+
+    def annotate_loads(self, nodes=None):
+        '''Function to calculate the output capacitance of all the nodes at once, or again for the given nodes after an edit'''
+        if nodes is not None:
+            super().annotate_loads(nodes)
+            return
+        graph = self.graph
+        # Input capacitance of every gate type code, output ports load 4 inverters
+        capacitance = np.zeros(len(self.cells))
+        for code, cell in enumerate(self.cells):
+            if cell is not None:
+                capacitance[code] = cell.input_capacitance
+        capacitance[OUTPUT] = 4 * self.std_cell["INV"].input_capacitance
+        node_type = np.frombuffer(graph.node_type, dtype=np.uint8)
+        # Input capacitance of every node, output ports with a given load take it instead
+        pin_capacitance = capacitance[node_type]
+        for port, port_load in self.port_loads.items():
+            pin_capacitance[port] = port_load
+        fanout_offsets = np.frombuffer(graph.fanout_offsets, dtype=np.int32)
+        fanout_index = np.frombuffer(graph.fanout_index, dtype=np.int32)
+        fanout_count = np.diff(fanout_offsets)
+        # Add the fan-out capacitances one pin at a time, in fan-out order,
+        # so that the sums are rounded the same way as STA.output_capacitance
+        by_count = np.argsort(-fanout_count, kind="stable")
+        sorted_count = fanout_count[by_count]
+        output_load = np.zeros(len(graph))
+        for pin in range(int(sorted_count[0]) if len(graph) else 0):
+            nodes = by_count[:np.searchsorted(-sorted_count, -pin, side="left")]
+            output_load[nodes] += pin_capacitance[fanout_index[fanout_offsets[nodes] + pin]]
+        # Add the wire capacitance of the nets
+        for node, wire_cap in self.wire_caps.items():
+            output_load[node] += wire_cap
+        self.loads = array("d", output_load.tobytes())
+
+    def compute_output_load(self):
+        '''Function to get the output capacitance of all the nodes, annotated once'''
+        if self.loads is None:
+            self.annotate_loads()
+        self.output_load = np.frombuffer(self.loads, dtype=np.float64)
+
+    def compile_schedule(self):
+        '''Function to levelize the netlist and precompute everything a level needs except the slews
+
+        Timing state is kept in one array, with a block of the output slews then the
+        arrival times of the logical gates of every level, followed by the nodes that
+        aren't timed, so that a level writes one contiguous block. Every level gets
+        its views of the state, of the scratch buffers and of the pin values here,
+        so that the traversal only calls NumPy with preallocated outputs.'''
+        graph = self.graph
+        # Levels of the timing graph, shared with the scalar passes
+        self.levelize()
+        self.order = np.frombuffer(self.sorted_order, dtype=np.int32)
+        level_offsets = np.frombuffer(self.level_offsets, dtype=np.int32)
+        self.compute_output_load()
+        output_load, slew_group, group_bounds, load_bounds, rows, columns = self.compile_tables()
+        node_type = np.frombuffer(graph.node_type, dtype=np.uint8)
+        fanin_offsets = np.frombuffer(graph.fanin_offsets, dtype=np.int32)
+        fanin_index = np.frombuffer(graph.fanin_index, dtype=np.int32)
+        # Logical gates with input pins are timed, the others keep their initial values
+        is_gate = np.array([cell is not None for cell in self.cells])[node_type] & (np.diff(fanin_offsets) > 0)
+        # Logical gates of every level, sorted by the input slew index group of their gate type
+        levels = np.repeat(np.arange(len(level_offsets) - 1), np.diff(level_offsets))
+        order_group = slew_group[node_type[self.order]]
+        layout = self.order[np.lexsort((order_group, ~is_gate[self.order], levels))]
+        level_gates = [gates for gates in (layout[first:last][is_gate[layout[first:last]]]
+                                           for first, last in zip(level_offsets[:-1], level_offsets[1:]))
+                       if len(gates)]
+        # Position of the output slew and of the arrival time of every node in the timing state
+        self.slew_position = np.empty(len(graph), dtype=np.int64)
+        self.arrival_position = np.empty(len(graph), dtype=np.int64)
+        block_start = 0
+        for gates in level_gates:
+            self.slew_position[gates] = block_start + np.arange(len(gates))
+            self.arrival_position[gates] = block_start + len(gates) + np.arange(len(gates))
+            block_start += 2 * len(gates)
+        untimed = np.flatnonzero(~is_gate)
+        self.slew_position[untimed] = block_start + np.arange(len(untimed))
+        self.arrival_position[untimed] = block_start + len(untimed) + np.arange(len(untimed))
+        self.timing_state = np.empty(2 * len(graph))
+        # Scratch buffers shared by the levels, sized for the widest one
+        edges_per_level = [gather_ranges(fanin_offsets, gates) for gates in level_gates]
+        widest = max([len(edges) for edges in edges_per_level], default=0)
+        fanin_buffer = np.empty(9 * widest)
+        corner_buffer = np.empty(18 * widest)
+        # Delay, output slew and arrival time through every input pin, a block per level
+        self.pin_values = np.empty(3 * sum(len(edges) for edges in edges_per_level))
+        self.schedule = []
+        delay_index = []
+        first_pin = 0
+        first_state = 0
+        for gates, edges in zip(level_gates, edges_per_level):
+            pins = len(edges)
+            fanins = fanin_index[edges]
+            num_fanins = fanin_offsets[gates + 1] - fanin_offsets[gates]
+            pin_gate = np.repeat(np.arange(len(gates)), num_fanins)
+            pin_start = np.cumsum(num_fanins) - num_fanins
+            codes = node_type[gates][pin_gate].astype(np.int64)
+            # Narrow levels gather the input slew once for every slew weight, a subtraction
+            # of same-shaped arrays costs less than broadcasting one, wide levels broadcast
+            # the input slews instead of gathering them 8 times
+            if pins <= REPLICATED_PINS:
+                gather = np.concatenate([self.arrival_position[fanins]] + [self.slew_position[fanins]] * 8)
+                fanin_state = fanin_buffer[:9 * pins].reshape(9, pins)
+                slews = fanin_state[1:]
+            else:
+                gather = np.concatenate([self.arrival_position[fanins], self.slew_position[fanins]])
+                fanin_state = fanin_buffer[:2 * pins].reshape(2, pins)
+                slews = np.broadcast_to(fanin_state[1], (8, pins))
+            # The output capacitance of a gate is fixed, so are its columns of the lookup tables.
+            # Weights of the first 4 corners are negated, they are multiplied by
+            # input_slew-t2, which is -(t2-input_slew)
+            load = self.output_load[gates][pin_gate]
+            column1 = (load_bounds[codes] <= load[:, None]).sum(axis=1) - 1
+            c1 = output_load[codes, column1]
+            c2 = output_load[codes, column1 + 1]
+            column_weight = np.stack([load - c2, c1 - load, c2 - load, load - c1])[[0, 0, 1, 1, 2, 2, 3, 3]]
+            # If the node has more than 2 inputs, multiply delay and slew with 'number of inputs / 2'
+            derate = None
+            if (num_fanins > 2).any():
+                derate = np.tile(np.where(num_fanins > 2, num_fanins / 2, 1.0)[pin_gate], (2, 1))
+            # Pin slews and arrivals are arranged as one row per gate, gates with fewer
+            # pins than the others of the level are padded with -inf arrivals
+            width = int(num_fanins.max())
+            values = self.pin_values[3 * first_pin:3 * (first_pin + pins)].reshape(3, pins)
+            latest = values[1:]
+            pin_slot = None
+            if (num_fanins != width).any():
+                pin_slot = pin_gate * width + (np.arange(pins) - pin_start[pin_gate])
+                latest = np.full((2, len(gates) * width), -np.inf)
+            # Pins of every input slew index group of the level
+            groups, group_first = np.unique(slew_group[codes], return_index=True)
+            group_last = np.append(group_first[1:], pins)
+            slew_groups = [(int(first), int(last), group_bounds[group])
+                           for group, first, last in zip(groups, group_first, group_last)]
+            corners = corner_buffer[:18 * pins].reshape(18, pins)
+            # Output slews and arrival times of the gates of the level
+            level_state = self.timing_state[first_state:first_state + 2 * len(gates)].reshape(2, -1)
+            self.schedule.append(LevelSchedule(gather, fanin_state, slews, slew_groups,
+                                               (codes * columns + column1) * rows - 1, corners, column_weight,
+                                               derate, values, pin_slot, latest, width, level_state))
+            delay_index.append(3 * first_pin + np.arange(pins))
+            first_pin += pins
+            first_state += 2 * len(gates)
+        self.edge_layout = np.concatenate(edges_per_level) if edges_per_level else np.zeros(0, dtype=np.int64)
+        self.delay_index = np.concatenate(delay_index) if delay_index else np.zeros(0, dtype=np.int64)
+        outputs = np.flatnonzero(node_type == OUTPUT)
+        self.outputs = (outputs, fanin_index[fanin_offsets[outputs]])
+
+    @timed("forward_traversal")
+    def forward_traversal(self):
+        '''Function to perform forward traversal of netlist, one level at a time'''
+        # Levelize the netlist and compile the lookup tables and loads once
+        if self.order is None:
+            self.compile_schedule()
+        table = self.table
+        add = np.add
+        multiply = np.multiply
+        # Maximum output arrival time and output slew of all the nodes, in the layout of the timing state
+        state = self.timing_state
+        state[self.arrival_position] = np.frombuffer(self.max_output_arrival, dtype=np.float64)
+        state[self.slew_position] = np.frombuffer(self.output_slew, dtype=np.float64)
+        # Indexes of the schedule are in range, takes clip them instead of checking them
+        for level in self.schedule:
+            # Gather fan-in arrivals and slews of all the input pins of the level
+            input_slew = level.input_slew
+            state.take(level.gather, None, level.fanin_buffer, "clip")
+            # Bracket the input slews, and 2D-interpolate delay and slew together
+            slew_groups = level.slew_groups
+            if len(slew_groups) == 1:
+                count = slew_groups[0][2].searchsorted(input_slew, side="right")
+            else:
+                count = np.empty(len(input_slew), dtype=np.int64)
+                for first, last, bounds in slew_groups:
+                    count[first:last] = bounds.searchsorted(input_slew[first:last], side="right")
+            add(count, level.table_base, count)
+            table.take(count, 1, level.corners, "clip")
+            # Corners times their column weight, then times input_slew-t2 (negated
+            # weights) and input_slew-t1, summed in the order of NLDMTable.lookup
+            products = level.products
+            slew_index = level.slew_index
+            pin_values = level.pin_values
+            multiply(products, level.column_weight, products)
+            np.subtract(level.slews, slew_index, slew_index)
+            multiply(products, slew_index, products)
+            add(level.pair1, level.pair2, pin_values)
+            add(pin_values, level.pair3, pin_values)
+            add(pin_values, level.pair4, pin_values)
+            # Delay and slew of all the pins
+            np.divide(pin_values, level.denominator, pin_values)
+            if level.derate is not None:
+                multiply(pin_values, level.derate, pin_values)
+            add(level.delay, level.fanin_arrival, level.arrival)
+            # The first pin with the maximum arrival time gives the output slew
+            latest = level.latest
+            if level.pin_slot is not None:
+                latest[:, level.pin_slot] = level.pin_latest
+            latest_pin = level.latest_arrival.argmax(axis=1)
+            add(latest_pin, level.row_start, latest_pin)
+            latest.take(latest_pin, 1, level.level_state, "clip")
+        arrival = state.take(self.arrival_position)
+        output_slew = state.take(self.slew_position)
+        # Output ports take the arrival time of their net
+        outputs, output_fanins = self.outputs
+        arrival[outputs] = arrival[output_fanins]
+        self.set_circuit_delay(max(0.0, float(arrival[outputs].max())) if len(outputs) else 0.0)
+        # Store results in the arrays used by the backward traversal
+        self.output_slew = array("d", output_slew.tobytes())
+        self.max_output_arrival = array("d", arrival.tobytes())
+        self.cell_delay = array("d", bytes(8 * len(self.graph.fanin_index)))
+        np.frombuffer(self.cell_delay, dtype=np.float64)[self.edge_layout] = self.pin_values.take(self.delay_index)
+        if self.stats is not None:
+            self.stats.count("nodes_visited", len(self.sorted_order))
+            self.stats.count("levels", len(self.schedule))
+            self.count_lookups(self.sorted_order)